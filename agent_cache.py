@@ -0,0 +1,193 @@
+# ============================================================
+# AI MUSIC ANALYZER - CACHE DELLE RISPOSTE DEGLI AGENTI
+# ============================================================
+# Il contesto comune dei prompt contiene numeri esatti (RMS, LUFS, % per
+# banda...), quindi due analisi non producono mai lo stesso prompt. Ma i
+# consigli di Theory e Creative dipendono quasi solo da genere, tonalità
+# e fascia di BPM: per tracce "simili" la generazione si può saltare.
+#
+# Ogni agente ha una politica (AGENT_CACHE_POLICIES) che dice come
+# quantizzare la traccia in una firma canonica:
+#   genere, tonalità (+ modo), BPM arrotondato a `bpm_step`,
+#   % di energia per banda arrotondate a `band_step` (None = bande ignorate)
+# più TTL e numero massimo di voci (LRU). Politica None = agente mai in cache.
+#
+# Anche il confronto con una reference (caricata o presa dalla libreria) e
+# le tracce simili della libreria finiscono nel contesto dei prompt: la firma
+# contiene il nome della reference, le differenze per banda quantizzate e
+# i nomi delle tracce simili, così una risposta scritta con una reference
+# non viene riusata per un'analisi con un'altra (o senza).
+#
+# La cache è in memoria, per processo. Hit e miss per agente finiscono
+# nelle metriche (/metrics) e in agent_cache_stats().
+# ============================================================
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import tracing
+
+# Cambiarla invalida tutte le risposte in cache (es. dopo aver modificato i prompt)
+AGENT_CACHE_VERSION = 2
+
+# Quantizzazione del confronto con la reference nella firma: differenze di % energia
+# per banda (se la politica non ha band_step) e differenza di RMS medio
+COMPARISON_BAND_STEP = 10
+COMPARISON_RMS_STEP = 0.01
+
+# Politica di quantizzazione per agente (None = nessuna cache)
+#   bpm_step:    ampiezza della fascia di BPM (128 e 129 → stessa fascia con step 4)
+#   band_step:   ampiezza delle fasce di % energia per banda (None = bande escluse)
+#   key_mode:    se True la firma distingue maggiore / minore
+#   ttl_sec:     durata di una risposta in cache
+#   max_entries: voci per agente oltre le quali si elimina la meno usata
+AGENT_CACHE_POLICIES = {
+    # Il mix dipende dai valori esatti di loudness e bande: niente cache
+    "mix_agent": None,
+    "theory_agent": {"bpm_step": 4, "band_step": None, "key_mode": True,
+                     "ttl_sec": 7 * 24 * 3600, "max_entries": 500},
+    "creative_agent": {"bpm_step": 4, "band_step": 20, "key_mode": True,
+                       "ttl_sec": 7 * 24 * 3600, "max_entries": 500},
+}
+# L'orchestrator non passa mai dalla cache: riassume le risposte (anche
+# fresche) degli altri agenti, che la firma musicale non descrive
+
+AGENT_CACHE_REQUESTS = f"{tracing.METRICS_PREFIX}_agent_cache_requests_total"
+tracing.registry.describe(AGENT_CACHE_REQUESTS, "Richieste alla cache delle risposte per agente ed esito")
+
+
+def _bucket(value, step):
+    return None if value is None else round(float(value) / step) * step
+
+
+def agent_signature(policy, genre, user_summary, comparison=None, references=None):
+    """
+    Firma canonica (dizionario) della traccia secondo la politica dell'agente:
+    solo le grandezze che contano per i suoi consigli, quantizzate.
+    comparison: confronto con la reference (compare_summaries) presente nel contesto
+    references: nomi delle tracce simili della libreria presenti nel contesto
+    """
+    signature = {
+        "genre": genre,
+        "key_root": user_summary.get("key_root"),
+        "bpm": _bucket(user_summary.get("bpm") or None, policy["bpm_step"]),
+    }
+    if policy.get("key_mode"):
+        signature["key_mode"] = user_summary.get("key_mode")
+    if policy.get("band_step"):
+        signature["bands"] = {band: _bucket(pct, policy["band_step"])
+                              for band, pct in sorted(user_summary.get("energy_percent", {}).items())}
+    if comparison is not None:
+        band_step = policy.get("band_step") or COMPARISON_BAND_STEP
+        signature["comparison"] = {
+            "reference": comparison.get("reference_name"),
+            "rms": _bucket(comparison.get("diff_rms_mean"), COMPARISON_RMS_STEP),
+            "bands": {band: _bucket(diff, band_step)
+                      for band, diff in sorted(comparison.get("diff_energy_percent", {}).items())},
+        }
+    if references:
+        signature["references"] = sorted(references)
+    return signature
+
+
+class AgentResponseCache:
+    """Cache LRU con TTL delle risposte di ciascun agente, sicura tra thread."""
+
+    def __init__(self, policies=None):
+        self.policies = AGENT_CACHE_POLICIES if policies is None else policies
+        self._entries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def key(self, agent, genre, user_summary, model, comparison=None, references=None):
+        """Chiave della risposta (None se l'agente non usa la cache)."""
+        policy = self.policies.get(agent)
+        if policy is None:
+            return None
+        payload = {
+            "v": AGENT_CACHE_VERSION,
+            "agent": agent,
+            "model": model,
+            "signature": agent_signature(policy, genre, user_summary, comparison, references),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def get(self, agent, key):
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(agent)
+            item = entries.get(key) if entries else None
+            if item is not None and now - item[0] > self.policies[agent]["ttl_sec"]:
+                del entries[key]
+                item = None
+            if item is not None:
+                entries.move_to_end(key)
+            self._count(agent, "hit" if item is not None else "miss")
+        return None if item is None else item[1]
+
+    def put(self, agent, key, text):
+        if key is None:
+            return
+        with self._lock:
+            entries = self._entries.setdefault(agent, OrderedDict())
+            entries[key] = (time.time(), text)
+            entries.move_to_end(key)
+            while len(entries) > self.policies[agent]["max_entries"]:
+                entries.popitem(last=False)
+
+    def _count(self, agent, result):
+        stats = self._stats.setdefault(agent, {"hit": 0, "miss": 0})
+        stats[result] += 1
+        tracing.registry.increment(AGENT_CACHE_REQUESTS, agent=agent, result=result)
+
+    def stats(self):
+        """Per agente: hit, miss, hit rate e voci in cache."""
+        with self._lock:
+            report = {}
+            for agent, counts in self._stats.items():
+                total = counts["hit"] + counts["miss"]
+                report[agent] = dict(counts, hit_rate=counts["hit"] / total if total else 0.0,
+                                     entries=len(self._entries.get(agent, ())))
+            return report
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+# Cache condivisa dal processo
+agent_response_cache = AgentResponseCache()
+
+
+def cached_agent_response(agent, genre, user_summary, model, generate, cacheable=None,
+                          comparison=None, references=None):
+    """
+    Risposta dell'agente dalla cache se c'è una traccia con la stessa firma
+    (stesso confronto e stesse tracce simili nel contesto), altrimenti generate()
+    (salvata in cache se cacheable(testo) è vero).
+    Ritorna (testo, hit) con hit True / False, oppure None se l'agente non usa la cache.
+    """
+    cache = agent_response_cache
+    key = cache.key(agent, genre, user_summary, model, comparison, references)
+    if key is None:
+        return generate(), None
+
+    text = cache.get(agent, key)
+    if text is not None:
+        print(f"♻️ Risposta di {agent} dalla cache (stessa firma musicale)")
+        return text, True
+
+    text = generate()
+    if cacheable is None or cacheable(text):
+        cache.put(agent, key, text)
+    return text, False
+
+
+def agent_cache_stats():
+    return agent_response_cache.stats()
@@ -16,20 +16,25 @@
 # ============================================================
 
 # Import librerie per audio e numerica
+import importlib           # Per il preload esplicito delle dipendenze pesanti
 import io                  # Per eventuale uso futuro con file in memoria
-import librosa             # Per analisi audio
 import numpy as np         # Per calcoli numerici
 
-# Import per LLM locale
-import ollama              # Per chiamare il modello tramite Ollama
+from band_filterbank import BandSet, to_percent  # Energia per bande con un prodotto matrice
+import tracing             # Span per stadio e metriche (/metrics)
+import llm_telemetry       # Token e velocità delle chiamate Ollama
+import agent_cache         # Risposte degli agenti riusate tra tracce musicalmente simili
+import stereo_analysis     # Immagine stereo (mid / side) dalla traccia multicanale
+import audio_decoder       # Decoder scelto per contenitore, anche direttamente da stream
 
 # Import per controllo esistenza file
 import os                  # Per verificare se esiste la reference
+import time                # Per misurare la durata del warm-up
 
-# Import per RAG (vector store)
-import chromadb            # Per usare Chroma come database vettoriale
-
-import pyloudnorm as pyln  # per calcolare i LUFS e la loudness range
+# NOTA sulle dipendenze pesanti (librosa, chromadb, ollama):
+# vengono importate SOLO dentro le funzioni che le usano, al primo utilizzo.
+# Così importare questo modulo è quasi istantaneo e un worker che fa solo DSP
+# non carica mai chromadb né ollama. Vedi anche preload_dependencies().
 # ============================================================
 # CONFIGURAZIONE DI BASE
 # ============================================================
@@ -37,6 +42,14 @@ import pyloudnorm as pyln  # per calcolare i LUFS e la loudness range
 # Sample rate standard per l'analisi audio
 DEFAULT_SR = 44100
 
+# Sample rate nativi accettati senza ricampionare (loudness e bande lavorano
+# a qualsiasi sample rate): un file a 48 kHz non passa dal resampler
+NATIVE_SAMPLE_RATES = (44100, 48000)
+
+# Sample rate (circa) della copia decimata usata per ritmo e tonalità:
+# tempo, onset e chroma non guadagnano nulla dal contenuto sopra ~11 kHz
+RHYTHM_SR = 22050
+
 # Parametri per STFT / RMS
 DEFAULT_FRAME_LENGTH = 2048
 DEFAULT_HOP_LENGTH = 512
@@ -52,38 +65,162 @@ OLLAMA_EMBED_MODEL = "mistral"     # modello per gli embedding RAG
 # Valore più basso = risposta più veloce (ma più corta)
 MAX_LLM_TOKENS = 512
 
+# Quanto tempo Ollama deve tenere i modelli caricati in memoria dopo l'ultima chiamata
+# -1 = tienili sempre caricati (niente tempo di caricamento dopo periodi di inattività)
+# Si può usare anche una durata, es. "30m"
+OLLAMA_KEEP_ALIVE = -1
+
+# Bande usate da summarize_track_features (estremi inclusi, somma delle magnitudini)
+BROAD_BANDS = [
+    ("sub", 20, 60),
+    ("bass", 60, 150),
+    ("lowmid", 150, 500),
+    ("highmid", 500, 4000),
+    ("high", 4000, 20000),
+]
+
+# Bande fini usate da compute_advanced_analysis (estremo superiore escluso, potenza media)
+FINE_BANDS = [
+    ("sub_20_40", 20, 40),
+    ("bass_40_80", 40, 80),
+    ("bass_80_150", 80, 150),
+    ("lowmid_150_500", 150, 500),
+    ("mid_500_2000", 500, 2000),
+    ("highmid_2k_6k", 2000, 6000),
+    ("air_6k_20k", 6000, 20000),
+]
+
+# Filterbank delle due analisi (matrice bin → banda in cache per sr / n_fft).
+# Per bande diverse basta passare un altro BandSet alle funzioni di analisi.
+BROAD_BAND_SET = BandSet(BROAD_BANDS, include_high=True, reduce="sum")
+FINE_BAND_SET = BandSet(FINE_BANDS, reduce="mean")
+
+# Libreria di reference (similarity_index): ogni traccia analizzata viene aggiunta
+# all'indice e, senza reference caricata, il confronto usa la più vicina.
+# None = libreria disattivata
+LIBRARY_INDEX_DIR = "similarity_index"
+LIBRARY_TOP_K = 3
+
 # Config RAG / Chroma
 CHROMA_DB_PATH = "chroma_db"      # Cartella dove è salvato il DB Chroma
 KB_COLLECTION_NAME = "music_kb"   # Nome collezione knowledge base
 
 
+# Profili di avvio: quali dipendenze pesanti precaricare in un processo
+#   "dsp"  → solo analisi audio (worker batch, CLI, GUI prima dell'analisi)
+#   "full" → analisi audio + RAG + agenti LLM (server)
+DEPENDENCY_PROFILES = {
+    "dsp": ["librosa", "scipy.signal"],
+    "full": ["librosa", "scipy.signal", "chromadb", "ollama"],
+}
+
+
+def preload_dependencies(profile="full"):
+    """
+    Importa subito le dipendenze pesanti del profilo scelto.
+    Utile per spostare il costo di import all'avvio di un worker
+    invece che sulla prima richiesta. Ritorna la lista dei moduli caricati.
+    """
+    modules = DEPENDENCY_PROFILES[profile]
+    for name in modules:
+        importlib.import_module(name)
+    return list(modules)
+
+
 # ============================================================
 # 1. FUNZIONI DI CARICAMENTO AUDIO
 # ============================================================
 
-def load_audio(path, sr=DEFAULT_SR):
+def _to_mono(y):
+    # Stessa fusione dei canali di librosa.to_mono (media in float32)
+    return y[0] if y.shape[0] == 1 else np.mean(y, axis=0, dtype=np.float32)
+
+
+@tracing.traced("load_audio")
+def load_audio(path, sr=DEFAULT_SR, native_rates=NATIVE_SAMPLE_RATES):
     """
-    Carica un file audio da disco e lo converte in mono.
+    Carica un file audio e lo converte in mono.
     Parametri:
-        path: percorso del file audio (stringa)
-        sr: sample rate desiderato per l'analisi
+        path: percorso del file audio oppure file aperto (es. upload di FastAPI)
+        sr: sample rate desiderato per l'analisi (None = sempre quello nativo)
+        native_rates: sample rate nativi tenuti così come sono (niente resampling)
     Ritorna:
         y: array numpy con il segnale audio mono
         sr: sample rate effettivo
     """
-    # Carica l'audio usando librosa (mono=True fonda i canali in uno)
-    y, sr = librosa.load(path, sr=sr, mono=True)
-    # Ritorna segnale e sample rate
-    return y, sr
+    # Decoder scelto in base al contenitore (vedi audio_decoder.py)
+    y, native_sr, _ = audio_decoder.decode_audio(path)
+    y = _to_mono(y)
+    if sr is None or native_sr == sr or native_sr in native_rates:
+        return y, native_sr
+
+    import librosa
+
+    # Ricampiona solo i sample rate "strani" (es. 22.05 kHz, 96 kHz)
+    return librosa.resample(y, orig_sr=native_sr, target_sr=sr), sr
+
+
+@tracing.traced("load_audio")
+def load_audio_channels(path, sr=DEFAULT_SR, native_rates=NATIVE_SAMPLE_RATES):
+    """
+    Come load_audio, ma tiene i canali separati (una sola decodifica per
+    analisi mono e stereo).
+    Ritorna:
+        (y_channels, y_mono, sr): y_channels ha forma (canali, campioni),
+        y_mono è la media dei canali (stesso segnale di load_audio)
+    """
+    y, native_sr, _ = audio_decoder.decode_audio(path)
+    if sr is not None and native_sr != sr and native_sr not in native_rates:
+        import librosa
+
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, axis=-1)
+        native_sr = sr
+    return y, _to_mono(y), native_sr
+
+
+@tracing.traced("rhythm_signal")
+def rhythm_signal(y, sr, target_sr=RHYTHM_SR):
+    """
+    Copia a basso sample rate del segnale per ritmo e tonalità
+    (decimazione polifase di un fattore intero: 44.1k → 22.05k, 48k → 24k, 96k → 24k).
+    Ritorna:
+        (y_low, sr_low); il segnale originale se è già a bassa frequenza
+    """
+    factor = int(sr // target_sr)
+    if factor <= 1:
+        return y, sr
+
+    from scipy.signal import resample_poly
+
+    sr_low = sr // factor if sr % factor == 0 else sr / factor
+    return resample_poly(y, 1, factor).astype(np.float32), sr_low
+
+
+def strided_tempogram(onset_env, stride, win_length=384):
+    """
+    Come librosa.feature.tempogram(onset_envelope=...)[:, ::stride], ma calcola
+    solo le colonne tenute (l'autocorrelazione è la parte costosa).
+    """
+    import librosa
+    from scipy.signal import get_window
+
+    n = len(onset_env)
+    padded = np.pad(onset_env, win_length // 2, mode="linear_ramp", end_values=[0, 0])
+    odf_frames = librosa.util.frame(padded, frame_length=win_length, hop_length=1)[:, :n:stride]
+    ac_window = get_window("hann", win_length, fftbins=True)[:, None]
+    return librosa.util.normalize(
+        librosa.autocorrelate(odf_frames * ac_window, axis=0), norm=np.inf, axis=0)
 
 
 # ============================================================
 # 2. FEATURE AUDIO (RMS, SPETTRO, BPM, KEY)
 # ============================================================
 
+@tracing.traced("compute_features")
 def compute_features(y, sr,
                      frame_length=DEFAULT_FRAME_LENGTH,
-                     hop_length=DEFAULT_HOP_LENGTH):
+                     hop_length=DEFAULT_HOP_LENGTH,
+                     low_rate=None):
     """
     Calcola varie feature audio:
         - RMS nel tempo
@@ -92,13 +229,19 @@ def compute_features(y, sr,
         - frequenze (bin FFT)
         - durata del brano
         - BPM stimato
-        - tonalità stimata (nota fondamentale) tramite chroma
+        - tonalità stimata (nota fondamentale, modo e confidenza) tramite chroma
+    RMS e spettro usano il segnale a piena banda; BPM e tonalità la copia
+    decimata (rhythm_signal), con una sola STFT a bassa frequenza per entrambi.
     Parametri:
         y: array numpy del segnale audio
         sr: sample rate del segnale
+        low_rate: (y_low, sr_low) già calcolato con rhythm_signal (opzionale)
     Ritorna:
         dizionario con tutte le feature
     """
+    import librosa
+    import key_detection
+
     # Calcola RMS (energia media per frame)
     rms = librosa.feature.rms(y=y,
                               frame_length=frame_length,
@@ -126,28 +269,26 @@ def compute_features(y, sr,
     # Durata totale del brano in secondi
     duration = librosa.get_duration(y=y, sr=sr)
 
-    # Stima del BPM con beat tracking
-    tempo_array = librosa.beat.tempo(y=y, sr=sr)
+    # Copia decimata per ritmo e tonalità: una STFT a metà (o meno) dei campioni
+    y_low, sr_low = low_rate if low_rate is not None else rhythm_signal(y, sr)
+    power_low = np.abs(librosa.stft(y_low, n_fft=frame_length, hop_length=hop_length))**2
+
+    # Stima del BPM dall'onset envelope (mel-spettrogramma della STFT decimata)
+    mel_low = librosa.feature.melspectrogram(S=power_low, sr=sr_low)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel_low), sr=sr_low,
+                                             hop_length=hop_length)
+    tempo_array = librosa.feature.tempo(onset_envelope=onset_env, sr=sr_low, hop_length=hop_length)
     # Se l'array non è vuoto, prendi il primo valore
     bpm = float(tempo_array[0]) if len(tempo_array) > 0 else None
 
-    # Calcolo del chroma (energia per ciascuna nota della scala cromatica)
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    # Media nel tempo della matrice chroma (12 note)
-    chroma_mean = chroma.mean(axis=1)
-
-    # Indice della nota con energia media più alta
-    idx_root = int(np.argmax(chroma_mean))
-
-    # Mappa degli indici alle note
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F',
-                  'F#', 'G', 'G#', 'A', 'A#', 'B']
-
-    # Nota fondamentale stimata (senza distinzione maggiore/minore)
-    key_root = note_names[idx_root]
+    # Tonalità dalla stessa STFT decimata (chroma + profili maggiore/minore),
+    # invece di una chroma_cqt dedicata
+    key = key_detection.key_from_power(power_low, sr_low, frame_length)
 
     # Ritorna tutte le feature in un dizionario
     return {
+        "sr": sr,
+        "n_fft": frame_length,
         "rms": rms,
         "times_rms": times_rms,
         "spectrogram": spectrogram,
@@ -155,103 +296,496 @@ def compute_features(y, sr,
         "freqs": freqs,
         "duration": duration,
         "bpm": bpm,
-        "key_root": key_root
+        "key_root": key["key_root"],
+        "key_mode": key["key_mode"],
+        "key_confidence": key["key_confidence"],
+    }
+
+def loudness_stats(y, sr):
+    """
+    Statistiche di loudness e dinamica su un segnale (o su una sua porzione),
+    in un solo passaggio con loudness_meter (EBU R128 / BS.1770-4):
+    - LUFS integrato, LRA EBU, loudness momentary / short-term massime
+    - True peak (dBTP) e sample peak (dBFS)
+    - Crest factor (peak vs RMS)
+    """
+    import loudness_meter
+
+    stats = loudness_meter.measure_loudness(y, sr)
+
+    # RMS e picco per crest factor
+    rms_val = np.sqrt(np.mean(y**2)) if len(y) else 0.0
+    peak_val = 10 ** (stats["sample_peak_dbfs"] / 20.0) if len(y) else 0.0
+    stats["crest_factor_db"] = float(20 * np.log10((peak_val + 1e-9) / (rms_val + 1e-9)))
+    return stats
+
+
+def fine_band_energy_percent(power, sr, n_fft, band_set=FINE_BAND_SET):
+    """
+    Distribuzione percentuale dell'energia nelle bande fini
+    (sub_20_40 ... air_6k_20k) a partire da uno spettro di potenza:
+    vettore (spettro medio) oppure matrice bin x frame (viene mediata nel tempo).
+    """
+    power = np.asarray(power)
+    if power.ndim == 2:
+        if power.shape[1] == 0:
+            return {name: 0.0 for name in band_set.names}
+        power = power.mean(axis=1)
+    return band_set.percent(power, sr, n_fft)
+
+
+def transient_stats(onset_env, sr, duration_sec, hop_length=DEFAULT_HOP_LENGTH):
+    """Numero e densità (al secondo) dei transienti a partire dall'onset envelope."""
+    import librosa
+
+    onsets_frames = librosa.onset.onset_detect(onset_envelope=onset_env,
+                                               sr=sr,
+                                               hop_length=hop_length)
+    num_transients = len(onsets_frames)
+    transient_density = num_transients / (duration_sec + 1e-9)
+
+    return {
+        "count": int(num_transients),
+        "density_per_sec": float(transient_density),
     }
 
-def compute_advanced_analysis(y, sr):
+
+@tracing.traced("compute_advanced_analysis")
+def compute_advanced_analysis(y, sr, low_rate=None):
     """
     Analisi audio avanzata:
-    - LUFS integrato (pyloudnorm)
-    - "Loudness range" approssimata (percentili sul segnale)
+    - Loudness EBU R128: LUFS integrato, LRA, momentary/short-term, true peak
     - Crest factor (peak vs RMS)
     - Distribuzione energia per bande fini
-    - Densità dei transienti
+    - Densità dei transienti (sulla copia decimata, vedi rhythm_signal)
 
+    low_rate: (y_low, sr_low) già calcolato con rhythm_signal (opzionale).
     Ritorna un dizionario usato poi in build_common_context.
     """
+    import librosa
 
     # Assicuriamoci che il segnale sia float32
     y = y.astype(np.float32)
 
     # ============================
-    # 1) LOUDNESS (LUFS) + RANGE APPROX
+    # 1) LOUDNESS (LUFS, LRA, TRUE PEAK)
     # ============================
-    meter = pyln.Meter(sr)  # misuratore EBU BS.1770
-    integrated_loudness = meter.integrated_loudness(y)  # LUFS integrato
-
-    # RMS e picco per crest factor
-    rms_val = np.sqrt(np.mean(y**2))
-    peak_val = np.max(np.abs(y))
-    crest_factor = 20 * np.log10((peak_val + 1e-9) / (rms_val + 1e-9))
-
-    # "Loudness range" approssimata:
-    # usiamo percentili sul valore assoluto del segnale
-    abs_y = np.abs(y)
-    if len(abs_y) > 0:
-        p95 = np.percentile(abs_y, 95)
-        p5 = np.percentile(abs_y, 5)
-        loudness_range = 20 * np.log10((p95 + 1e-9) / (p5 + 1e-9))
-    else:
-        loudness_range = 0.0
+    loudness = loudness_stats(y, sr)
 
     # ============================
     # 2) SPETTRO PER BANDE
     # ============================
     stft = librosa.stft(y, n_fft=4096, hop_length=1024)
-    mag = np.abs(stft)
-    freqs = librosa.fft_frequencies(sr=sr, n_fft=4096)
-
-    def band_energy(freq_low, freq_high):
-        """Energia media nella banda [freq_low, freq_high]."""
-        mask = (freqs >= freq_low) & (freqs < freq_high)
-        if not np.any(mask):
-            return 0.0
-        return float(np.mean(mag[mask, :]**2))
-
-    raw_band_energies = {
-        "sub_20_40": band_energy(20, 40),
-        "bass_40_80": band_energy(40, 80),
-        "bass_80_150": band_energy(80, 150),
-        "lowmid_150_500": band_energy(150, 500),
-        "mid_500_2000": band_energy(500, 2000),
-        "highmid_2k_6k": band_energy(2000, 6000),
-        "air_6k_20k": band_energy(6000, 20000),
-    }
-
-    total_bands_energy = sum(raw_band_energies.values()) + 1e-9
-    band_percent = {
-        k: (v / total_bands_energy) * 100.0
-        for k, v in raw_band_energies.items()
-    }
+    mean_power = np.mean(np.abs(stft)**2, axis=1)
+    band_percent = fine_band_energy_percent(mean_power, sr, 4096)
 
     # ============================
     # 3) DENSITÀ TRANSIENTI
     # ============================
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    onsets_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
-    onsets_times = librosa.frames_to_time(onsets_frames, sr=sr)
-
-    num_transients = len(onsets_times)
+    y_low, sr_low = low_rate if low_rate is not None else rhythm_signal(y, sr)
+    onset_env = librosa.onset.onset_strength(y=y_low, sr=sr_low)
     duration_sec = librosa.get_duration(y=y, sr=sr)
-    transient_density = num_transients / (duration_sec + 1e-9)
+    transients = transient_stats(onset_env, sr_low, duration_sec)
 
     # ============================
     # 4) PACK RISULTATI
     # ============================
     return {
-        "loudness": {
-            "integrated_lufs": float(integrated_loudness),
-            "loudness_range": float(loudness_range),   # NOTA: approssimata
-            "crest_factor_db": float(crest_factor),
-        },
+        "loudness": loudness,
         "bands_energy_percent": band_percent,
-        "transients": {
-            "count": int(num_transients),
-            "density_per_sec": float(transient_density),
-        },
+        "transients": transients,
         "duration_sec": float(duration_sec),
     }
-   
+
+
+# ============================================================
+# 2B. ANALISI MULTI-FINESTRA (UNA SOLA DECODIFICA E STFT)
+# ============================================================
+
+# Il tempogramma viene salvato una colonna ogni TEMPOGRAM_STRIDE frame:
+# il BPM di una finestra usa la media delle colonne, quindi basta un campione
+TEMPOGRAM_STRIDE = 8
+
+
+@tracing.traced("compute_frame_features")
+def compute_frame_features(y, sr,
+                           frame_length=DEFAULT_FRAME_LENGTH,
+                           hop_length=DEFAULT_HOP_LENGTH):
+    """
+    Calcola UNA volta le grandezze frame per frame di tutta la traccia,
+    in forma compatta (niente spettrogramma completo):
+        - rms: RMS per frame
+        - band_mag: somma delle magnitudini per frame nelle BROAD_BANDS
+        - fine_band_power: potenza media per frame nelle FINE_BANDS
+        - onset_env: onset envelope (dallo stesso STFT, niente seconda STFT)
+        - tempogram: tempogramma dell'onset envelope (una colonna ogni TEMPOGRAM_STRIDE)
+        - chroma: chroma (dallo stesso STFT, al posto di chroma_cqt)
+        - hop_energy / hop_kw_energy / hop_peak / hop_true_peak: energia, energia
+          K-pesata, picco e true peak per blocchi di hop_length campioni
+          (per loudness, crest factor e true peak di qualsiasi finestra)
+    Tutte le grandezze condividono lo stesso hop: una finestra temporale
+    corrisponde allo stesso intervallo di colonne in ciascun array.
+    Ritorna:
+        dizionario con gli array frame-level + i parametri usati
+    """
+    import librosa
+    import key_detection
+    import loudness_meter
+
+    y = y.astype(np.float32)
+
+    rms = librosa.feature.rms(y=y,
+                              frame_length=frame_length,
+                              hop_length=hop_length)[0]
+
+    stft = librosa.stft(y, n_fft=frame_length, hop_length=hop_length)
+    spectrogram = np.abs(stft)
+    power = spectrogram**2
+
+    # Tutte le bande con un prodotto matrice per set (nessuna copia per banda)
+    band_mag = BROAD_BAND_SET.apply(spectrogram, sr, frame_length)
+    fine_band_power = FINE_BAND_SET.apply(power, sr, frame_length)
+
+    # Onset envelope dal mel-spettrogramma calcolato sulla STFT già pronta
+    mel = librosa.feature.melspectrogram(S=power, sr=sr)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr,
+                                             hop_length=hop_length)
+
+    # Tempogramma: il BPM di una finestra sarà la media delle sue colonne
+    # (calcolate solo una ogni TEMPOGRAM_STRIDE frame)
+    tempogram = strided_tempogram(onset_env, TEMPOGRAM_STRIDE)
+
+    # Chroma dalla stessa STFT (molto più economico di chroma_cqt)
+    chroma = key_detection.chroma_from_power(power, sr, frame_length)
+
+    return {
+        "sr": sr,
+        "frame_length": frame_length,
+        "hop_length": hop_length,
+        "n_samples": len(y),
+        "rms": rms.astype(np.float32),
+        "band_mag": band_mag.astype(np.float32),
+        "fine_band_power": fine_band_power.astype(np.float32),
+        "onset_env": onset_env.astype(np.float32),
+        "tempogram": tempogram.astype(np.float32),
+        "chroma": chroma.astype(np.float32),
+        "hop_energy": loudness_meter.hop_energy(y, hop_length),
+        "hop_kw_energy": loudness_meter.hop_energy(loudness_meter.kweight(y, sr), hop_length),
+        "hop_peak": loudness_meter.hop_peak(y, hop_length),
+        "hop_true_peak": loudness_meter.hop_true_peak(y, sr, hop_length),
+    }
+
+
+def normalize_windows(windows, duration):
+    """
+    Converte la lista di finestre in una forma uniforme:
+        [{"label": str, "start": float, "end": float}, ...]
+    Accetta tuple (start, end), tuple (label, start, end) o dizionari
+    {"label", "start", "end"}. end <= 0 significa "fino alla fine della traccia".
+    Solleva ValueError per finestre vuote o fuori dalla traccia.
+    """
+    normalized = []
+    for i, w in enumerate(windows):
+        if isinstance(w, dict):
+            label, start, end = w.get("label"), w.get("start", 0.0), w.get("end", -1.0)
+        elif isinstance(w, (list, tuple)) and len(w) == 3:
+            label, start, end = w
+        elif isinstance(w, (list, tuple)) and len(w) == 2:
+            label, (start, end) = None, w
+        else:
+            raise ValueError(f"Finestra {i} non valida: serve {{label, start, end}}, "
+                             f"[start, end] oppure [label, start, end]")
+
+        try:
+            start, end = float(start), float(end)
+        except (TypeError, ValueError):
+            raise ValueError(f"Finestra {i} non valida: start ed end devono essere numeri")
+        if not (np.isfinite(start) and np.isfinite(end)):
+            raise ValueError(f"Finestra {i} non valida: start ed end devono essere numeri finiti")
+
+        start = max(0.0, start)
+        if end <= 0.0 or end > duration:
+            end = duration
+        if end <= start:
+            raise ValueError(f"Finestra {i} non valida: start={start:.2f}s, end={end:.2f}s")
+
+        normalized.append({
+            "label": label or f"finestra_{i + 1}",
+            "start": start,
+            "end": end,
+        })
+    return normalized
+
+
+@tracing.traced("summarize_window")
+def summarize_window(frames, start_sec, end_sec):
+    """
+    Riassunto di una finestra [start_sec, end_sec] ottenuto affettando e riducendo
+    gli array di compute_frame_features (nessuna nuova STFT né nuovo filtraggio).
+    Ritorna:
+        (summary, advanced) con lo stesso formato di summarize_track_features
+        e compute_advanced_analysis.
+    NOTA: loudness e true peak vengono dalle energie/picchi per hop già salvati
+    (nessun rifiltraggio del segnale).
+    """
+    import librosa
+    import key_detection
+    import loudness_meter
+
+    sr = frames["sr"]
+    hop = frames["hop_length"]
+    n_frames = frames["rms"].shape[0]
+    n_hops = frames["hop_energy"].shape[0]
+
+    # Colonne corrispondenti alla finestra (STFT centrata: frame k ↔ k * hop)
+    f0 = min(int(round(start_sec * sr / hop)), n_frames - 1)
+    f1 = min(max(f0 + 1, int(round(end_sec * sr / hop))), n_frames)
+    # Blocchi di campioni [k * hop, (k + 1) * hop) coperti dalla finestra
+    h0 = min(int(round(start_sec * sr / hop)), n_hops - 1)
+    h1 = min(max(h0 + 1, int(round(end_sec * sr / hop))), n_hops)
+    # Colonne del tempogramma (sottocampionato) dentro la finestra
+    t0 = f0 // TEMPOGRAM_STRIDE
+    t1 = max(t0 + 1, -(-f1 // TEMPOGRAM_STRIDE))
+
+    duration = end_sec - start_sec
+    rms = np.asarray(frames["rms"][f0:f1])
+    onset_env = np.asarray(frames["onset_env"][f0:f1])
+    chroma_mean = np.asarray(frames["chroma"][:, f0:f1]).mean(axis=1)
+
+    tempogram = np.asarray(frames["tempogram"][:, t0:t1])
+    tempo_array = librosa.feature.tempo(tg=tempogram, sr=sr, hop_length=hop)
+    bpm = float(tempo_array[0]) if len(tempo_array) > 0 else None
+
+    # Tonalità dal chroma medio della finestra
+    key = key_detection.estimate_key(chroma_mean)
+
+    # Bande larghe: la media nel tempo delle somme per frame equivale alla
+    # somma dello spettro medio usata in summarize_track_features
+    band_energies = np.asarray(frames["band_mag"][:, f0:f1]).mean(axis=1)
+
+    summary = {
+        "duration_sec": duration,
+        "rms_mean": float(np.mean(rms)),
+        "rms_max": float(np.max(rms)),
+        "bpm": bpm,
+        "key_root": key["key_root"],
+        "key_mode": key["key_mode"],
+        "key_confidence": key["key_confidence"],
+        "energy_percent": to_percent(BROAD_BAND_SET.names, band_energies),
+    }
+
+    # Bande fini
+    fine_energies = np.asarray(frames["fine_band_power"][:, f0:f1]).mean(axis=1)
+    bands_percent = to_percent(FINE_BAND_SET.names, fine_energies)
+
+    # Loudness e crest factor dalle energie per hop
+    loudness = loudness_meter.loudness_from_hop_energy(
+        np.asarray(frames["hop_kw_energy"][h0:h1]), sr, hop)
+    n_win_samples = max(1, min(frames["n_samples"], h1 * hop) - h0 * hop)
+    rms_val = np.sqrt(np.sum(frames["hop_energy"][h0:h1]) / n_win_samples)
+    peak_val = float(np.max(frames["hop_peak"][h0:h1]))
+    loudness["crest_factor_db"] = float(20 * np.log10((peak_val + 1e-9) / (rms_val + 1e-9)))
+    loudness["true_peak_dbtp"] = loudness_meter.amplitude_to_db(float(np.max(frames["hop_true_peak"][h0:h1])))
+    loudness["sample_peak_dbfs"] = loudness_meter.amplitude_to_db(peak_val)
+
+    advanced = {
+        "loudness": loudness,
+        "bands_energy_percent": bands_percent,
+        "transients": transient_stats(onset_env, sr, duration, hop_length=hop),
+        "duration_sec": float(duration),
+    }
+
+    return summary, advanced
+
+
+def compare_windows(window_results):
+    """
+    Confronto tra finestre: ogni finestra viene confrontata con la prima
+    (differenze RMS/bande come compare_summaries + LUFS, BPM e transienti).
+    """
+    if len(window_results) < 2:
+        return None
+
+    base = window_results[0]
+    base_loud = base["advanced"]["loudness"]
+    comparisons = []
+    for w in window_results[1:]:
+        diff = compare_summaries(w["summary"], base["summary"])
+        loud = w["advanced"]["loudness"]
+        diff.update({
+            "label": w["label"],
+            "against": base["label"],
+            "diff_integrated_lufs": loud["integrated_lufs"] - base_loud["integrated_lufs"],
+            "diff_crest_factor_db": loud["crest_factor_db"] - base_loud["crest_factor_db"],
+            "diff_bpm": (w["summary"]["bpm"] or 0) - (base["summary"]["bpm"] or 0),
+            "diff_transient_density": (
+                w["advanced"]["transients"]["density_per_sec"]
+                - base["advanced"]["transients"]["density_per_sec"]
+            ),
+        })
+        comparisons.append(diff)
+
+    loudest = max(window_results, key=lambda w: w["advanced"]["loudness"]["integrated_lufs"])
+    return {
+        "reference_window": base["label"],
+        "loudest_window": loudest["label"],
+        "windows": comparisons,
+    }
+
+
+@tracing.traced("analyze_windows")
+def analyze_windows(y, sr, windows, compare=True):
+    """
+    Analizza più finestre temporali della stessa traccia (es. intro, breakdown,
+    drop 1, drop 2) con una sola decodifica e una sola STFT.
+    Parametri:
+        y, sr: segnale già caricato (es. da load_audio)
+        windows: lista di finestre (vedi normalize_windows)
+        compare: se True aggiunge il confronto tra finestre
+    Ritorna:
+        {"windows": [...], "comparison": {...} | None}
+    """
+    duration = len(y) / sr
+    windows = normalize_windows(windows, duration)
+    frames = compute_frame_features(y, sr)
+
+    results = []
+    for w in windows:
+        summary, advanced = summarize_window(frames, w["start"], w["end"])
+        genre, reason = estimate_genre(summary, advanced)
+        results.append({
+            "label": w["label"],
+            "start_sec": w["start"],
+            "end_sec": w["end"],
+            "summary": summary,
+            "advanced": advanced,
+            "genre": genre,
+            "genre_reason": reason,
+        })
+
+    return {
+        "windows": results,
+        "comparison": compare_windows(results) if compare else None,
+    }
+
+
+# ============================================================
+# 2C. SELEZIONE AUTOMATICA DEL SEGMENTO RAPPRESENTATIVO
+# ============================================================
+# Su una traccia intera (es. 6 minuti) gran parte dei consigli riguarda
+# il drop: invece di estrarre le feature su tutto il brano si cerca la
+# sezione più carica con un passaggio economico sull'inviluppo
+# (energia e "attacchi" ogni AUTO_WINDOW_HOP_SEC), poi si analizza solo quella.
+
+# Lunghezza della finestra scelta automaticamente (secondi)
+AUTO_WINDOW_SEC = 30.0
+
+# Finestra più corta accettata dalle API: sotto non ci sono battute sufficienti
+# per BPM, tonalità e loudness
+AUTO_WINDOW_MIN_SEC = 5.0
+
+# Sotto questa durata (o sotto 2 finestre) si analizza comunque tutta la traccia
+AUTO_WINDOW_MIN_TRACK_SEC = 60.0
+
+# Risoluzione dell'inviluppo usato per la ricerca
+AUTO_WINDOW_HOP_SEC = 0.025
+
+# Peso dell'attività ritmica (attacchi) rispetto all'energia nel punteggio
+AUTO_WINDOW_ONSET_WEIGHT = 0.5
+
+
+def find_representative_window(y, sr, window_sec=AUTO_WINDOW_SEC):
+    """
+    Trova la finestra di window_sec secondi più "rappresentativa" (tipicamente il drop):
+    energia media alta + molta attività ritmica.
+    Costo: una riduzione per blocchi del segnale e qualche somma cumulativa.
+    Ritorna:
+        {"start": s, "end": s, "score": float, "energy_db": float, "onset_activity": float}
+    """
+    import loudness_meter
+
+    hop = max(1, int(round(AUTO_WINDOW_HOP_SEC * sr)))
+    energy = loudness_meter.hop_energy(y, hop) / hop
+    n_hops = len(energy)
+    win = min(n_hops, max(1, int(round(window_sec * sr / hop))))
+
+    # Inviluppo in dB e "attacchi" (salite di energia tra un blocco e il successivo)
+    energy_db = 10.0 * np.log10(energy + 1e-10)
+    rises = np.maximum(np.diff(energy_db, prepend=energy_db[0]), 0.0)
+
+    # Media mobile su tutte le possibili finestre con le somme cumulative
+    def window_means(x):
+        csum = np.concatenate([[0.0], np.cumsum(x)])
+        return (csum[win:] - csum[:-win]) / win
+
+    mean_db = window_means(energy_db)
+    mean_rise = window_means(rises)
+
+    def normalize(x):
+        span = np.ptp(x)
+        return (x - x.min()) / span if span > 0 else np.zeros_like(x)
+
+    score = normalize(mean_db) + AUTO_WINDOW_ONSET_WEIGHT * normalize(mean_rise)
+    best = int(np.argmax(score))
+    start = best * hop / sr
+    return {
+        "start": float(start),
+        "end": float(min(len(y) / sr, start + win * hop / sr)),
+        "score": float(score[best]),
+        "energy_db": float(mean_db[best]),
+        "onset_activity": float(mean_rise[best]),
+    }
+
+
+@tracing.traced("select_analysis_window")
+def select_analysis_window(y, sr, auto_window=False, window_sec=AUTO_WINDOW_SEC):
+    """
+    Decide quale parte della traccia analizzare.
+    Ritorna:
+        (segnale da analizzare, {"mode": "full" | "auto", "start", "end", "track_duration_sec"})
+    """
+    duration = len(y) / sr
+    info = {"mode": "full", "start": 0.0, "end": duration, "track_duration_sec": duration}
+    if not auto_window or duration < max(AUTO_WINDOW_MIN_TRACK_SEC, 2 * window_sec):
+        return y, info
+
+    window = find_representative_window(y, sr, window_sec)
+    info.update(mode="auto", start=window["start"], end=window["end"], score=window["score"])
+    print(f"🎯 Finestra automatica: {window['start']:.1f}s → {window['end']:.1f}s "
+          f"(su {duration:.1f}s di traccia)")
+    return y[int(window["start"] * sr):int(window["end"] * sr)], info
+
+
+def trim_window(n_samples, sr, trim_start, trim_end):
+    """
+    Taglio manuale [trim_start, trim_end] (secondi) limitato alla durata della traccia.
+    Ritorna (primo campione, ultimo campione, {"mode": "trim", "start", "end",
+    "track_duration_sec"}) oppure None se il taglio non è valido (trim_end <= 0 = nessun taglio).
+    """
+    if not (trim_end > 0.0 and trim_end > trim_start):
+        return None
+
+    # Clamp sugli estremi per evitare crash
+    start = max(0, min(int(trim_start * sr), n_samples))
+    end = max(0, min(int(trim_end * sr), n_samples))
+    if end <= start:
+        return None
+    return start, end, {"mode": "trim", "start": start / sr, "end": end / sr,
+                        "track_duration_sec": n_samples / sr}
+
+
+# ============================================================
+# 2D. IMMAGINE STEREO (MID / SIDE)
+# ============================================================
+
+@tracing.traced("stereo_analysis")
+def compute_stereo_analysis(y_channels, sr, band_set=FINE_BAND_SET):
+    """
+    Larghezza stereo per banda, correlazione L/R nel tempo e mono-compatibilità
+    dei bassi (vedi stereo_analysis). None per le tracce mono.
+    """
+    return stereo_analysis.compute_stereo_analysis(y_channels, sr, band_set)
+
 
 # ============================================================
 # 3. RIASSUNTO NUMERICO (PER LLM)
@@ -274,7 +808,8 @@ def band_energy(mean_spectrum, freqs, low, high):
     return float(np.sum(mean_spectrum[mask]))
 
 
-def summarize_track_features(features):
+@tracing.traced("summarize_track_features")
+def summarize_track_features(features, band_set=BROAD_BAND_SET):
     """
     Crea un riassunto numerico leggibile per un LLM:
         - durata
@@ -289,25 +824,16 @@ def summarize_track_features(features):
             * high (4000-20000)
     Parametri:
         features: dizionario restituito da compute_features()
+        band_set: bande della distribuzione di energia (default: le 5 sopra)
     Ritorna:
         summary: dizionario compatto con i dati principali
     """
     # Estrae componenti dal dizionario delle feature
     rms = features["rms"]
-    freqs = features["freqs"]
     mean_spectrum = features["mean_spectrum"]
 
-    # Calcola energia per ciascuna banda
-    energy_sub = band_energy(mean_spectrum, freqs, 20, 60)
-    energy_bass = band_energy(mean_spectrum, freqs, 60, 150)
-    energy_lowmid = band_energy(mean_spectrum, freqs, 150, 500)
-    energy_highmid = band_energy(mean_spectrum, freqs, 500, 4000)
-    energy_high = band_energy(mean_spectrum, freqs, 4000, 20000)
-
-    # Somma totale per normalizzare a percentuali
-    total_energy = energy_sub + energy_bass + energy_lowmid + energy_highmid + energy_high
-    if total_energy == 0:
-        total_energy = 1.0  # Evita divisione per zero
+    # Energia di tutte le bande con un solo prodotto matrice sullo spettro medio
+    energies = band_set.apply(mean_spectrum, features["sr"], features["n_fft"])
 
     # Costruisce il riassunto
     summary = {
@@ -316,13 +842,9 @@ def summarize_track_features(features):
         "rms_max": float(np.max(rms)),
         "bpm": features["bpm"],
         "key_root": features["key_root"],
-        "energy_percent": {
-            "sub": energy_sub / total_energy * 100.0,
-            "bass": energy_bass / total_energy * 100.0,
-            "lowmid": energy_lowmid / total_energy * 100.0,
-            "highmid": energy_highmid / total_energy * 100.0,
-            "high": energy_high / total_energy * 100.0,
-        }
+        "key_mode": features["key_mode"],
+        "key_confidence": features["key_confidence"],
+        "energy_percent": to_percent(band_set.names, energies),
     }
 
     return summary
@@ -440,41 +962,54 @@ def estimate_genre_from_summary(summary):
 # 5. CONTESTO COMUNE PER GLI AGENTI
 # ============================================================
 
-def estimate_genre_ml(y, sr):
+def estimate_genre_ml(summary, adv_analysis):
     """
-    Stub per un futuro modello ML di classificazione del genere.
-    Al momento ritorna (None, motivo), così il codice fa fallback
-    all'euristica basata su BPM + distribuzione delle energie.
+    Classificatore di genere addestrato (genre_classifier, vedi train_genre_model.py)
+    sulle feature già calcolate: bande, BPM, LUFS, LRA, crest factor, transienti.
+    Ritorna (None, motivo) se il modello non c'è o non è abbastanza sicuro,
+    così il codice fa fallback all'euristica basata su BPM + distribuzione delle energie.
     """
-    return None, "Modello ML non ancora addestrato: uso l'euristica (BPM + distribuzione energie)."
+    import genre_classifier
+
+    model = genre_classifier.get_genre_model()
+    if model is None:
+        return None, "Modello ML non ancora addestrato: uso l'euristica (BPM + distribuzione energie)."
+
+    genres, probs = model.predict(genre_classifier.feature_vector(summary, adv_analysis))
+    genre, prob = str(genres), float(probs)
+    if prob < genre_classifier.GENRE_MIN_PROBABILITY:
+        return None, f"Modello ML incerto ({genre}, p={prob:.2f}): uso l'euristica."
+    return genre, f"Classificatore ML sulle feature audio (probabilità {prob:.2f})."
+
 
+def estimate_genre(summary, adv_analysis=None):
+    """Genere dal modello ML se disponibile e sicuro, altrimenti dall'euristica."""
+    if adv_analysis is not None:
+        ml_genre, ml_reason = estimate_genre_ml(summary, adv_analysis)
+        if ml_genre is not None:
+            return ml_genre, ml_reason
+    return estimate_genre_from_summary(summary)
+
+@tracing.traced("build_common_context")
 def build_common_context(user_summary,
                          comparison_summary=None,
                          y_audio=None,
                          sr=None,
-                         adv_analysis=None):
+                         adv_analysis=None,
+                         similar_references=None):
     """
     Costruisce una descrizione testuale dei dati tecnici,
     riutilizzabile in tutti i prompt degli agenti.
     Usa:
       - summary (RMS, BPM, key, energy per bande)
-      - eventuale confronto con reference
+      - eventuale confronto con reference (caricata o la più vicina della libreria)
+      - reference simili trovate nella libreria (similar_references)
       - modello ML per il genere (se disponibile)
       - analisi avanzata (LUFS, LRA, crest factor, transienti, bande fini)
     """
 
     # 1) Genere: prova con modello ML, poi fallback a euristica
-    auto_genre = None
-    genre_reason = ""
-
-    if y_audio is not None and sr is not None:
-        ml_genre, ml_reason = estimate_genre_ml(y_audio, sr)
-        if ml_genre is not None:
-            auto_genre = ml_genre
-            genre_reason = ml_reason
-
-    if auto_genre is None:
-        auto_genre, genre_reason = estimate_genre_from_summary(user_summary)
+    auto_genre, genre_reason = estimate_genre(user_summary, adv_analysis)
 
     # 2) Dati base dal summary
     e = user_summary["energy_percent"]
@@ -485,7 +1020,9 @@ def build_common_context(user_summary,
     lines.append("")
     lines.append(f"Durata: {user_summary['duration_sec']:.1f} secondi")
     lines.append(f"BPM stimato: {user_summary.get('bpm', 0) or 0:.1f}")
-    lines.append(f"Tonalità stimata (nota fondamentale): {user_summary.get('key_root', 'N/A')}")
+    key_mode = {"major": "maggiore", "minor": "minore"}.get(user_summary.get("key_mode"), "")
+    lines.append(f"Tonalità stimata: {user_summary.get('key_root', 'N/A')} {key_mode} "
+                 f"(confidenza {user_summary.get('key_confidence', 0.0):.2f})")
     lines.append(f"RMS medio: {user_summary['rms_mean']:.5f}")
     lines.append(f"RMS massimo: {user_summary['rms_max']:.5f}")
     lines.append("")
@@ -500,7 +1037,11 @@ def build_common_context(user_summary,
     if comparison_summary is not None:
         de = comparison_summary["diff_energy_percent"]
         lines.append("")
-        lines.append("Confronto con traccia di reference (utente - reference):")
+        if comparison_summary.get("reference_source") == "library":
+            lines.append(f"Confronto con la reference più simile della libreria "
+                         f"({comparison_summary['reference_name']}, utente - reference):")
+        else:
+            lines.append("Confronto con traccia di reference (utente - reference):")
         lines.append(f"- Differenza RMS medio: {comparison_summary['diff_rms_mean']:.5f}")
         lines.append("Differenze energia (punti percentuali, positivo = utente più carico):")
         lines.append(f"  * Sub: {de['sub']:+.1f}")
@@ -509,6 +1050,15 @@ def build_common_context(user_summary,
         lines.append(f"  * High-mid: {de['highmid']:+.1f}")
         lines.append(f"  * High: {de['high']:+.1f}")
 
+    # 3b) Tracce più simili della libreria (se presenti)
+    if similar_references:
+        lines.append("")
+        lines.append("Tracce più simili già analizzate (bande, BPM, loudness):")
+        for ref in similar_references:
+            genre = f", {ref['genre']}" if ref.get("genre") else ""
+            lines.append(f"- {ref['name']}: distanza {ref['distance']:.2f}, "
+                         f"BPM {ref.get('bpm') or 0:.1f}{genre}")
+
     # 4) Analisi avanzata (se disponibile)
     if adv_analysis is not None:
         loud = adv_analysis["loudness"]
@@ -518,7 +1068,9 @@ def build_common_context(user_summary,
         lines.append("")
         lines.append("Analisi avanzata di loudness e dinamica:")
         lines.append(f"- LUFS integrato: {loud['integrated_lufs']:.1f} LUFS")
-        lines.append(f"- Loudness Range (LRA): {loud['loudness_range']:.1f} dB")
+        lines.append(f"- Loudness Range (LRA): {loud['loudness_range']:.1f} LU")
+        lines.append(f"- Loudness short-term massima: {loud['max_short_term_lufs']:.1f} LUFS")
+        lines.append(f"- True peak: {loud['true_peak_dbtp']:.1f} dBTP")
         lines.append(f"- Crest factor: {loud['crest_factor_db']:.1f} dB")
 
         lines.append("")
@@ -536,10 +1088,38 @@ def build_common_context(user_summary,
         lines.append(f"- Numero transiente stimati: {trans['count']}")
         lines.append(f"- Densità transienti: {trans['density_per_sec']:.2f} al secondo")
 
+        lines.extend(stereo_context_lines(adv_analysis))
+
     context_text = "\n".join(lines)
     return auto_genre, context_text
 
 
+def stereo_context_lines(adv_analysis):
+    """Righe del contesto sull'immagine stereo (vuote se l'analisi stereo non è disponibile)."""
+    if adv_analysis.get("channels") == 1:
+        return ["", "Immagine stereo: traccia mono (un solo canale)."]
+    stereo = adv_analysis.get("stereo")
+    if not stereo:
+        return []
+
+    low = stereo["low_end"]
+    lines = ["", "Immagine stereo (mid/side):"]
+    lines.append(f"- Correlazione L/R complessiva: {stereo['correlation']:+.2f} "
+                 "(+1 mono, 0 canali indipendenti, <0 fasi opposte)")
+    over_time = stereo.get("correlation_over_time")
+    if over_time:
+        lines.append(f"- Correlazione nel tempo: minima {over_time['min']:+.2f}, "
+                     f"5° percentile {over_time['p5']:+.2f}, "
+                     f"{over_time['negative_fraction'] * 100:.0f}% del tempo sotto zero")
+    lines.append(f"- Rapporto side/mid complessivo: {stereo['side_to_mid_db']:.1f} dB")
+    lines.append(f"- Bilanciamento L/R: {stereo['balance_db']:+.1f} dB (positivo = più a sinistra)")
+    lines.append(f"- Bassi sotto {low['crossover_hz']:.0f} Hz: {low['mono_ratio'] * 100:.0f}% mono, "
+                 f"correlazione {low['correlation']:+.2f}, side/mid {low['side_to_mid_db']:.1f} dB")
+    lines.append("- Side/mid per banda: " + ", ".join(
+        f"{name} {band['side_to_mid_db']:.1f} dB" for name, band in stereo["bands"].items()))
+    return lines
+
+
 # ============================================================
 # 5B. FUNZIONI DI SUPPORTO PER RAG
 # ============================================================
@@ -552,7 +1132,8 @@ def genre_to_kb_key(auto_genre: str) -> str:
     if not auto_genre:
         return "all"
 
-    g = auto_genre.lower().strip()
+    # Le etichette del classificatore vengono dai nomi delle cartelle (es. "future_bass")
+    g = auto_genre.lower().replace("_", " ").replace("-", " ").strip()
 
     # Progressive House
     if "progressive" in g:
@@ -584,6 +1165,25 @@ def genre_to_kb_key(auto_genre: str) -> str:
     return "all"
 
 
+# Collection Chroma condivisa (aperta alla prima richiesta o nel warm-up)
+_kb_collection = None
+
+
+def get_kb_collection():
+    """
+    Apre (una sola volta) il DB Chroma persistente e ritorna la collection della KB.
+    Le chiamate successive riusano lo stesso oggetto, evitando di riaprire
+    il DB a ogni query RAG.
+    """
+    global _kb_collection
+    if _kb_collection is None:
+        import chromadb
+        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        _kb_collection = client.get_collection(KB_COLLECTION_NAME)
+    return _kb_collection
+
+
+@tracing.traced("rag_retrieve")
 def rag_retrieve_context(query: str,
                          topic: str = "generic",
                          genre: str = "all",
@@ -594,13 +1194,18 @@ def rag_retrieve_context(query: str,
     - nessun campo `where` se non ci sono filtri.
     """
 
+    import ollama
+
     try:
-        # Crea client persistente su cartella DB
-        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        collection = client.get_collection(KB_COLLECTION_NAME)
+        # Collection della KB (aperta una sola volta per processo)
+        with tracing.span("chroma_open"):
+            collection = get_kb_collection()
 
         # Calcola embedding della query con Ollama usando il modello fisso
-        emb_res = ollama.embeddings(model=OLLAMA_EMBED_MODEL, prompt=query)
+        with tracing.span("rag_embedding"):
+            emb_res = ollama.embeddings(model=OLLAMA_EMBED_MODEL,
+                                        prompt=query,
+                                        keep_alive=OLLAMA_KEEP_ALIVE)
         query_vec = emb_res["embedding"]
 
         # Decidiamo il filtro where
@@ -627,7 +1232,8 @@ def rag_retrieve_context(query: str,
             query_kwargs["where"] = where
 
         # Eseguiamo la query
-        results = collection.query(**query_kwargs)
+        with tracing.span("chroma_query"):
+            results = collection.query(**query_kwargs)
 
         # Estraiamo i documenti (lista di liste: [ [doc1, doc2, ...] ])
         docs = results.get("documents", [[]])[0]
@@ -646,17 +1252,22 @@ def rag_retrieve_context(query: str,
 # 6. FUNZIONE LLM GENERICA PER RUOLI (AGENTI)
 # ============================================================
 
+@tracing.traced("llm_call")
 def call_llm_role(system_prompt: str,
                   user_prompt: str,
-                  model_name: str = None) -> str:
+                  model_name: str = None,
+                  agent: str = "generic") -> str:
     """
     Chiama il modello Ollama specificando:
         - system_prompt: ruolo e personalità dell'agente
         - user_prompt: dati tecnici + compito da svolgere
+        - agent: nome dell'agente per la telemetria (token, token/s, caricamenti)
     Usa sempre il modello 'mistral' se model_name è None.
     Ritorna:
         testo della risposta del modello
     """
+    import ollama
+
     # Se non è stato passato un modello, usiamo il modello di default
     if model_name is None:
         model_name = OLLAMA_CHAT_MODEL
@@ -678,24 +1289,47 @@ def call_llm_role(system_prompt: str,
             options={
                 "num_predict": MAX_LLM_TOKENS
             },
+            # Mantiene il modello caricato tra una richiesta e l'altra
+            keep_alive=OLLAMA_KEEP_ALIVE,
         )
 
         # Estrae il contenuto testuale
         content = response["message"]["content"]
 
         print("✅ Risposta ricevuta dal modello.")
+        llm_telemetry.record_llm_call(llm_telemetry.llm_call_stats(response, agent, model_name))
         return content
 
     except Exception as e:
         # In caso di errore, mostra l'errore e ritorna un messaggio di fallback
         print("❌ ERRORE chiamando Ollama:", e)
-        return "Errore nella chiamata al modello LLM. Verifica che Ollama sia attivo e il modello sia installato."
+        return LLM_ERROR_TEXT
+
+
+# Testo restituito da call_llm_role quando Ollama non risponde (mai salvato in cache)
+LLM_ERROR_TEXT = "Errore nella chiamata al modello LLM. Verifica che Ollama sia attivo e il modello sia installato."
+
+
+def cached_agent(agent, auto_genre, user_summary, run_agent, comparison_summary=None, similar_references=None):
+    """
+    Esegue run_agent() oppure riusa la risposta di una traccia con la stessa
+    firma musicale (vedi agent_cache.AGENT_CACHE_POLICIES) e con lo stesso
+    confronto / le stesse tracce simili nel contesto comune.
+    Ritorna (testo, esito cache: "hit" / "miss" / None se l'agente non usa la cache).
+    """
+    text, hit = agent_cache.cached_agent_response(
+        agent, auto_genre, user_summary, OLLAMA_CHAT_MODEL, run_agent,
+        cacheable=lambda answer: answer != LLM_ERROR_TEXT,
+        comparison=comparison_summary,
+        references=[ref["name"] for ref in similar_references or []])
+    return text, None if hit is None else ("hit" if hit else "miss")
 
 
 # ============================================================
 # 7. DEFINIZIONE DEI 4 AGENTI (CON RAG)
 # ============================================================
 
+@tracing.traced("mix_agent")
 def run_mix_agent(common_context: str, auto_genre: str) -> str:
     """
     Agente 1: Mix Engineer
@@ -758,12 +1392,15 @@ def run_mix_agent(common_context: str, auto_genre: str) -> str:
         "2) Suggerisci azioni concrete in DAW (EQ, compressione, sidechain), "
         "indicando frequenze, direzione (boost/cut) e valori indicativi (dB, ratio, ecc.).\n"
         "3) Confronta, quando utile, la situazione del brano con le linee guida della knowledge base.\n"
+        "4) Se ci sono i dati stereo, commenta larghezza e compatibilità mono "
+        "(correlazione, bassi non mono sotto il crossover, bande troppo larghe o troppo strette).\n"
     )
 
     # Chiama l'LLM con questo ruolo
-    return call_llm_role(system, user)
+    return call_llm_role(system, user, agent="mix_agent")
 
 
+@tracing.traced("theory_agent")
 def run_theory_agent(common_context: str, auto_genre: str) -> str:
     """
     Agente 2: Music Theory / Harmony
@@ -824,9 +1461,10 @@ def run_theory_agent(common_context: str, auto_genre: str) -> str:
         "(pedal note, modal mixture, accordi a 5 voci, parallelismi, ecc.).\n"
     )
 
-    return call_llm_role(system, user)
+    return call_llm_role(system, user, agent="theory_agent")
 
 
+@tracing.traced("creative_agent")
 def run_creative_agent(common_context: str, auto_genre: str) -> str:
     """
     Agente 3: Creative Producer
@@ -894,9 +1532,10 @@ def run_creative_agent(common_context: str, auto_genre: str) -> str:
         "   NON aggiungere commenti dentro al blocco, solo linee NOME_NOTA DURATA.\n"
     )
 
-    return call_llm_role(system, user)
+    return call_llm_role(system, user, agent="creative_agent")
 
 
+@tracing.traced("orchestrator_agent")
 def run_orchestrator_agent(auto_genre: str,
                            common_context: str,
                            mix_text: str,
@@ -940,18 +1579,21 @@ def run_orchestrator_agent(auto_genre: str,
     user = "\n".join(lines)
 
     # Chiama l'LLM con il ruolo di orchestrator
-    return call_llm_role(system, user)
+    return call_llm_role(system, user, agent="orchestrator_agent")
 
 
 # ============================================================
 # 8. PIPELINE MULTI-AGENTE
 # ============================================================
 
+@tracing.traced("multiagent_pipeline")
 def run_multiagent_pipeline(user_summary,
                             comparison_summary=None,
                             y_audio=None,
                             sr=None,
-                            adv_analysis=None):
+                            adv_analysis=None,
+                            on_progress=None,
+                            similar_references=None):
     """
     Esegue la pipeline multi-agente:
         - costruisce il contesto comune
@@ -960,40 +1602,69 @@ def run_multiagent_pipeline(user_summary,
     Parametri:
         user_summary: riassunto della traccia utente
         comparison_summary: eventuale confronto con reference
+        similar_references: tracce simili della libreria (vedi find_library_references)
+        on_progress: funzione opzionale on_progress(chiave, valore) chiamata appena
+                     è pronto ciascun risultato parziale ("genre", "context",
+                     "mix_agent", "theory_agent", "creative_agent", "orchestrator_agent")
     Ritorna:
         dizionario con:
             - genere stimato
             - testo degli agenti
             - piano finale
+            - llm_stats: token, token/s e caricamenti modello per chiamata e totali
+            - agent_cache: esito della cache delle risposte per agente (vedi agent_cache)
     """
+    def notify(key, value):
+        if on_progress is not None:
+            on_progress(key, value)
+
     # Costruisce contesto comune e stima genere
-    
-    
     auto_genre, common_context = build_common_context(
         user_summary=user_summary,
         comparison_summary=comparison_summary,
         y_audio=y_audio,
         sr=sr,
-        adv_analysis=adv_analysis
-    )
-
-    # Esegue agente Mix (con RAG)
-    mix_text = run_mix_agent(common_context, auto_genre)
-
-    # Esegue agente Teoria Musicale (con RAG)
-    theory_text = run_theory_agent(common_context, auto_genre)
-
-    # Esegue agente Creativo (con RAG + blocco MIDI)
-    creative_text = run_creative_agent(common_context, auto_genre)
-
-    # Esegue Orchestrator (unisce tutto)
-    final_text = run_orchestrator_agent(
-        auto_genre=auto_genre,
-        common_context=common_context,
-        mix_text=mix_text,
-        theory_text=theory_text,
-        creative_text=creative_text
+        adv_analysis=adv_analysis,
+        similar_references=similar_references
     )
+    notify("genre", auto_genre)
+    notify("context", common_context)
+
+    # Token e velocità di ogni chiamata LLM di questa analisi
+    with llm_telemetry.collect_llm_calls() as llm_calls:
+        # Esito della cache delle risposte per agente ("hit" / "miss" / None);
+        # confronto e tracce simili sono nel contesto, quindi anche nella firma
+        cache_results = {}
+        cache_context = {"comparison_summary": comparison_summary,
+                         "similar_references": similar_references}
+
+        # Esegue agente Mix (con RAG)
+        mix_text, cache_results["mix_agent"] = cached_agent(
+            "mix_agent", auto_genre, user_summary,
+            lambda: run_mix_agent(common_context, auto_genre), **cache_context)
+        notify("mix_agent", mix_text)
+
+        # Esegue agente Teoria Musicale (con RAG)
+        theory_text, cache_results["theory_agent"] = cached_agent(
+            "theory_agent", auto_genre, user_summary,
+            lambda: run_theory_agent(common_context, auto_genre), **cache_context)
+        notify("theory_agent", theory_text)
+
+        # Esegue agente Creativo (con RAG + blocco MIDI)
+        creative_text, cache_results["creative_agent"] = cached_agent(
+            "creative_agent", auto_genre, user_summary,
+            lambda: run_creative_agent(common_context, auto_genre), **cache_context)
+        notify("creative_agent", creative_text)
+
+        # Esegue Orchestrator (unisce tutto)
+        final_text = run_orchestrator_agent(
+            auto_genre=auto_genre,
+            common_context=common_context,
+            mix_text=mix_text,
+            theory_text=theory_text,
+            creative_text=creative_text
+        )
+        notify("orchestrator_agent", final_text)
 
     # Ritorna tutti i risultati
     return {
@@ -1003,7 +1674,12 @@ def run_multiagent_pipeline(user_summary,
         "theory_agent": theory_text,
         "creative_agent": creative_text,
         "orchestrator_agent": final_text,
-        "final_plan": final_text  # alias per compatibilità con la GUI
+        "final_plan": final_text,  # alias per compatibilità con la GUI
+        "llm_stats": {
+            "calls": llm_calls,
+            "totals": llm_telemetry.summarize_llm_calls(llm_calls),
+        },
+        "agent_cache": cache_results,
     }
 
 
@@ -1011,53 +1687,96 @@ def run_multiagent_pipeline(user_summary,
 # 9. FUNZIONE PRINCIPALE: ANALISI COMPLETA SENZA GRAFICI
 # ============================================================
 
+@tracing.traced("analyze_track")
 def analyze_track(user_path,
-                  reference_path=None):
+                  reference_path=None,
+                  auto_window=False,
+                  window_sec=AUTO_WINDOW_SEC,
+                  on_progress=None,
+                  profile=False,
+                  trim=None,
+                  track_name=None,
+                  track_hash=None):
     """
     Pipeline completa:
         - carica traccia utente
         - calcola feature audio
         - crea summary numerico
+        - analizza l'immagine stereo (mid/side) se la traccia ha due canali
         - (opzionale) analizza reference e confronta
         - lancia pipeline multi-agente (con RAG)
     Parametri:
-        user_path: percorso file audio utente
+        user_path: percorso file audio utente oppure file aperto (es. upload, io.BytesIO)
         reference_path: percorso file audio reference (o None)
+        auto_window: se True, sulle tracce lunghe analizza solo la sezione più
+                     rappresentativa (vedi find_representative_window)
+        window_sec: lunghezza della finestra automatica
+        on_progress: vedi run_multiagent_pipeline
+        profile: se True salva un profilo CPU + memoria dell'analisi (request_profiler)
+        trim: (inizio, fine) in secondi da analizzare; se valido ha la precedenza
+              sulla finestra automatica (vedi trim_window)
+        track_name: nome della traccia per log e libreria (default: il percorso)
+        track_hash: hash del file (similarity_index.file_track_id) se già calcolato
+                    dal chiamante, altrimenti viene calcolato qui
     Ritorna:
         dizionario con risultati multi-agente (incluso piano finale)
+        + "analyzed_window": parte di traccia effettivamente analizzata
+        + "profile": nome del file del profilo (solo con profile=True)
     """
-    print("🎧 Analisi traccia utente:", user_path)
+    track_name = track_name or user_path
+    if profile:
+        import request_profiler
+
+        with request_profiler.RequestProfile(f"analyze_track {track_name}") as prof:
+            results = analyze_track(user_path, reference_path, auto_window, window_sec, on_progress,
+                                    trim=trim, track_name=track_name, track_hash=track_hash)
+        results["profile"] = prof.artifact
+        return results
+
+    print("🎧 Analisi traccia utente:", track_name)
+
+    # Carica segnale audio utente (canali separati per l'analisi stereo + mix mono)
+    y_channels, y, sr = load_audio_channels(user_path)
+
+    # Taglio manuale sul segnale già decodificato, altrimenti eventuale
+    # finestra automatica: le feature vengono estratte solo lì
+    trimmed = trim_window(len(y), sr, *trim) if trim is not None else None
+    if trimmed is not None:
+        start, end, analyzed_window = trimmed
+        y, y_channels = y[start:end], y_channels[:, start:end]
+    else:
+        y, analyzed_window = select_analysis_window(y, sr, auto_window, window_sec)
+        if analyzed_window["mode"] == "auto":
+            y_channels = y_channels[:, int(analyzed_window["start"] * sr):int(analyzed_window["end"] * sr)]
 
-    # Carica segnale audio utente
-    y, sr = load_audio(user_path)
+    # Copia decimata condivisa da BPM, tonalità e transienti
+    low_rate = rhythm_signal(y, sr)
 
     # Calcola feature
-    feats = compute_features(y, sr)
+    feats = compute_features(y, sr, low_rate=low_rate)
 
     # Crea riassunto numerico
     user_summary = summarize_track_features(feats)
     
     # Analisi avanzata (LUFS, bande fini, transiente, ecc.)
-    adv_analysis = compute_advanced_analysis(y, sr)
-
-    # Inizializza confronto come None
-    comparison_summary = None
+    adv_analysis = compute_advanced_analysis(y, sr, low_rate=low_rate)
 
-    # Gestione opzionale della reference
-    if reference_path is not None:
-        # Verifica che il file esista
-        if os.path.exists(reference_path):
-            print("🎧 Analisi traccia di reference:", reference_path)
+    # Immagine stereo (larghezza per banda, correlazione, bassi mono)
+    adv_analysis["channels"] = int(y_channels.shape[0])
+    adv_analysis["stereo"] = compute_stereo_analysis(y_channels, sr)
+    del y_channels
 
-            # Carica e analizza la reference
-            y_ref, sr_ref = load_audio(reference_path)
-            feats_ref = compute_features(y_ref, sr_ref)
-            ref_summary = summarize_track_features(feats_ref)
+    # Confronto opzionale con la reference
+    comparison_summary = compare_with_reference(user_summary, reference_path)
 
-            # Crea confronto utente vs reference
-            comparison_summary = compare_summaries(user_summary, ref_summary)
-        else:
-            print(f"⚠️ Reference non trovata: {reference_path} (salto il confronto)")
+    # Reference simili dalla libreria (senza reference caricata: confronto con la più vicina),
+    # escluse la traccia stessa e le sue finestre; poi la traccia entra nella libreria
+    track_hash = track_hash or library_track_hash(user_path)
+    similar_references = find_library_references(user_summary, adv_analysis, exclude_hash=track_hash)
+    if comparison_summary is None:
+        comparison_summary = compare_with_library(user_summary, similar_references)
+    add_to_library(library_track_id(track_hash, analyzed_window), user_path, user_summary, adv_analysis,
+                   name=track_name)
 
     # Esegue pipeline multi-agente
     results = run_multiagent_pipeline(
@@ -1065,9 +1784,85 @@ def analyze_track(user_path,
         comparison_summary=comparison_summary,
         y_audio=y,
         sr=sr,
-        adv_analysis=adv_analysis
+        adv_analysis=adv_analysis,
+        on_progress=on_progress,
+        similar_references=similar_references
+    )
+    results["analyzed_window"] = analyzed_window
+    results["similar_references"] = similar_references
+
+    print_results(results)
+
+    # Ritorna il dizionario completo
+    return results
+
+
+@tracing.traced("compare_with_reference")
+def compare_with_reference(user_summary, reference_path):
+    """
+    Analizza la reference (se presente ed esistente) e la confronta con la traccia utente.
+    reference_path può essere un percorso oppure un file in memoria (es. io.BytesIO):
+    in questo caso non serve scrivere nulla su disco.
+    Ritorna il confronto di compare_summaries oppure None.
+    """
+    if reference_path is None:
+        return None
+
+    # Verifica che il file esista (solo per i percorsi su disco)
+    if isinstance(reference_path, (str, os.PathLike)) and not os.path.exists(reference_path):
+        print(f"⚠️ Reference non trovata: {reference_path} (salto il confronto)")
+        return None
+
+    print("🎧 Analisi traccia di reference:", reference_path)
+
+    # Carica e analizza la reference
+    y_ref, sr_ref = load_audio(reference_path)
+    feats_ref = compute_features(y_ref, sr_ref)
+    ref_summary = summarize_track_features(feats_ref)
+
+    # Crea confronto utente vs reference
+    return compare_summaries(user_summary, ref_summary)
+
+
+@tracing.traced("analyze_track_window")
+def analyze_track_window(frames,
+                         start_sec,
+                         end_sec,
+                         reference_path=None,
+                         on_progress=None,
+                         track_hash=None):
+    """
+    Come analyze_track, ma per un intervallo [start_sec, end_sec] di una traccia
+    di cui abbiamo già le feature frame-level (compute_frame_features / frame_store).
+    La parte DSP si riduce ad affettare gli array: pochi millisecondi.
+    on_progress: vedi run_multiagent_pipeline (risultati parziali man mano che arrivano).
+    track_hash: hash del file (similarity_index.file_track_id): la traccia e le sue
+                finestre già in libreria non vengono proposte come reference.
+    """
+    print(f"🎧 Analisi finestra {start_sec:.1f}s → {end_sec:.1f}s (feature frame-level)")
+
+    user_summary, adv_analysis = summarize_window(frames, start_sec, end_sec)
+    comparison_summary = compare_with_reference(user_summary, reference_path)
+
+    similar_references = find_library_references(user_summary, adv_analysis, exclude_hash=track_hash)
+    if comparison_summary is None:
+        comparison_summary = compare_with_library(user_summary, similar_references)
+
+    results = run_multiagent_pipeline(
+        user_summary=user_summary,
+        comparison_summary=comparison_summary,
+        adv_analysis=adv_analysis,
+        on_progress=on_progress,
+        similar_references=similar_references
     )
+    results["similar_references"] = similar_references
 
+    print_results(results)
+    return results
+
+
+def print_results(results):
+    """Stampa a terminale genere stimato e piano finale."""
     # Stampa genere stimato
     print("\n================ GENERE STIMATO =================\n")
     print(results["genre"])
@@ -1077,12 +1872,186 @@ def analyze_track(user_path,
     print(results["final_plan"])
     print("\n============================================================\n")
 
-    # Ritorna il dizionario completo
-    return results
+
+# ============================================================
+# 9B. LIBRERIA DI REFERENCE (INDICE DI SIMILARITÀ)
+# ============================================================
+
+def library_track_hash(source):
+    """
+    Hash del contenuto della traccia (similarity_index.file_track_id) da percorso,
+    file in memoria o file aperto e seekable. None se non calcolabile.
+    """
+    import similarity_index
+
+    if isinstance(source, (str, os.PathLike)):
+        return similarity_index.file_track_id(source)
+    if hasattr(source, "getbuffer"):
+        return similarity_index.file_track_id(source.getbuffer())
+    if hasattr(source, "read") and hasattr(source, "seek"):
+        return similarity_index.file_track_id(source)
+    return None
+
+
+def library_track_id(track_hash, analyzed_window=None):
+    """
+    Id della traccia nella libreria: hash del contenuto (library_track_hash)
+    + finestra analizzata, se non è la traccia intera. None senza hash.
+    """
+    if track_hash is None:
+        return None
+    if analyzed_window and analyzed_window.get("mode") != "full":
+        return track_hash + f"@{analyzed_window['start']:.2f}-{analyzed_window['end']:.2f}"
+    return track_hash
+
+
+@tracing.traced("library_search")
+def find_library_references(user_summary, adv_analysis=None, exclude_hash=None, k=LIBRARY_TOP_K):
+    """
+    Le k tracce della libreria più vicine per bande, BPM e loudness.
+    exclude_hash: hash del file analizzato (library_track_hash): la traccia intera
+                  e tutte le sue finestre già in libreria vengono escluse.
+    Ritorna una lista di {"name", "distance", "genre", "bpm", "summary"}
+    (vuota se la libreria è disattivata, vuota o non leggibile).
+    """
+    if LIBRARY_INDEX_DIR is None:
+        return []
+    import similarity_index
+
+    try:
+        index = similarity_index.get_similarity_index(LIBRARY_INDEX_DIR)
+        matches = index.search(similarity_index.compact_vector(user_summary, adv_analysis),
+                               k=k, exclude_hash=exclude_hash)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Libreria di reference non disponibile: {e}")
+        return []
+
+    return [{
+        "name": m["entry"]["name"],
+        "distance": m["distance"],
+        "genre": m["entry"].get("genre"),
+        "bpm": m["entry"]["summary"].get("bpm"),
+        "summary": m["entry"]["summary"],
+    } for m in matches]
+
+
+def compare_with_library(user_summary, similar_references):
+    """Confronto (compare_summaries) con la reference più vicina della libreria, o None."""
+    if not similar_references:
+        return None
+    nearest = similar_references[0]
+    comparison = compare_summaries(user_summary, nearest["summary"])
+    comparison["reference_name"] = nearest["name"]
+    comparison["reference_source"] = "library"
+    return comparison
+
+
+@tracing.traced("library_add")
+def add_to_library(track_id, source, user_summary, adv_analysis=None, name=None):
+    """
+    Aggiunge la traccia analizzata alla libreria (una sola volta per id).
+    name: nome mostrato (default: nome del file se source è un percorso, altrimenti l'id).
+    """
+    if LIBRARY_INDEX_DIR is None or track_id is None:
+        return False
+    import similarity_index
+
+    name = name or source
+    name = os.path.basename(name) if isinstance(name, (str, os.PathLike)) else track_id
+    genre, _ = estimate_genre(user_summary, adv_analysis)
+    try:
+        return similarity_index.get_similarity_index(LIBRARY_INDEX_DIR).add(
+            similarity_index.compact_vector(user_summary, adv_analysis),
+            similarity_index.make_entry(track_id, str(name), user_summary, adv_analysis, genre))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Impossibile aggiornare la libreria di reference: {e}")
+        return False
+
+
+# ============================================================
+# 10. WARM-UP (MODELLI, KB, JIT DSP)
+# ============================================================
+
+def make_warmup_signal(sr=DEFAULT_SR, seconds=3.0):
+    """
+    Genera un breve segnale sintetico (click a 128 BPM + tono La 440 Hz)
+    usato solo per "scaldare" librosa/numba prima del traffico reale.
+    """
+    t = np.arange(int(sr * seconds)) / sr
+    y = 0.2 * np.sin(2 * np.pi * 440.0 * t)
+
+    # Click di 5 ms su ogni battito a 128 BPM
+    beat_samples = int(sr * 60.0 / 128.0)
+    click_len = int(sr * 0.005)
+    for start in range(0, len(y) - click_len, beat_samples):
+        y[start:start + click_len] += 0.8
+
+    return y.astype(np.float32)
+
+
+def warmup_backend(include_llm=True, include_kb=True):
+    """
+    Prepara il processo a servire richieste senza "partenze a freddo":
+        0) importa le dipendenze pesanti (vedi preload_dependencies)
+        1) carica in Ollama il modello di chat e quello di embedding (con keep-alive)
+        2) apre la collection Chroma della KB
+        3) fa passare un segnale sintetico in compute_features,
+           compute_advanced_analysis e compute_frame_features per compilare
+           i kernel JIT (numba)
+    Ogni step è indipendente: un errore non blocca gli altri.
+    Ritorna:
+        dizionario step -> {"ok": bool, "seconds": float, "error": str | None}
+    """
+    def run_step(fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+            return {"ok": True, "seconds": time.perf_counter() - t0, "error": None}
+        except Exception as e:
+            return {"ok": False, "seconds": time.perf_counter() - t0, "error": str(e)}
+
+    def warm_chat_model():
+        import ollama
+        # Prompt vuoto: Ollama carica il modello senza generare testo
+        ollama.generate(model=OLLAMA_CHAT_MODEL, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+
+    def warm_embed_model():
+        import ollama
+        ollama.embeddings(model=OLLAMA_EMBED_MODEL, prompt="warm-up",
+                          keep_alive=OLLAMA_KEEP_ALIVE)
+
+    def warm_dsp():
+        y = make_warmup_signal()
+        feats = compute_features(y, DEFAULT_SR)
+        summary = summarize_track_features(feats)
+        adv = compute_advanced_analysis(y, DEFAULT_SR)
+        summarize_window(compute_frame_features(y, DEFAULT_SR), 0.0, 2.0)
+        # Carica il classificatore di genere (se addestrato)
+        estimate_genre(summary, adv)
+
+    steps = {}
+    profile = "full" if (include_llm or include_kb) else "dsp"
+    steps["imports"] = run_step(lambda: preload_dependencies(profile))
+    if include_llm:
+        steps["chat_model"] = run_step(warm_chat_model)
+        # Se chat ed embedding usano lo stesso modello basta un solo caricamento,
+        # ma la chiamata embeddings scalda comunque il relativo percorso in Ollama
+        steps["embed_model"] = run_step(warm_embed_model)
+    if include_kb:
+        steps["kb_collection"] = run_step(get_kb_collection)
+    steps["dsp_jit"] = run_step(warm_dsp)
+
+    for name, res in steps.items():
+        if res["ok"]:
+            print(f"🔥 Warm-up {name}: ok ({res['seconds']:.2f}s)")
+        else:
+            print(f"⚠️ Warm-up {name} fallito: {res['error']}")
+
+    return steps
 
 
 # ============================================================
-# 10. ENTRY POINT (ESEMPIO USO DA TERMINALE)
+# 11. ENTRY POINT (ESEMPIO USO DA TERMINALE)
 # ============================================================
 
 if __name__ == "__main__":
@@ -5,68 +5,216 @@
 # - ascoltare l'audio
 # - selezionare un intervallo (start/end) da analizzare
 # - chiamare il backend multi-agente (analyze_track) SOLO sul pezzo selezionato
+#   in un thread di background: i risultati compaiono man mano che arrivano
 
 import streamlit as st          # importa streamlit per creare l'interfaccia web
-import tempfile                 # importa tempfile per creare file temporanei
-import os                       # importa os per lavorare con i percorsi dei file
 import io                       # importa io per gestire i byte in memoria
-import librosa                  # importa librosa per analizzare l'audio
-import librosa.display          # importa librosa.display per visualizzare la waveform
-import matplotlib.pyplot as plt # importa matplotlib per disegnare i grafici
-import soundfile as sf          # importa soundfile per salvare file audio (wav)
-import plotly.graph_objs as go  # importa plotly per waveform interattiva
+import numpy as np              # importa numpy per gli assi dei tempi
+from concurrent.futures import ThreadPoolExecutor  # worker di analisi per sessione
 
-from ai_analyzer_backend import analyze_track  # importa la funzione di analisi dal backend
+from ai_analyzer_backend import DEFAULT_SR, analyze_track_window, load_audio  # backend di analisi
+from frame_store import get_or_build_track_frames, track_key  # archivio feature per frame
+from similarity_index import file_track_id  # hash del file per la libreria di reference
+from waveform_peaks import get_or_build_peak_pyramid, peak_view  # picchi per la waveform
+
+# plotly (e librosa, dentro il backend) sono importati solo quando c'è davvero una traccia da mostrare
+# (vedi sotto): la prima apertura della pagina resta veloce.
+
+# Sample rate usato per decodifica e analisi (44.1 / 48 kHz nativi restano invariati)
+SR_ANALISI = DEFAULT_SR
+
+# Numero massimo di punti disegnati nelle waveform
+MAX_PUNTI_WAVEFORM = 5000
+MAX_PUNTI_SEGMENTO = 3000
+
+# Ogni quanti secondi aggiornare i risultati mentre l'analisi è in corso
+INTERVALLO_AGGIORNAMENTO_SEC = 1.0
+
+# Sezioni dei risultati degli agenti, nell'ordine in cui arrivano
+SEZIONI_AGENTI = [
+    ("mix_agent", "🎛 Mix Engineer"),
+    ("theory_agent", "🎼 Music Theory / Accordi"),
+    ("creative_agent", "🎹 Creative Producer (melodia / bassline)"),
+]
 
 
 # ==========================
-# FUNZIONI DI SUPPORTO
+# CACHE TRA I RERUN DI STREAMLIT
 # ==========================
+# Streamlit riesegue lo script da capo a ogni interazione (es. slider).
+# Decodifica, feature e piramide della waveform dipendono solo dal file
+# caricato, quindi vengono calcolate una volta e riusate, con chiave
+# = hash del contenuto + sample rate.
 
-def salva_bytes_temporanei(audio_bytes: bytes, suffix: str) -> str:
+def chiave_upload(uploaded_file, sr: int) -> str:
+    """
+    Ritorna la chiave (hash del contenuto + sr) del file caricato.
+    L'hash viene calcolato una sola volta per upload e salvato in session_state.
     """
-    Salva dei byte audio grezzi (già letti dall'upload) in un file temporaneo su disco.
+    chiavi = st.session_state.setdefault("chiavi_upload", {})
+    id_upload = (uploaded_file.file_id, sr)
+    if id_upload not in chiavi:
+        chiavi[id_upload] = track_key(uploaded_file.getvalue(), sr)
+    return chiavi[id_upload]
 
-    Parametri:
-    - audio_bytes: contenuto binario del file audio
-    - suffix: estensione da usare (es. ".wav", ".mp3")
 
-    Ritorna:
-    - path_file: percorso assoluto del file temporaneo creato
+def hash_libreria(uploaded_file) -> str:
     """
-    # Crea un file temporaneo con delete=False così non viene cancellato subito
-    temp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    # Scrive i byte audio nel file
-    temp.write(audio_bytes)
-    # Forza la scrittura su disco
-    temp.flush()
-    # Chiude il file (il path resta valido)
-    temp.close()
-    # Ritorna il percorso del file temporaneo
-    return temp.name
-
-
-def salva_segmento_wav(y_segment, sr: int) -> str:
+    Hash del file caricato come nella libreria di reference (similarity_index):
+    serve a non proporre la traccia stessa, già analizzata, come reference.
     """
-    Salva un segmento audio (array numpy y_segment) in un file WAV temporaneo.
+    hash_file = st.session_state.setdefault("hash_libreria", {})
+    if uploaded_file.file_id not in hash_file:
+        hash_file[uploaded_file.file_id] = file_track_id(uploaded_file.getvalue())
+    return hash_file[uploaded_file.file_id]
 
-    Parametri:
-    - y_segment: array numpy con il pezzo di audio selezionato
-    - sr: sample rate del segnale
 
-    Ritorna:
-    - path_wav: percorso del file wav temporaneo
+@st.cache_resource(max_entries=4, show_spinner=False)
+def decodifica_audio(chiave: str, _audio_bytes: bytes, sr: int):
     """
-    # Crea un file temporaneo con estensione .wav
-    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    temp_path = temp.name
-    temp.close()  # chiudiamo subito, poi soundfile scrive
+    Decodifica il file in mono (load_audio: niente resampling per 44.1 / 48 kHz).
+    cache_resource restituisce sempre lo stesso array (nessuna copia a ogni rerun):
+    per sicurezza viene marcato in sola lettura.
+    """
+    y, sr = load_audio(io.BytesIO(_audio_bytes), sr=sr)
+    y.setflags(write=False)
+    return y, sr
+
 
-    # Usa soundfile.sf.write per scrivere i campioni su disco in formato wav
-    sf.write(temp_path, y_segment, sr)
+@st.cache_resource(max_entries=4, show_spinner=False)
+def feature_traccia(chiave: str, _y, sr: int):
+    """Feature frame-level della traccia (frame_store, riaperte in memory-map)."""
+    return get_or_build_track_frames(chiave, lambda: (_y, sr))
 
-    # Ritorna il path del wav creato
-    return temp_path
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def piramide_waveform(chiave: str, _y, sr: int):
+    """Piramide min/max/RMS della traccia (waveform_peaks, salvata accanto alle feature)."""
+    return get_or_build_peak_pyramid(chiave, lambda: (_y, sr))
+
+
+def figura_waveform(vista, titolo: str, titolo_asse_x: str, offset_sec: float = 0.0):
+    """
+    Crea la figura Plotly di una vista della piramide: banda min/max
+    (mantiene i transienti, a differenza di y[::step]) + inviluppo RMS.
+    offset_sec viene sottratto ai tempi (es. per avere il segmento che parte da 0).
+    """
+    import plotly.graph_objs as go
+
+    tempi = np.asarray(vista["times"]) - offset_sec
+
+    fig = go.Figure()
+    # Banda min/max: la seconda traccia riempie fino alla prima
+    fig.add_trace(go.Scatter(x=tempi, y=vista["max"], mode="lines",
+                             line=dict(width=0.5), name="Max"))
+    fig.add_trace(go.Scatter(x=tempi, y=vista["min"], mode="lines",
+                             line=dict(width=0.5), fill="tonexty", name="Min"))
+    # Inviluppo RMS (energia percepita)
+    fig.add_trace(go.Scatter(x=tempi, y=vista["rms"], mode="lines",
+                             line=dict(width=1), name="RMS"))
+
+    fig.update_layout(
+        title=titolo,
+        xaxis_title=titolo_asse_x,
+        yaxis_title="Ampiezza",
+        showlegend=False,
+        margin=dict(l=40, r=20, t=40, b=40)
+    )
+    return fig
+
+
+# ==========================
+# ANALISI IN BACKGROUND
+# ==========================
+# L'analisi (DSP + 4 agenti su Ollama) dura decine di secondi: gira in un
+# worker dedicato alla sessione, così la pagina resta utilizzabile.
+# Il worker scrive i risultati parziali in un dizionario del job; la pagina
+# li rilegge a ogni aggiornamento e riempie le sezioni già pronte.
+# La reference resta in memoria (io.BytesIO): nessun file temporaneo su disco.
+
+def worker_sessione() -> ThreadPoolExecutor:
+    """Worker di analisi della sessione (un solo job alla volta per utente)."""
+    if "worker_analisi" not in st.session_state:
+        st.session_state["worker_analisi"] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="analisi")
+    return st.session_state["worker_analisi"]
+
+
+def avvia_analisi(frames, start_sec: float, end_sec: float, ref_bytes=None, track_hash=None) -> dict:
+    """
+    Invia l'analisi dell'intervallo al worker della sessione.
+    track_hash: hash del file (hash_libreria), escluso dalle reference della libreria.
+    Ritorna il job: {"parziali": {...}, "future": Future, "intervallo": (start, end)}.
+    """
+    job = {"parziali": {}, "intervallo": (start_sec, end_sec)}
+
+    def on_progress(chiave, valore):
+        # Chiamata dal thread del worker: assegnare una chiave è un'operazione atomica
+        job["parziali"][chiave] = valore
+
+    reference = io.BytesIO(ref_bytes) if ref_bytes is not None else None
+    job["future"] = worker_sessione().submit(
+        analyze_track_window, frames, start_sec, end_sec,
+        reference_path=reference, on_progress=on_progress, track_hash=track_hash)
+    return job
+
+
+def analisi_in_corso() -> bool:
+    """True se la sessione ha un'analisi non ancora terminata."""
+    job = st.session_state.get("analisi")
+    return job is not None and not job["future"].done()
+
+
+def mostra_risultati():
+    """
+    Mostra i risultati del job della sessione: le sezioni già pronte subito,
+    le altre con un segnaposto. Finché il job è in corso viene rieseguita
+    periodicamente (st.fragment con run_every) senza rieseguire tutta la pagina.
+    """
+    job = st.session_state.get("analisi")
+    if job is None:
+        return
+
+    parziali = job["parziali"]
+    start_sec, end_sec = job["intervallo"]
+    terminato = job["future"].done()
+    errore = job["future"].exception() if terminato else None
+
+    if errore is not None:
+        st.error(f"Analisi non riuscita: {errore}")
+    elif terminato:
+        st.success(f"Analisi completata! ({start_sec:.1f} s → {end_sec:.1f} s)")
+    else:
+        pronti = sum(k in parziali for k, _ in SEZIONI_AGENTI + [("orchestrator_agent", "")])
+        st.info(f"⏳ Analisi in corso ({start_sec:.1f} s → {end_sec:.1f} s): "
+                f"{pronti}/4 agenti completati...")
+
+    # Genere stimato (pronto appena finisce la parte DSP)
+    st.markdown("### 🎵 Genere stimato")
+    st.write(parziali.get("genre", "⏳ In attesa dell'analisi audio..."))
+
+    # Contesto tecnico
+    with st.expander("📊 Dettagli tecnici (contesto comune)"):
+        if "context" in parziali:
+            st.code(parziali["context"], language="markdown")
+        else:
+            st.write("⏳ In attesa dell'analisi audio...")
+
+    # Piano finale orchestrator (arriva per ultimo)
+    st.markdown("### 🧠 Piano d'azione finale (Orchestrator)")
+    st.markdown(parziali.get("orchestrator_agent", "⏳ In attesa degli altri agenti..."))
+
+    # Dettagli agenti: ogni sezione si riempie quando il suo agente ha finito
+    st.markdown("### 🔍 Dettaglio agenti")
+    for chiave, titolo in SEZIONI_AGENTI:
+        pronto = chiave in parziali
+        with st.expander(titolo if pronto else f"⏳ {titolo}", expanded=False):
+            st.markdown(parziali[chiave] if pronto else "In elaborazione...")
+
+    # Appena il job termina, rerun completo: ferma l'aggiornamento periodico
+    if terminato and job.get("in_aggiornamento"):
+        job["in_aggiornamento"] = False
+        st.rerun()
 
 
 # ==========================
@@ -97,26 +245,30 @@ user_file = st.file_uploader(
 y = None          # array audio della traccia
 sr = None         # sample rate
 duration = None   # durata in secondi
+frames = None     # feature frame-level della traccia (da frame_store)
 
 audio_bytes = None  # conterrà i byte originali del file caricato
 
 # Quando l'utente carica un file, lo elaboriamo
 if user_file is not None:
-    # Legge tutti i byte del file una sola volta
-    audio_bytes = user_file.read()
+    # Byte del file (getvalue non copia il buffer dell'upload)
+    audio_bytes = user_file.getvalue()
 
     # Mostra un player per ascoltare la traccia
     st.audio(audio_bytes, format="audio/" + user_file.type.split("/")[-1])
 
-    # Carica l'audio con librosa a partire dai byte in memoria
-    # Crea un buffer BytesIO per far credere a librosa che sia un file
-    buffer = io.BytesIO(audio_bytes)
+    # Chiave della traccia: hash calcolato una sola volta per upload
+    chiave = chiave_upload(user_file, SR_ANALISI)
 
-    # Carica il segnale audio in mono a 44.1 kHz
-    y, sr = librosa.load(buffer, sr=44100, mono=True)
+    # Decodifica (mono, sample rate nativo se 44.1 / 48 kHz) e feature frame-level: solo al primo rerun
+    # per questo file, poi arrivano dalla cache
+    with st.spinner("Decodifica e preparazione feature della traccia..."):
+        y, sr = decodifica_audio(chiave, audio_bytes, SR_ANALISI)
+        frames = feature_traccia(chiave, y, sr)
+        piramide = piramide_waveform(chiave, y, sr)
 
     # Calcola la durata del file in secondi
-    duration = librosa.get_duration(y=y, sr=sr)
+    duration = len(y) / sr
 
     # Mostra info di base
     st.write(f"Durata traccia: **{duration:.1f} s** – Sample rate: **{sr} Hz**")
@@ -128,38 +280,9 @@ if user_file is not None:
     # WAVEFORM COMPLETA INTERATTIVA (PLOTLY)
     # ==========================
 
-    # Crea un array di tempi (in secondi) per ogni campione
-    times = librosa.times_like(y, sr=sr)
-
-    # Per non avere troppi punti (audio lungo), facciamo un leggero downsampling
-    max_points = 5000  # massimo numero di punti da mostrare
-    step = max(1, len(y) // max_points)  # calcola ogni quanti campioni prendere un punto
-
-    # Applichiamo il downsampling sia al segnale che ai tempi
-    y_ds = y[::step]         # prende un campione ogni 'step'
-    times_ds = times[::step] # stessi campioni per l'asse del tempo
-
-    # Crea una figura Plotly
-    fig = go.Figure()
-
-    # Aggiunge la traccia della waveform come linea
-    fig.add_trace(
-        go.Scatter(
-            x=times_ds,         # asse x = tempo in secondi
-            y=y_ds,             # asse y = ampiezza
-            mode="lines",       # disegna una linea continua
-            name="Waveform"     # nome della traccia (leggenda)
-        )
-    )
-
-    # Personalizza layout del grafico
-    fig.update_layout(
-        title="Waveform completa (zoomabile)",  # titolo
-        xaxis_title="Tempo (s)",                # label asse x
-        yaxis_title="Ampiezza",                 # label asse y
-        showlegend=False,                       # nasconde legenda (non fondamentale qui)
-        margin=dict(l=40, r=20, t=40, b=40)     # margini del grafico
-    )
+    # Vista dell'intera traccia dalla piramide di picchi (costo ~ numero di punti)
+    vista = peak_view(piramide, 0.0, duration, MAX_PUNTI_WAVEFORM)
+    fig = figura_waveform(vista, "Waveform completa (zoomabile)", "Tempo (s)")
 
     # Mostra il grafico interattivo in Streamlit (zoom, pan, ecc.)
     st.plotly_chart(fig, use_container_width=True)
@@ -200,35 +323,10 @@ if user_file is not None:
         # WAVEFORM SEGMENTO INTERATTIVA (PLOTLY)
         # ==========================
 
-        # Crea un array tempo relativo solo per il segmento (parte da 0)
-        times_seg = librosa.times_like(y_segment, sr=sr)
-
-        # Downsampling anche per il segmento (stesso criterio)
-        max_points_seg = 3000                     # limite punti per il segmento
-        step_seg = max(1, len(y_segment) // max_points_seg)
-
-        y_seg_ds = y_segment[::step_seg]          # downsample sul segnale
-        times_seg_ds = times_seg[::step_seg]      # downsample sui tempi
-
-        # Crea figura Plotly per il segmento
-        fig_seg = go.Figure()
-
-        fig_seg.add_trace(
-            go.Scatter(
-                x=times_seg_ds,          # tempo relativo (0 → durata segmento)
-                y=y_seg_ds,              # ampiezza
-                mode="lines",
-                name="Segmento"
-            )
-        )
-
-        fig_seg.update_layout(
-            title="Waveform segmento selezionato (zoomabile)",
-            xaxis_title="Tempo segmento (s)",
-            yaxis_title="Ampiezza",
-            showlegend=False,
-            margin=dict(l=40, r=20, t=40, b=40)
-        )
+        # Vista del solo segmento (tempo relativo: parte da 0)
+        vista_seg = peak_view(piramide, start_sec, end_sec, MAX_PUNTI_SEGMENTO)
+        fig_seg = figura_waveform(vista_seg, "Waveform segmento selezionato (zoomabile)",
+                                  "Tempo segmento (s)", offset_sec=start_sec)
 
         # Mostra waveform interattiva del segmento
         st.plotly_chart(fig_seg, use_container_width=True)
@@ -253,10 +351,10 @@ ref_file = st.file_uploader(
 
 st.subheader("4. Avvia l'analisi AI sulla selezione")
 
-# Pulsante per avviare l'analisi
-if st.button("Analizza intervallo selezionato"):
+# Pulsante per avviare l'analisi (disabilitato mentre un'analisi è in corso)
+if st.button("Analizza intervallo selezionato", disabled=analisi_in_corso()):
     # Controlliamo che ci sia la traccia utente
-    if user_file is None or audio_bytes is None or y is None or sr is None:
+    if user_file is None or audio_bytes is None or frames is None:
         st.error("Per favore carica prima una traccia utente.")
     else:
         # Controlliamo che l'intervallo sia valido e che y_segment esista
@@ -269,57 +367,20 @@ if st.button("Analizza intervallo selezionato"):
         if y_segment is None or len(y_segment) == 0:
             st.error("Il segmento selezionato è vuoto. Controlla lo slider.")
         else:
-            # Mostriamo uno spinner durante l'analisi
-            with st.spinner("Analisi in corso... (audio + multi-agente su Ollama)"):
-                # Salviamo il segmento selezionato in un WAV temporaneo
-                segment_path = salva_segmento_wav(y_segment, sr)
-
-                # Gestiamo la reference, se presente
-                if ref_file is not None:
-                    # Leggiamo i byte della reference
-                    ref_bytes = ref_file.read()
-                    # Determiniamo l'estensione dalla reference
-                    ref_suffix = os.path.splitext(ref_file.name)[1]
-                    # Salviamo i byte in un file temporaneo
-                    ref_path = salva_bytes_temporanei(ref_bytes, suffix=ref_suffix)
-                else:
-                    ref_path = None
-
-                # Chiamiamo la funzione di analisi del backend con:
-                # - il path del segmento selezionato
-                # - il path dell'eventuale reference
-                results = analyze_track(
-                    user_path=segment_path,
-                    reference_path=ref_path
-                )
-
-            # Fine analisi
-            st.success("Analisi completata!")
-
-            # ==========================
-            # MOSTRA RISULTATI
-            # ==========================
-
-            # Genere stimato
-            st.markdown("### 🎵 Genere stimato")
-            st.write(results.get("genre", "N/D"))
-
-            # Contesto tecnico (opzionale)
-            with st.expander("📊 Dettagli tecnici (contesto comune)"):
-                st.code(results.get("context", ""), language="markdown")
-
-            # Piano finale orchestrator
-            st.markdown("### 🧠 Piano d'azione finale (Orchestrator)")
-            st.markdown(results.get("final_plan", ""))
-
-            # Dettagli agenti
-            st.markdown("### 🔍 Dettaglio agenti")
-
-            with st.expander("🎛 Mix Engineer"):
-                st.markdown(results.get("mix_agent", ""))
-
-            with st.expander("🎼 Music Theory / Accordi"):
-                st.markdown(results.get("theory_agent", ""))
-
-            with st.expander("🎹 Creative Producer (melodia / bassline)"):
-                st.markdown(results.get("creative_agent", ""))
\ No newline at end of file
+            # La reference viene passata al backend in memoria (nessun file temporaneo)
+            ref_bytes = ref_file.getvalue() if ref_file is not None else None
+
+            # Il job parte nel worker della sessione: lo script prosegue subito
+            st.session_state["analisi"] = avvia_analisi(frames, start_sec, end_sec, ref_bytes,
+                                                        track_hash=hash_libreria(user_file))
+
+# ==========================
+# MOSTRA RISULTATI
+# ==========================
+
+# Finché l'analisi è in corso la sezione risultati si aggiorna da sola
+if analisi_in_corso():
+    st.session_state["analisi"]["in_aggiornamento"] = True
+    st.fragment(run_every=INTERVALLO_AGGIORNAMENTO_SEC)(mostra_risultati)()
+else:
+    mostra_risultati()
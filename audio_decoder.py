@@ -0,0 +1,286 @@
+# ============================================================
+# AI MUSIC ANALYZER - DECODIFICA AUDIO (SCELTA DEL DECODER)
+# ============================================================
+# librosa.load prova soundfile e, se il formato non è supportato, ripiega
+# su audioread (processo ffmpeg / GStreamer, lento, sempre da file su disco).
+#
+# Qui il decoder si sceglie per contenitore, riconosciuto dai primi byte
+# (non dall'estensione), in ordine di velocità tra quelli disponibili:
+#   soundfile  WAV, FLAC, OGG, AIFF e MP3 (libsndfile ≥ 1.1): in-process
+#   pyav       M4A / AAC / MP4 e tutto il resto (opzionale: pip install av)
+#   ffmpeg     processo esterno in pipe: i byte entrano da stdin, il PCM
+#              float32 esce da stdout (nessun file temporaneo)
+#   audioread  ultima risorsa (backend di sistema, richiede un file su disco)
+#
+# La sorgente può essere un percorso oppure un file aperto (upload di
+# FastAPI, io.BytesIO della GUI...): soundfile, pyav e ffmpeg leggono
+# direttamente dallo stream.
+# ============================================================
+
+import functools
+import importlib.util
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+# Ordine di preferenza dei decoder per contenitore
+DECODER_PREFERENCE = {
+    "wav": ("soundfile", "pyav", "ffmpeg", "audioread"),
+    "flac": ("soundfile", "pyav", "ffmpeg", "audioread"),
+    "ogg": ("soundfile", "pyav", "ffmpeg", "audioread"),
+    "aiff": ("soundfile", "pyav", "ffmpeg", "audioread"),
+    "mp3": ("soundfile", "pyav", "ffmpeg", "audioread"),
+    "mp4": ("pyav", "ffmpeg", "audioread"),
+    "aac": ("pyav", "ffmpeg", "audioread"),
+    "unknown": ("soundfile", "pyav", "ffmpeg", "audioread"),
+}
+
+# Formato libsndfile necessario per ciascun contenitore (soundfile.available_formats)
+SOUNDFILE_FORMATS = {"wav": "WAV", "flac": "FLAC", "ogg": "OGG", "aiff": "AIFF", "mp3": "MP3"}
+
+# Blocchi con cui i byte vengono passati a ffmpeg
+PIPE_CHUNK_BYTES = 1 << 20
+
+
+class DecodeError(ValueError):
+    """
+    Nessun decoder disponibile è riuscito a leggere il file.
+    Il messaggio è pensato per il client (formato e contenitore, niente percorsi);
+    gli errori dei singoli decoder sono in `details` e finiscono nel log del server.
+    """
+
+    def __init__(self, message, container=None, details=()):
+        super().__init__(message)
+        self.container = container
+        self.details = list(details)
+
+
+# ============================================================
+# 1. RICONOSCIMENTO DEL CONTENITORE
+# ============================================================
+
+def sniff_container(head):
+    """Contenitore dai primi byte del file ("wav", "mp3", "mp4", ... oppure "unknown")."""
+    if head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if head[:4] == b"ADIF":
+        return "aac"
+    if len(head) >= 2 and head[0] == 0xFF:
+        # Frame sync: ADTS (AAC) ha layer 00, MPEG audio (MP3) layer diverso da 00
+        if head[1] & 0xF6 == 0xF0:
+            return "aac"
+        if head[1] & 0xE0 == 0xE0:
+            return "mp3"
+    return "unknown"
+
+
+def _read_head(source, n=64):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(n)
+    pos = source.tell()
+    head = source.read(n)
+    source.seek(pos)
+    return head
+
+
+# ============================================================
+# 2. DECODER
+# ============================================================
+
+def _soundfile_available(container):
+    import soundfile as sf
+
+    fmt = SOUNDFILE_FORMATS.get(container)
+    return fmt is None or fmt in sf.available_formats()
+
+
+def _decode_soundfile(source):
+    import soundfile as sf
+
+    y, sr = sf.read(source, dtype="float32", always_2d=True)
+    return y.T, sr
+
+
+def _decode_pyav(source):
+    import av
+
+    with av.open(os.fspath(source) if isinstance(source, (str, os.PathLike)) else source) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="fltp")
+        blocks = []
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                blocks.append(out.to_ndarray())
+        for out in resampler.resample(None):
+            blocks.append(out.to_ndarray())
+        sr = stream.codec_context.sample_rate
+    if not blocks:
+        raise DecodeError("nessun frame audio")
+    return np.concatenate(blocks, axis=1).astype(np.float32, copy=False), sr
+
+
+def _parse_wav_stream(data):
+    """(canali, sample rate, offset dei campioni) di un WAV float32 scritto in pipe da ffmpeg."""
+    pos = 12
+    channels = sr = None
+    while pos + 8 <= len(data):
+        chunk_id, size = data[pos:pos + 4], struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt ":
+            channels, sr = struct.unpack("<HI", data[pos + 10:pos + 16])
+        elif chunk_id == b"data":
+            return channels, sr, pos + 8
+        pos += 8 + size + (size & 1)
+    raise DecodeError("header WAV di ffmpeg non valido")
+
+
+def _decode_ffmpeg(source):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise DecodeError("ffmpeg non installato")
+
+    from_path = isinstance(source, (str, os.PathLike))
+    cmd = [ffmpeg, "-v", "error", "-hide_banner"]
+    cmd += ["-nostdin", "-i", os.fspath(source)] if from_path else ["-i", "pipe:0"]
+    cmd += ["-vn", "-c:a", "pcm_f32le", "-f", "wav", "pipe:1"]
+
+    with tempfile.TemporaryFile() as err_file:
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL if from_path else subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=err_file)
+
+        def feed():
+            # Upload → stdin di ffmpeg a blocchi, mentre il PCM esce da stdout
+            try:
+                for block in iter(lambda: source.read(PIPE_CHUNK_BYTES), b""):
+                    proc.stdin.write(block)
+            except OSError:
+                # ffmpeg ha chiuso stdin (errore o fine del flusso audio)
+                pass
+            finally:
+                proc.stdin.close()
+
+        feeder = None
+        if not from_path:
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+        data = proc.stdout.read()
+        proc.wait()
+        if feeder is not None:
+            feeder.join()
+        if proc.returncode != 0:
+            err_file.seek(0)
+            raise DecodeError(f"ffmpeg: {err_file.read().decode(errors='replace').strip()[:200]}")
+
+    channels, sr, offset = _parse_wav_stream(data)
+    # In pipe ffmpeg non conosce la lunghezza: si usano tutti i byte dopo l'header
+    n = (len(data) - offset) // (4 * channels) * channels
+    y = np.frombuffer(data, dtype="<f4", count=n, offset=offset)
+    return y.reshape(-1, channels).T.copy(), sr
+
+
+def _audioread_file(path):
+    import audioread
+
+    with audioread.audio_open(path) as f:
+        sr, channels = f.samplerate, f.channels
+        pcm = b"".join(f)
+    # PCM 16 bit interleaved → float32 (stessa scala di librosa)
+    y = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    return y.reshape(-1, channels).T, sr
+
+
+def _decode_audioread(source):
+    if isinstance(source, (str, os.PathLike)):
+        return _audioread_file(os.fspath(source))
+
+    # audioread vuole un file su disco: unico caso con file temporaneo
+    with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as tmp:
+        shutil.copyfileobj(source, tmp)
+    try:
+        return _audioread_file(tmp.name)
+    finally:
+        os.remove(tmp.name)
+
+
+DECODERS = {
+    "soundfile": _decode_soundfile,
+    "pyav": _decode_pyav,
+    "ffmpeg": _decode_ffmpeg,
+    "audioread": _decode_audioread,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _backend_available(name):
+    # Moduli opzionali: il controllo si fa una volta per processo
+    if name == "pyav":
+        return importlib.util.find_spec("av") is not None
+    if name == "audioread":
+        if importlib.util.find_spec("audioread") is None:
+            return False
+        import audioread
+
+        return bool(audioread.available_backends())
+    return True
+
+
+def _decoder_available(name, container):
+    if name == "soundfile":
+        return _soundfile_available(container)
+    if name == "ffmpeg":
+        return shutil.which("ffmpeg") is not None
+    return _backend_available(name)
+
+
+def available_decoders(container):
+    """Decoder utilizzabili per il contenitore, nell'ordine in cui vengono provati."""
+    preference = DECODER_PREFERENCE.get(container, DECODER_PREFERENCE["unknown"])
+    return [name for name in preference if _decoder_available(name, container)]
+
+
+# ============================================================
+# 3. ENTRY POINT
+# ============================================================
+
+def decode_audio(source, decoder=None):
+    """
+    Decodifica un file audio (percorso o file aperto e seekable) senza ricampionare.
+    decoder: forza un decoder ("soundfile", "pyav", "ffmpeg", "audioread").
+    Ritorna:
+        (y, sr, info): y float32 con forma (canali, campioni),
+        info = {"container", "decoder"}
+    """
+    container = sniff_container(_read_head(source))
+    names = [decoder] if decoder else available_decoders(container)
+    start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+
+    errors = []
+    for name in names:
+        if start is not None:
+            source.seek(start)
+        try:
+            y, sr = DECODERS[name](source)
+        except Exception as e:
+            # Formato non supportato da questo decoder: si prova il successivo
+            errors.append(f"{name}: {type(e).__name__}: {e}")
+            continue
+        return y, int(sr), {"container": container, "decoder": name}
+
+    print(f"⚠️ Decodifica fallita ({container}): " + " | ".join(errors))
+    raise DecodeError(f"Formato audio non supportato o file danneggiato (contenitore: {container}).",
+                      container, errors)
@@ -1,21 +1,30 @@
 # backend_server.py
 
 # Importa FastAPI per creare API HTTP
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 # Importa CORS per permettere richieste dal frontend (porta differente)
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 # Importa la funzione principale di analisi dal tuo backend esistente
-from ai_analyzer_backend import analyze_track
+from ai_analyzer_backend import (AUTO_WINDOW_MIN_SEC, AUTO_WINDOW_SEC, DEFAULT_SR, analyze_track,
+                                 analyze_windows, load_audio, warmup_backend)
+from frame_store import track_key
+import request_coalescing
+import request_profiler
+import tracing
+from waveform_peaks import get_or_build_peak_pyramid, load_peak_pyramid, peak_view
 
-# Moduli per file temporanei e gestione file
-import tempfile
-import shutil
-import os
+# Moduli per hash, stream in memoria e gestione file
+import hashlib
+import io
+import json
+import math
+import threading
+import time
 
-# Importa librerie audio per tagliare il file
-import librosa            # per caricare l'audio in memoria
-import soundfile as sf    # per salvare il segmento tagliato
+from audio_decoder import DecodeError
 
 # Crea l'app FastAPI
 app = FastAPI()
@@ -29,77 +38,393 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# ==========================
+# LIMITE DIMENSIONE UPLOAD
+# ==========================
+
+# Corpo massimo di una richiesta (byte): oltre si risponde 413 mentre l'upload
+# è ancora in corso, senza leggerlo (né spoolarlo su disco) tutto. None = nessun limite
+MAX_UPLOAD_BYTES = 500 * 1024 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Middleware ASGI: rifiuta subito le richieste con Content-Length oltre il limite
+    e conta i byte del corpo mentre arrivano (upload chunked o Content-Length falso).
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes is None:
+            return await self.app(scope, receive, send)
+
+        detail = f"File troppo grande (limite {self.max_bytes // (1024 * 1024)} MB)."
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Sollevata durante il parsing del form: FastAPI risponde 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+# ==========================
+# METRICHE (PROMETHEUS)
+# ==========================
+
+HTTP_SECONDS = f"{tracing.METRICS_PREFIX}_http_request_duration_seconds"
+HTTP_REQUESTS = f"{tracing.METRICS_PREFIX}_http_requests_total"
+tracing.registry.describe(HTTP_SECONDS, "Durata delle richieste HTTP per endpoint")
+tracing.registry.describe(HTTP_REQUESTS, "Richieste HTTP per endpoint e codice di stato")
+
+
+@app.middleware("http")
+async def http_metrics_middleware(request: Request, call_next):
+    """Latenza e conteggio di ogni richiesta, per endpoint (path del route, non l'URL)."""
+    if not tracing.TRACING_ENABLED:
+        return await call_next(request)
+
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        tracing.registry.observe(HTTP_SECONDS, time.perf_counter() - t0,
+                                 method=request.method, path=path)
+        tracing.registry.increment(HTTP_REQUESTS, method=request.method, path=path, status=status)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Istogrammi di latenza per stadio / endpoint e contatori, formato testuale Prometheus."""
+    return PlainTextResponse(tracing.registry.render_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+
+# ==========================
+# WARM-UP E READINESS
+# ==========================
+
+# Secondi di attesa prima di ritentare un warm-up fallito (es. Ollama non ancora avviato)
+WARMUP_RETRY_SECONDS = 10.0
+
+# Stato del warm-up, letto da /ready
+warmup_state = {
+    "ready": False,      # True solo dopo un warm-up completo senza errori
+    "attempts": 0,       # numero di tentativi effettuati
+    "steps": {},         # esito dell'ultimo tentativo, step per step
+    "ready_since": None, # timestamp (epoch) in cui il server è diventato pronto
+}
+
+
+def run_warmup_loop():
+    """
+    Esegue il warm-up del backend finché tutti gli step vanno a buon fine.
+    Gira in un thread separato, così il server risponde subito (liveness)
+    ma /ready resta 503 finché modelli, KB e JIT non sono caldi.
+    """
+    while True:
+        warmup_state["attempts"] += 1
+        steps = warmup_backend()
+        warmup_state["steps"] = steps
+
+        if all(step["ok"] for step in steps.values()):
+            warmup_state["ready"] = True
+            warmup_state["ready_since"] = time.time()
+            print("✅ Warm-up completato: server pronto.")
+            return
+
+        print(f"⏳ Warm-up incompleto, nuovo tentativo tra {WARMUP_RETRY_SECONDS:.0f}s")
+        time.sleep(WARMUP_RETRY_SECONDS)
+
+
+@app.on_event("startup")
+def start_warmup():
+    """Avvia il warm-up in background all'avvio del server."""
+    threading.Thread(target=run_warmup_loop, name="warmup", daemon=True).start()
+
+
+@app.get("/health")
+def health_endpoint():
+    """Liveness: il processo è vivo (anche se ancora in warm-up)."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready_endpoint():
+    """
+    Readiness per il load balancer:
+    - 200 solo dopo che il warm-up è terminato con successo
+    - 503 durante il warm-up (o se qualche step continua a fallire)
+    """
+    body = {
+        "ready": warmup_state["ready"],
+        "attempts": warmup_state["attempts"],
+        "steps": warmup_state["steps"],
+    }
+    if not warmup_state["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
 @app.post("/analyze")
 async def analyze_endpoint(
+    request: Request,
     # File audio caricato dal frontend (campo "file" del FormData)
     file: UploadFile = File(...),
     # Inizio selezione in secondi (stringa → float tramite Form)
     trim_start: float = Form(0.0),
     # Fine selezione in secondi (se -1 o 0 → usa fine traccia)
     trim_end: float = Form(-1.0),
+    # Senza taglio: analizza solo la sezione più rappresentativa (es. il drop)
+    auto_window: bool = Form(False),
+    # Lunghezza della finestra automatica in secondi
+    auto_window_sec: float = Form(AUTO_WINDOW_SEC),
+    # Se true la risposta contiene i tempi di ogni stadio della pipeline
+    timings: bool = Form(False),
 ):
     """
     Endpoint che:
     - riceve un file audio e l'intervallo di taglio (trim_start, trim_end)
     - salva il file in una cartella temporanea
     - se richiesto, taglia il segmento [trim_start, trim_end]
+    - altrimenti, con auto_window, sceglie da solo la finestra da analizzare
     - chiama analyze_track sul file (segmento o intero)
-    - restituisce un JSON con i risultati principali
+    - restituisce un JSON con i risultati principali e la finestra analizzata
+      (+ tempi per stadio se timings=true)
+    Profilo CPU + memoria della richiesta con header "X-Profile: 1", query "?profile=1"
+    oppure per campionamento (request_profiler.PROFILE_SAMPLE_RATE): il nome del file
+    torna in "profile" e si scarica da GET /profiles/{nome}.
+    Richieste identiche contemporanee (stesso audio e stessi parametri, anche su
+    worker diversi) condividono una sola analisi: la risposta ha "coalesced": true.
     """
+    if auto_window and not (math.isfinite(auto_window_sec) and auto_window_sec >= AUTO_WINDOW_MIN_SEC):
+        raise HTTPException(status_code=400,
+                            detail=f"auto_window_sec deve essere un numero di almeno {AUTO_WINDOW_MIN_SEC:g} secondi.")
 
-    # Crea una directory temporanea che verrà cancellata automaticamente alla fine
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Costruisce il percorso del file temporaneo
-        original_path = os.path.join(tmpdir, file.filename)
+    profile_requested = (request.headers.get("x-profile", "") in ("1", "true")
+                         or request.query_params.get("profile", "") in ("1", "true"))
+    profiler = request_profiler.maybe_profile(f"POST /analyze {file.filename}", profile_requested)
 
-        # Scrive il contenuto del file uploadato su disco
-        with open(original_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    # La pipeline gira in un thread del threadpool: l'event loop resta libero e
+    # le richieste identiche contemporanee possono agganciarsi all'analisi in corso
+    return await run_in_threadpool(handle_analyze_request, file, trim_start, trim_end,
+                                   auto_window, auto_window_sec, timings, profiler)
 
-        # Scegliamo il path che passeremo ad analyze_track
-        segment_path = original_path
 
-        # Se trim_end > 0 e trim_end > trim_start, procediamo con il taglio reale
-        if trim_end > 0.0 and trim_end > trim_start:
-            # Carica l'audio completo con librosa (mantiene sample rate originale)
-            y, sr = librosa.load(original_path, sr=None, mono=True)
+def handle_analyze_request(file, trim_start, trim_end, auto_window, auto_window_sec, timings, profiler):
+    """Corpo sincrono di /analyze: analisi (o aggancio a una identica in corso) + tempi e profilo."""
+    profiling = isinstance(profiler, request_profiler.RequestProfile)
 
-            # Calcola i campioni di inizio e fine in base ai secondi
-            start_sample = int(trim_start * sr)
-            end_sample = int(trim_end * sr)
+    with tracing.request_timings() as stage_timings, profiler:
+        # Una richiesta profilata esegue sempre la propria pipeline:
+        # il profilo di un'attesa non servirebbe a nessuno
+        try:
+            shared_response, coalesced = run_analyze_request(
+                file, trim_start, trim_end, auto_window, auto_window_sec, coalesce=not profiling)
+        except DecodeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
 
-            # Clamp sugli estremi per evitare crash
-            start_sample = max(0, min(start_sample, len(y)))
-            end_sample = max(0, min(end_sample, len(y)))
+    # Copia: la stessa risposta può essere condivisa da più richieste
+    response = dict(shared_response)
+    if coalesced:
+        response["coalesced"] = True
+    if timings:
+        response["timings"] = stage_timings
+    if profiling:
+        response["profile"] = profiler.artifact
+        if profiler.skipped_reason:
+            response["profile_skipped"] = profiler.skipped_reason
+    return response
 
-            # Se il segmento è valido (almeno qualche campione)
-            if end_sample > start_sample:
-                # Slice del segnale nell'intervallo [start_sample:end_sample]
-                y_segment = y[start_sample:end_sample]
 
-                # Nuovo path per il segmento
-                segment_path = os.path.join(tmpdir, "segment.wav")
+def analyze_response(results):
+    """Sottoinsieme dei risultati di analyze_track restituito al frontend."""
+    return {
+        "genre": results.get("genre"),
+        "final_plan": results.get("final_plan"),
+        "mix_agent": results.get("mix_agent"),
+        "theory_agent": results.get("theory_agent"),
+        "creative_agent": results.get("creative_agent"),
+        "analyzed_window": results.get("analyzed_window"),
+        "similar_references": [
+            {k: ref[k] for k in ("name", "distance", "genre", "bpm")}
+            for ref in results.get("similar_references") or []
+        ],
+        "llm_stats": results.get("llm_stats"),
+        "agent_cache": results.get("agent_cache"),
+    }
+
+
+@app.get("/profiles/{name}")
+def profile_download_endpoint(name: str):
+    """Scarica un profilo salvato da /analyze (JSON: funzioni, stack "folded", memoria)."""
+    path = request_profiler.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profilo non trovato.")
+    return FileResponse(path, media_type="application/json")
 
-                # Salva il segmento come wav (mono, sr originale)
-                sf.write(segment_path, y_segment, sr)
-            # Altrimenti lascia segment_path = original_path
 
-        # A questo punto segment_path punta:
-        # - al file tagliato se trim_start/trim_end validi
-        # - al file originale altrimenti
+def run_analyze_request(file, trim_start, trim_end, auto_window, auto_window_sec, coalesce=True):
+    """
+    Hash dell'upload, eventuale taglio e analyze_track (corpo di /analyze).
+    L'audio si decodifica direttamente dall'upload (già in memoria o spoolato
+    su disco da Starlette): nessuna copia in un file temporaneo.
+    Con coalesce=True le richieste con stesso audio e stessi parametri eseguite
+    in contemporanea (anche da altri worker) condividono una sola analisi.
+    Ritorna (risposta per il frontend, coalesced).
+    """
+    source = file.file
+    with tracing.span("upload_hash"):
+        content_hash = hash_upload(source)
 
-        # Chiama la funzione di analisi sul path selezionato
+    # Il taglio manuale (se valido) ha la precedenza sulla finestra automatica
+    has_trim = trim_end > 0.0 and trim_end > trim_start
+    key = request_coalescing.coalesce_key(
+        content_hash,
+        trim=[trim_start, trim_end] if has_trim else None,
+        auto_window=auto_window and not has_trim,
+        auto_window_sec=auto_window_sec if auto_window and not has_trim else None,
+    )
+
+    def compute():
+        # Taglio (se trim_start / trim_end sono validi) sul segnale già decodificato
+        source.seek(0)
         results = analyze_track(
-            user_path=segment_path,
-            reference_path=None
+            user_path=source,
+            reference_path=None,
+            auto_window=auto_window,
+            window_sec=auto_window_sec,
+            trim=(trim_start, trim_end),
+            track_name=file.filename,
+            # Stesso hash di similarity_index.file_track_id: l'upload non viene riletto
+            track_hash=content_hash[:32],
         )
+        return analyze_response(results)
+
+    if not coalesce:
+        return compute(), False
+    return request_coalescing.single_flight(key, compute)
+
+
+def hash_upload(source):
+    """Hash sha256 dell'upload letto a blocchi; lo stream torna all'inizio."""
+    h = hashlib.sha256()
+    source.seek(0)
+    for block in iter(lambda: source.read(1 << 20), b""):
+        h.update(block)
+    source.seek(0)
+    return h.hexdigest()
+
+
+@app.post("/analyze/windows")
+def analyze_windows_endpoint(
+    # File audio caricato dal frontend (campo "file" del FormData)
+    file: UploadFile = File(...),
+    # Lista JSON di finestre, es: [{"label": "drop 1", "start": 60, "end": 90}, ...]
+    windows: str = Form(...),
+    # Se true aggiunge il confronto tra le finestre (rispetto alla prima)
+    compare: bool = Form(True),
+    # Se true la risposta contiene i tempi di ogni stadio
+    timings: bool = Form(False),
+):
+    """
+    Endpoint per confrontare più sezioni della stessa traccia
+    (intro, breakdown, drop 1, drop 2...) con un solo upload:
+    - decodifica il file una sola volta
+    - calcola STFT / RMS / onset / chroma una sola volta
+    - restituisce riassunto e analisi avanzata per ogni finestra
+    Solo DSP: gli agenti LLM non vengono eseguiti.
+    Funzione sincrona: FastAPI la esegue nel threadpool, l'event loop resta libero.
+    """
+    try:
+        window_list = json.loads(windows)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Il campo 'windows' deve essere una lista JSON.")
+    if not isinstance(window_list, list) or not window_list:
+        raise HTTPException(status_code=400, detail="Serve almeno una finestra da analizzare.")
+
+    with tracing.request_timings() as stage_timings:
+        # Decodifica direttamente dall'upload, senza file temporaneo
+        try:
+            y, sr = load_audio(file.file)
+        except DecodeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+
+        try:
+            response = analyze_windows(y, sr, window_list, compare=compare)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if timings:
+        response["timings"] = stage_timings
+    return response
+
+
+# Numero massimo di punti restituiti da una vista della waveform
+MAX_WAVEFORM_WIDTH = 10000
+
+
+@app.post("/waveform")
+def waveform_upload_endpoint(file: UploadFile = File(...)):
+    """
+    Prepara la piramide di picchi (min/max/RMS) di una traccia per disegnarne la waveform.
+    La piramide viene costruita una sola volta per contenuto (chiave = hash del file):
+    le viste successive si chiedono a GET /waveform/{track_id}.
+    Funzione sincrona (threadpool di FastAPI): decodifica e piramide non bloccano l'event loop.
+    """
+    audio_bytes = file.file.read()
+    key = track_key(audio_bytes, DEFAULT_SR)
+
+    def decode():
+        # I byte sono già in memoria: si decodificano da lì
+        return load_audio(io.BytesIO(audio_bytes))
 
-    # Ritorna un sottoinsieme dei risultati per il frontend
+    try:
+        pyramid = get_or_build_peak_pyramid(key, decode)
+    except DecodeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
     return {
-        "genre": results.get("genre"),
-        "final_plan": results.get("final_plan"),
-        "mix_agent": results.get("mix_agent"),
-        "theory_agent": results.get("theory_agent"),
-        "creative_agent": results.get("creative_agent"),
+        "track_id": key,
+        "sr": pyramid["sr"],
+        "duration_sec": pyramid["n_samples"] / pyramid["sr"],
+        "n_levels": pyramid["n_levels"],
     }
-    
\ No newline at end of file
+
+
+@app.get("/waveform/{track_id}")
+def waveform_view_endpoint(track_id: str, start: float = 0.0, end: float = -1.0, width: int = 1000):
+    """
+    Vista (start, end, width) della waveform: al massimo `width` punti con min, max e RMS.
+    end <= 0 significa "fino alla fine della traccia".
+    """
+    pyramid = load_peak_pyramid(track_id)
+    if pyramid is None:
+        raise HTTPException(status_code=404, detail="Traccia non trovata: caricala con POST /waveform.")
+
+    try:
+        return peak_view(pyramid, start, end, min(width, MAX_WAVEFORM_WIDTH))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,84 @@
+# ============================================================
+# AI MUSIC ANALYZER - FILTERBANK A BANDE (MATRICE BIN → BANDA)
+# ============================================================
+# Un BandSet descrive un insieme di bande di frequenza:
+#     BandSet([("sub", 20, 60), ("bass", 60, 150), ...])
+# Per ogni (sample rate, n_fft) viene costruita UNA volta una matrice
+# sparsa (bande x bin FFT) con i pesi di ciascun bin; l'energia di tutte
+# le bande è poi un solo prodotto matrice per spettro:
+#     energie = W @ spettro        (spettro: bin, oppure bin x frame)
+# Niente maschere booleane ricostruite a ogni chiamata e niente copie
+# dello spettrogramma per banda.
+# ============================================================
+
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=64)
+def _band_weights(bands, sr, n_fft, include_high, reduce):
+    """Matrice sparsa CSR (n_bande x (1 + n_fft // 2)) dei pesi bin → banda."""
+    from scipy.sparse import csr_matrix
+
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    rows, cols, vals = [], [], []
+    for i, (_, low, high) in enumerate(bands):
+        upper = freqs <= high if include_high else freqs < high
+        bins = np.flatnonzero((freqs >= low) & upper)
+        if len(bins) == 0:
+            continue
+        weight = 1.0 / len(bins) if reduce == "mean" else 1.0
+        rows.extend([i] * len(bins))
+        cols.extend(bins)
+        vals.extend([weight] * len(bins))
+
+    return csr_matrix((np.asarray(vals, dtype=np.float32), (rows, cols)),
+                      shape=(len(bands), len(freqs)))
+
+
+class BandSet:
+    """
+    Insieme di bande [(nome, f_low, f_high), ...] applicabile a uno spettro.
+    Parametri:
+        bands: lista di tuple (nome, frequenza minima, frequenza massima) in Hz
+        include_high: True se il bin a f_high appartiene alla banda (estremi inclusi)
+        reduce: "sum" (somma dei bin) oppure "mean" (media dei bin della banda)
+    """
+
+    def __init__(self, bands, include_high=False, reduce="sum"):
+        if reduce not in ("sum", "mean"):
+            raise ValueError(f"reduce deve essere 'sum' o 'mean', non {reduce!r}")
+        for name, low, high in bands:
+            if not low < high:
+                raise ValueError(f"Banda non valida {name!r}: {low} Hz ≥ {high} Hz")
+        self.bands = tuple((str(name), float(low), float(high)) for name, low, high in bands)
+        self.include_high = include_high
+        self.reduce = reduce
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.bands]
+
+    def weights(self, sr, n_fft):
+        """Matrice sparsa dei pesi per questo sample rate e n_fft (in cache)."""
+        return _band_weights(self.bands, sr, n_fft, self.include_high, self.reduce)
+
+    def apply(self, spectrum, sr, n_fft):
+        """
+        Energia per banda di uno spettro (magnitudo o potenza, scelta del chiamante).
+        spectrum: vettore di bin (1 + n_fft // 2) oppure matrice bin x frame.
+        Ritorna un vettore (n_bande) oppure una matrice n_bande x frame.
+        """
+        return np.asarray(self.weights(sr, n_fft) @ spectrum)
+
+    def percent(self, spectrum, sr, n_fft):
+        """Distribuzione percentuale {nome: %} dell'energia nelle bande (spettro 1D)."""
+        return to_percent(self.names, self.apply(spectrum, sr, n_fft))
+
+
+def to_percent(names, energies):
+    """Converte energie per banda in percentuali sul totale delle bande."""
+    energies = np.asarray(energies, dtype=np.float64)
+    total = float(np.sum(energies)) + 1e-9
+    return {name: float(e) / total * 100.0 for name, e in zip(names, energies)}
@@ -0,0 +1,361 @@
+# ============================================================
+# AI MUSIC ANALYZER - ANALISI BATCH DA TERMINALE
+# ============================================================
+# Questo script:
+# - Scansiona una o più cartelle alla ricerca di file audio
+# - Distribuisce l'analisi su un pool di processi
+# - Esegue gli stadi DSP (feature, summary, analisi avanzata, genere)
+#   e, se richiesto, anche la pipeline multi-agente
+# - Scrive i risultati in streaming (JSONL o Parquet) man mano che arrivano
+# - Salta i file già analizzati con successo → una run interrotta riprende da dove
+#   era (e riprova i file falliti)
+# - Stampa file/s e il tempo speso in ciascuno stadio
+#
+# Esempi:
+#   python batch_analyze.py catalogo/ --output risultati.jsonl
+#   python batch_analyze.py catalogo/ altre/ --output risultati.parquet --workers 8
+#   python batch_analyze.py catalogo/ --output risultati.jsonl --with-agents
+# ============================================================
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import ai_analyzer_backend as backend
+import similarity_index
+
+
+# ============================================================
+# CONFIGURAZIONE
+# ============================================================
+
+# Estensioni audio considerate durante la scansione
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".aiff", ".aif", ".flac", ".ogg", ".m4a")
+
+# Ogni quanti file stampare l'avanzamento
+PROGRESS_EVERY = 50
+
+# Righe accumulate prima di scrivere un nuovo file Parquet (parte)
+PARQUET_ROWS_PER_PART = 500
+
+# Stadi misurati per ogni file (in ordine di esecuzione)
+STAGES = ["load", "decimate", "features", "summary", "advanced", "genre", "agents"]
+
+
+# ============================================================
+# 1. SCANSIONE FILE
+# ============================================================
+
+def find_audio_files(inputs, extensions=AUDIO_EXTENSIONS):
+    """
+    Ritorna la lista ordinata dei file audio trovati.
+    Parametri:
+        inputs: lista di cartelle (visitate ricorsivamente) o file singoli
+        extensions: estensioni accettate (minuscole)
+    """
+    found = []
+    for item in inputs:
+        if os.path.isfile(item):
+            found.append(os.path.abspath(item))
+            continue
+        for root, _, files in os.walk(item):
+            for name in files:
+                if name.lower().endswith(extensions):
+                    found.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(set(found))
+
+
+# ============================================================
+# 2. WORKER (GIRA NEI PROCESSI DEL POOL)
+# ============================================================
+
+def init_worker(with_agents):
+    """Inizializzatore del pool: importa subito le dipendenze del profilo giusto."""
+    backend.preload_dependencies("full" if with_agents else "dsp")
+
+
+def analyze_file(path, with_agents=False):
+    """
+    Analizza un singolo file ed è pensata per girare in un processo del pool.
+    Non solleva eccezioni: in caso di errore ritorna un record con "ok": False.
+    Ritorna:
+        dizionario serializzabile in JSON con risultati e tempi per stadio
+    """
+    timings = {}
+    record = {"path": path, "ok": False, "error": None, "timings": timings}
+
+    def timed(stage, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings[stage] = time.perf_counter() - t0
+        return result
+
+    try:
+        y, sr = timed("load", backend.load_audio, path)
+        low_rate = timed("decimate", backend.rhythm_signal, y, sr)
+        feats = timed("features", backend.compute_features, y, sr, low_rate=low_rate)
+        summary = timed("summary", backend.summarize_track_features, feats)
+        adv = timed("advanced", backend.compute_advanced_analysis, y, sr, low_rate=low_rate)
+        genre, reason = timed("genre", backend.estimate_genre, summary, adv)
+
+        record.update({
+            "track_id": similarity_index.file_track_id(path),
+            "summary": summary,
+            "advanced": adv,
+            "genre": genre,
+            "genre_reason": reason,
+        })
+
+        if with_agents:
+            agents = timed("agents", backend.run_multiagent_pipeline,
+                           user_summary=summary, y_audio=y, sr=sr, adv_analysis=adv)
+            record["agents"] = agents
+
+        record["ok"] = True
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    return record
+
+
+# ============================================================
+# 3. OUTPUT IN STREAMING (JSONL / PARQUET)
+# ============================================================
+
+def flatten_record(record, prefix=""):
+    """Appiattisce i dizionari annidati (es. "summary.energy_percent.sub") per Parquet."""
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, prefix=name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+
+class JsonlWriter:
+    """Scrive un record JSON per riga, con flush immediato (resiste alle interruzioni)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def done_paths(self):
+        """
+        Percorsi già analizzati con successo (righe incomplete ignorate):
+        i file falliti vengono riprovati alla run successiva.
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record.get("ok"):
+                        done.add(record["path"])
+                except (ValueError, KeyError, AttributeError):
+                    continue
+        return done
+
+    def __enter__(self):
+        self._f = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def write(self, record):
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class ParquetWriter:
+    """
+    Scrive i risultati come cartella di file Parquet (part-00000.parquet, ...).
+    Ogni parte è un file completo: un'interruzione perde al massimo le righe in buffer.
+    Richiede pyarrow.
+    """
+
+    def __init__(self, path, rows_per_part=PARQUET_ROWS_PER_PART):
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self._rows = []
+
+    def _parts(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(n for n in os.listdir(self.path) if n.endswith(".parquet"))
+
+    def done_paths(self):
+        """Percorsi già analizzati con successo (i falliti vengono riprovati)."""
+        import pyarrow.parquet as pq
+
+        done = set()
+        for name in self._parts():
+            table = pq.read_table(os.path.join(self.path, name), columns=["path", "ok"])
+            done.update(path for path, ok in zip(table.column("path").to_pylist(),
+                                                 table.column("ok").to_pylist()) if ok)
+        return done
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._next_part = len(self._parts())
+        return self
+
+    def write(self, record):
+        self._rows.append(flatten_record(record))
+        if len(self._rows) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        # from_pylist prende le colonne dalla prima riga: un record fallito in testa
+        # farebbe sparire tutte le colonne dei risultati. Unione delle chiavi, in ordine
+        columns = list(dict.fromkeys(key for row in self._rows for key in row))
+        table = pa.Table.from_pylist([{key: row.get(key) for key in columns} for row in self._rows])
+        part_path = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        pq.write_table(table, part_path)
+        self._next_part += 1
+        self._rows = []
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+def make_writer(output_path):
+    """Sceglie il writer in base all'estensione dell'output."""
+    if output_path.endswith(".parquet"):
+        return ParquetWriter(output_path)
+    return JsonlWriter(output_path)
+
+
+# ============================================================
+# 4. ORCHESTRAZIONE DEL POOL
+# ============================================================
+
+def run_batch(inputs, output_path, workers=None, with_agents=False):
+    """
+    Esegue l'analisi batch e ritorna le statistiche finali.
+    I file vengono inviati al pool a finestre (al massimo 4 per worker in volo),
+    così anche cataloghi da decine di migliaia di file non riempiono la memoria.
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = make_writer(output_path)
+
+    all_files = find_audio_files(inputs)
+    done = writer.done_paths()
+    todo = [p for p in all_files if p not in done]
+
+    print(f"📂 File trovati: {len(all_files)} | già analizzati: {len(all_files) - len(todo)} "
+          f"| da analizzare: {len(todo)} | worker: {workers}")
+
+    stats = {
+        "files_total": len(all_files),
+        "files_skipped": len(all_files) - len(todo),
+        "files_ok": 0,
+        "files_failed": 0,
+        "stage_seconds": {stage: 0.0 for stage in STAGES},
+    }
+    if not todo:
+        stats["elapsed_sec"] = 0.0
+        stats["files_per_sec"] = 0.0
+        return stats
+
+    t_start = time.perf_counter()
+    pending_paths = iter(todo)
+    max_in_flight = workers * 4
+
+    with writer, ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker,
+                                     initargs=(with_agents,)) as pool:
+        in_flight = set()
+
+        def submit_next():
+            path = next(pending_paths, None)
+            if path is not None:
+                in_flight.add(pool.submit(analyze_file, path, with_agents))
+
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                in_flight.discard(fut)
+                record = fut.result()
+                writer.write(record)
+
+                if record["ok"]:
+                    stats["files_ok"] += 1
+                else:
+                    stats["files_failed"] += 1
+                    print(f"❌ {record['path']}: {record['error']}")
+                for stage, sec in record["timings"].items():
+                    stats["stage_seconds"][stage] += sec
+
+                processed = stats["files_ok"] + stats["files_failed"]
+                if processed % PROGRESS_EVERY == 0:
+                    rate = processed / (time.perf_counter() - t_start)
+                    print(f"⏳ {processed}/{len(todo)} file ({rate:.2f} file/s)")
+
+                submit_next()
+
+    elapsed = time.perf_counter() - t_start
+    processed = stats["files_ok"] + stats["files_failed"]
+    stats["elapsed_sec"] = elapsed
+    stats["files_per_sec"] = processed / elapsed if elapsed > 0 else 0.0
+    return stats
+
+
+def print_report(stats):
+    """Stampa file/s e la ripartizione del tempo CPU per stadio."""
+    print("\n================ REPORT BATCH =================\n")
+    print(f"File totali: {stats['files_total']} | saltati: {stats['files_skipped']} "
+          f"| ok: {stats['files_ok']} | errori: {stats['files_failed']}")
+    print(f"Tempo totale: {stats['elapsed_sec']:.1f} s | throughput: {stats['files_per_sec']:.2f} file/s")
+
+    processed = stats["files_ok"] + stats["files_failed"]
+    total_stage = sum(stats["stage_seconds"].values())
+    if processed == 0 or total_stage == 0:
+        return
+
+    print("\nTempo per stadio (somma sui worker):")
+    for stage in STAGES:
+        sec = stats["stage_seconds"][stage]
+        if sec == 0:
+            continue
+        print(f"- {stage:<9} {sec:9.1f} s  {sec / processed * 1000:8.1f} ms/file  "
+              f"{sec / total_stage * 100:5.1f}%")
+
+
+# ============================================================
+# 5. ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analisi batch di cataloghi audio")
+    parser.add_argument("inputs", nargs="+", help="Cartelle (ricorsive) o file audio")
+    parser.add_argument("--output", "-o", required=True,
+                        help="File .jsonl oppure cartella .parquet dei risultati")
+    parser.add_argument("--workers", "-j", type=int, default=None,
+                        help="Numero di processi (default: numero di CPU)")
+    parser.add_argument("--with-agents", action="store_true",
+                        help="Esegue anche la pipeline multi-agente (richiede Ollama)")
+    args = parser.parse_args(argv)
+
+    stats = run_batch(args.inputs, args.output,
+                      workers=args.workers, with_agents=args.with_agents)
+    print_report(stats)
+    return 0 if stats["files_failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
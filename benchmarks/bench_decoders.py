@@ -0,0 +1,224 @@
+"""
+bench_decoders.py - velocità di decodifica per formato e decoder
+----------------------------------------------------------------
+Lo stesso segnale stereo sintetico (click track + accordi) codificato in
+WAV, AIFF, FLAC, OGG Vorbis, MP3 (con soundfile) e M4A / AAC (solo se c'è
+ffmpeg per crearlo), decodificato con:
+    * librosa.load(sr=None, mono=False)   il percorso usato prima di audio_decoder
+    * ogni decoder disponibile per il contenitore (audio_decoder.available_decoders)
+    * decode_audio da stream in memoria  come arriva un upload di /analyze
+Per ogni caso: velocità rispetto al tempo reale (x RT) e MB/s di file letto,
+migliore di --repeats (tempo wall).
+Verifica anche che il decoder scelto produca lo stesso segnale di librosa
+(stesso sample rate, stessi campioni entro DECODE_TOLERANCE; per i formati
+lossy solo la durata, i decoder MP3/AAC differiscono per il padding).
+
+Risultati pubblicati in benchmarks/baselines/decoders.json (--save-baseline).
+Exit code 1 se un formato non si decodifica o il segnale non corrisponde.
+
+Uso:
+    python benchmarks/bench_decoders.py
+    python benchmarks/bench_decoders.py --seconds 300 --formats mp3 flac
+    python benchmarks/bench_decoders.py --save-baseline
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+# La root del progetto va nel path per importare i moduli del backend
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import audio_decoder  # noqa: E402
+from bench_dsp_suite import machine_info  # noqa: E402
+from synthetic_signals import click_track, key_progression  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "decoders.json")
+
+SR = 44100
+
+# Formati: (estensione, formato soundfile, subtype) - None = creato con ffmpeg
+FORMATS = {
+    "wav": ("wav", "WAV", "PCM_16"),
+    "aiff": ("aiff", "AIFF", "PCM_16"),
+    "flac": ("flac", "FLAC", "PCM_16"),
+    "ogg": ("ogg", "OGG", "VORBIS"),
+    "mp3": ("mp3", "MP3", "MPEG_LAYER_III"),
+    "m4a": ("m4a", None, None),
+}
+LOSSY = {"ogg", "mp3", "m4a"}
+
+# Differenza massima ammessa rispetto a librosa per i formati lossless
+DECODE_TOLERANCE = 1e-6
+
+# Campioni scritti per ogni chiamata a soundfile (blocchi enormi mandano in crash
+# l'encoder Vorbis di alcune versioni di libsndfile)
+WRITE_BLOCK = 1 << 16
+
+
+def stereo_signal(seconds, sr=SR):
+    """Click track e accordi, con il canale destro ritardato di 5 ms (immagine stereo)."""
+    mono = click_track(124.0, sr, seconds) + key_progression(9, "minor", sr, seconds)
+    mono = (mono / np.max(np.abs(mono)) * 0.8).astype(np.float32)
+    return np.stack([mono, np.roll(mono, int(0.005 * sr))])
+
+
+def encode(y, path, fmt):
+    ext, sf_format, subtype = FORMATS[fmt]
+    if sf_format is None:
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            return False
+        wav_path = path + ".wav"
+        sf.write(wav_path, y.T, SR)
+        subprocess.run([ffmpeg, "-v", "error", "-y", "-i", wav_path, "-c:a", "aac", "-b:a", "192k", path],
+                       check=True)
+        os.remove(wav_path)
+        return True
+    if sf_format not in sf.available_formats():
+        return False
+    with sf.SoundFile(path, "w", SR, y.shape[0], format=sf_format, subtype=subtype) as f:
+        for i in range(0, y.shape[1], WRITE_BLOCK):
+            f.write(y[:, i:i + WRITE_BLOCK].T)
+    return True
+
+
+def best_wall(fn, repeats):
+    best, result = None, None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def librosa_load(path):
+    import librosa
+
+    y, sr = librosa.load(path, sr=None, mono=False)
+    return np.atleast_2d(y), sr
+
+
+def check_signal(fmt, reference, decoded):
+    """Problemi del segnale decodificato rispetto a librosa (lista vuota = ok)."""
+    (y_ref, sr_ref), (y, sr) = reference, decoded
+    if sr != sr_ref or y.shape[0] != y_ref.shape[0]:
+        return [f"{fmt}: sample rate / canali diversi ({sr}, {y.shape[0]} vs {sr_ref}, {y_ref.shape[0]})"]
+    if fmt in LOSSY:
+        if abs(y.shape[1] - y_ref.shape[1]) > 0.05 * sr:
+            return [f"{fmt}: durata diversa ({y.shape[1] / sr:.2f} s vs {y_ref.shape[1] / sr:.2f} s)"]
+        return []
+    if y.shape != y_ref.shape or np.max(np.abs(y - y_ref)) > DECODE_TOLERANCE:
+        return [f"{fmt}: campioni diversi da librosa"]
+    return []
+
+
+def bench_format(fmt, path, seconds, repeats):
+    """Risultati {caso: {"wall_sec", "x_realtime", "mb_per_sec"}} e problemi trovati."""
+    size_mb = os.path.getsize(path) / 1e6
+    with open(path, "rb") as f:
+        data = f.read()
+    container = audio_decoder.sniff_container(data[:64])
+
+    def row(wall):
+        return {"wall_sec": wall, "x_realtime": seconds / wall, "mb_per_sec": size_mb / wall}
+
+    results, problems = {}, []
+    reference = None
+    try:
+        wall, reference = best_wall(lambda: librosa_load(path), repeats)
+        results["librosa.load"] = row(wall)
+    except Exception as e:
+        results["librosa.load"] = {"error": f"{type(e).__name__}: {e}"}
+
+    for name in audio_decoder.available_decoders(container):
+        try:
+            wall, (y, sr, _) = best_wall(lambda: audio_decoder.decode_audio(path, decoder=name), repeats)
+        except audio_decoder.DecodeError as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = row(wall)
+        if reference is not None:
+            problems += check_signal(f"{fmt}/{name}", reference, (y, sr))
+
+    # Come /analyze: decoder scelto in automatico, lettura dallo stream dell'upload
+    try:
+        wall, (y, sr, info) = best_wall(lambda: audio_decoder.decode_audio(io.BytesIO(data)), repeats)
+        results["stream"] = dict(row(wall), decoder=info["decoder"])
+    except audio_decoder.DecodeError as e:
+        results["stream"] = {"error": str(e)}
+        problems.append(f"{fmt}: nessun decoder disponibile ({e})")
+    return container, size_mb, results, problems
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Scrive i risultati di questa run (un file per macchina / ambiente)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"machine": machine_info(),
+                   "decoders": {name: audio_decoder.available_decoders(name)
+                                for name in audio_decoder.DECODER_PREFERENCE},
+                   "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "results": results}, f, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Velocità di decodifica per formato e decoder")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Scrive i risultati anche in questo file JSON")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"Pubblica i risultati in {os.path.relpath(BASELINE_PATH)}")
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore")
+
+    y = stereo_signal(args.seconds)
+    all_results, all_problems = {}, []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for fmt in args.formats:
+            path = os.path.join(tmpdir, f"bench.{FORMATS[fmt][0]}")
+            if not encode(y, path, fmt):
+                print(f"⏭️  {fmt}: encoder non disponibile, salto")
+                continue
+
+            container, size_mb, results, problems = bench_format(fmt, path, args.seconds, args.repeats)
+            all_results[fmt] = {"container": container, "size_mb": size_mb, "seconds": args.seconds,
+                                "cases": results}
+            all_problems += problems
+
+            print(f"{'✅' if not problems else '❌'} {fmt:5s} ({container}, {size_mb:6.1f} MB)")
+            for case, r in results.items():
+                if "error" in r:
+                    print(f"      {case:13s} errore: {r['error'][:90]}")
+                    continue
+                chosen = f"  → {r['decoder']}" if "decoder" in r else ""
+                print(f"      {case:13s} {r['wall_sec'] * 1000:8.1f} ms  {r['x_realtime']:7.0f}x RT  "
+                      f"{r['mb_per_sec']:7.1f} MB/s{chosen}")
+
+    for problem in all_problems:
+        print(f"❌ {problem}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        save_baseline(all_results)
+        print(f"💾 Risultati pubblicati in {BASELINE_PATH}")
+    return 1 if all_problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
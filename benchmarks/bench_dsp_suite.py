@@ -0,0 +1,274 @@
+"""
+bench_dsp_suite.py - micro-benchmark della DSP con soglie di regressione
+------------------------------------------------------------------------
+Stadi misurati (tempo wall, migliore di N, e picco di memoria con tracemalloc):
+    load_audio, rhythm_signal, compute_features, compute_advanced_analysis,
+    summarize_track_features, estimate_genre_from_summary
+Ingressi sintetici (benchmarks/synthetic_signals.py) a 30 s, 5 min e 60 min:
+    click_128   click track a 128 BPM          → verifica BPM (±3%)
+    key_Am      cadenza in La minore            → verifica tonalità e modo
+    pink        rumore rosa                     → verifica che non ci siano NaN / valori assurdi
+
+Baseline in benchmarks/baselines/dsp_suite.json. Exit code 1 se:
+    * una verifica di correttezza fallisce
+    * un caso è più lento della baseline oltre --time-threshold (default 25%)
+      o usa più memoria oltre --memory-threshold (default 15%)
+
+Uso:
+    python benchmarks/bench_dsp_suite.py                      # 30 s e 5 min, confronto con la baseline
+    python benchmarks/bench_dsp_suite.py --sizes 30s          # solo i casi brevi
+    python benchmarks/bench_dsp_suite.py --sizes 60m --repeats 1
+    python benchmarks/bench_dsp_suite.py --save-baseline      # aggiorna la baseline con questa run
+NB: 60 minuti a 44.1 kHz richiedono diversi GB di RAM (STFT completa).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+
+# La root del progetto va nel path per importare i moduli del backend
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import ai_analyzer_backend as backend  # noqa: E402
+import synthetic_signals  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "dsp_suite.json")
+
+# Durate disponibili (secondi) e quelle eseguite di default
+SIZES = {"30s": 30.0, "5m": 300.0, "60m": 3600.0}
+DEFAULT_SIZES = ["30s", "5m"]
+
+# Soglie di regressione (frazione rispetto alla baseline)
+DEFAULT_TIME_THRESHOLD = 0.25
+DEFAULT_MEMORY_THRESHOLD = 0.15
+
+# Sotto queste differenze assolute una variazione è rumore di misura
+MIN_TIME_DELTA_SEC = 0.0002
+MIN_MEMORY_DELTA_MB = 1.0
+
+# Gli stadi più veloci di MICRO_STAGE_MAX_SEC vengono ripetuti fino a
+# MICRO_STAGE_MIN_SEC di tempo totale (tempo per chiamata = media)
+MICRO_STAGE_MAX_SEC = 0.05
+MICRO_STAGE_MIN_SEC = 0.2
+
+# Tolleranza relativa sul BPM (risoluzione del tempogramma sul segnale decimato)
+BPM_TOLERANCE = 0.03
+
+SIGNALS = {
+    "click_128": {"make": lambda sr, sec: synthetic_signals.click_track(128, sr, sec),
+                  "bpm": 128.0},
+    "key_Am": {"make": lambda sr, sec: synthetic_signals.key_progression(9, "minor", sr, sec),
+               "key": ("A", "minor")},
+    "pink": {"make": lambda sr, sec: synthetic_signals.pink_noise(sr, sec)},
+}
+
+
+# ============================================================
+# 1. MISURE
+# ============================================================
+
+def best_time(fn, repeats):
+    """Tempo wall migliore su `repeats` esecuzioni (ripetute se molto brevi) e ultimo risultato."""
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        calls = 0
+        t0 = time.perf_counter()
+        while True:
+            result = fn()
+            calls += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= MICRO_STAGE_MIN_SEC or (calls == 1 and elapsed >= MICRO_STAGE_MAX_SEC):
+                break
+        best = min(best, elapsed / calls)
+    return best, result
+
+
+def peak_memory_mb(fn):
+    """Picco di memoria (MB) allocato da fn (numpy registra le sue allocazioni in tracemalloc)."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
+
+
+def run_signal(name, spec, size, sr, repeats, tmpdir):
+    """Esegue tutti gli stadi su un segnale. Ritorna (risultati per caso, problemi di correttezza)."""
+    y_src = spec["make"](sr, SIZES[size])
+    path = os.path.join(tmpdir, f"{name}_{size}.wav")
+    sf.write(path, y_src, sr, subtype="PCM_16")
+    del y_src
+
+    results = {}
+
+    def stage(stage_name, fn):
+        wall, result = best_time(fn, repeats)
+        peak = peak_memory_mb(fn)
+        results[f"{stage_name}/{name}/{size}"] = {"wall_sec": wall, "peak_mb": peak}
+        print(f"   {stage_name:<30} {name:<10} {size:>4} | {wall * 1000:10.2f} ms | {peak:8.1f} MB")
+        return result
+
+    y, sr_loaded = stage("load_audio", lambda: backend.load_audio(path))
+    low_rate = stage("rhythm_signal", lambda: backend.rhythm_signal(y, sr_loaded))
+    feats = stage("compute_features", lambda: backend.compute_features(y, sr_loaded, low_rate=low_rate))
+    adv = stage("compute_advanced_analysis",
+                lambda: backend.compute_advanced_analysis(y, sr_loaded, low_rate=low_rate))
+    summary = stage("summarize_track_features", lambda: backend.summarize_track_features(feats))
+    stage("estimate_genre_from_summary", lambda: backend.estimate_genre_from_summary(summary))
+
+    return results, check_correctness(name, size, spec, summary, adv)
+
+
+def check_correctness(name, size, spec, summary, adv):
+    """Confronta BPM / tonalità con i valori noti del segnale sintetico."""
+    problems = []
+    label = f"{name}/{size}"
+
+    if "bpm" in spec:
+        bpm = summary["bpm"]
+        if abs(bpm - spec["bpm"]) > BPM_TOLERANCE * spec["bpm"]:
+            problems.append(f"{label}: BPM {bpm:.1f}, atteso {spec['bpm']:.1f}")
+    if "key" in spec:
+        found = (summary["key_root"], summary["key_mode"])
+        if found != spec["key"]:
+            problems.append(f"{label}: tonalità {found[0]} {found[1]}, attesa {spec['key'][0]} {spec['key'][1]}")
+
+    energy = np.array(list(summary["energy_percent"].values()))
+    if not np.all(np.isfinite(energy)) or abs(energy.sum() - 100.0) > 0.1:
+        problems.append(f"{label}: percentuali di energia non valide ({energy.sum():.2f}%)")
+    if not np.isfinite(adv["loudness"]["integrated_lufs"]):
+        problems.append(f"{label}: LUFS integrato non finito")
+    return problems
+
+
+# ============================================================
+# 2. BASELINE
+# ============================================================
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Aggiorna la baseline con i casi di questa run (gli altri casi restano)."""
+    baseline = load_baseline(path) or {"results": {}}
+    baseline["results"].update(results)
+    baseline["machine"] = machine_info()
+    baseline["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare_with_baseline(results, baseline, time_threshold, memory_threshold):
+    """Ritorna la lista delle regressioni rispetto alla baseline."""
+    regressions = []
+    for case, current in sorted(results.items()):
+        ref = baseline["results"].get(case)
+        if ref is None:
+            continue
+        dt = current["wall_sec"] - ref["wall_sec"]
+        if dt > time_threshold * ref["wall_sec"] and dt > MIN_TIME_DELTA_SEC:
+            regressions.append(f"{case}: tempo {current['wall_sec'] * 1000:.2f} ms "
+                               f"vs {ref['wall_sec'] * 1000:.2f} ms (+{dt / ref['wall_sec'] * 100:.0f}%)")
+        dm = current["peak_mb"] - ref["peak_mb"]
+        if dm > memory_threshold * ref["peak_mb"] and dm > MIN_MEMORY_DELTA_MB:
+            regressions.append(f"{case}: memoria {current['peak_mb']:.1f} MB "
+                               f"vs {ref['peak_mb']:.1f} MB (+{dm / max(ref['peak_mb'], 1e-9) * 100:.0f}%)")
+    return regressions
+
+
+# ============================================================
+# 3. ENTRY POINT
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DSP con soglie di regressione")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=DEFAULT_SIZES)
+    parser.add_argument("--signals", nargs="+", choices=list(SIGNALS), default=list(SIGNALS))
+    parser.add_argument("--repeats", type=int, default=3, help="Ripetizioni per caso (si tiene la migliore)")
+    parser.add_argument("--sr", type=int, default=backend.DEFAULT_SR)
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Scrive i risultati nella baseline invece di confrontarli")
+    parser.add_argument("--output", help="Salva anche i risultati di questa run (JSON)")
+    args = parser.parse_args()
+
+    # Giro a vuoto: import, JIT e cache dei filtri fuori dalle misure
+    warm = synthetic_signals.click_track(120, args.sr, 3.0)
+    backend.compute_advanced_analysis(warm, args.sr, low_rate=backend.rhythm_signal(warm, args.sr))
+    backend.compute_features(warm, args.sr, low_rate=backend.rhythm_signal(warm, args.sr))
+
+    results, problems = {}, []
+    print(f"⏱  DSP suite (migliore di {args.repeats}, sr {args.sr} Hz)")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            for name in args.signals:
+                case_results, case_problems = run_signal(
+                    name, SIGNALS[name], size, args.sr, args.repeats, tmpdir)
+                results.update(case_results)
+                problems += case_problems
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "results": results}, f, indent=2, sort_keys=True)
+
+    if problems:
+        print("\n❌ Verifiche di correttezza fallite:")
+        for p in problems:
+            print("  -", p)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\n💾 Baseline aggiornata: {args.baseline} ({len(results)} casi)")
+        sys.exit(1 if problems else 0)
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\n⚠️ Nessuna baseline in {args.baseline}: lanciare con --save-baseline")
+        sys.exit(1 if problems else 0)
+    if baseline.get("machine", {}).get("processor") != machine_info()["processor"] \
+            or baseline.get("machine", {}).get("cpu_count") != os.cpu_count():
+        print("\n⚠️ Baseline registrata su un'altra macchina: i tempi sono solo indicativi")
+
+    regressions = compare_with_baseline(results, baseline, args.time_threshold, args.memory_threshold)
+    if regressions:
+        print(f"\n❌ Regressioni (soglie: tempo +{args.time_threshold * 100:.0f}%, "
+              f"memoria +{args.memory_threshold * 100:.0f}%):")
+        for r in regressions:
+            print("  -", r)
+
+    if problems or regressions:
+        sys.exit(1)
+    print("\n✅ Nessuna regressione rispetto alla baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+bench_key_detection.py - tonalità da STFT (key_detection) vs chroma_cqt
+-----------------------------------------------------------------------
+- Genera segnali sintetici con cadenze I-IV-V-I (maggiore) e i-iv-v-i (minore)
+  in tutte le 24 tonalità (synthetic_signals.key_progression), con un po' di rumore
+- Per ogni segnale misura:
+    * percorso vecchio: chroma_cqt + argmax (solo nota fondamentale)
+    * percorso nuovo: chroma dalla STFT già calcolata + profili maggiore/minore
+- Stampa tempi medi e accuratezza (nota fondamentale e modo)
+- Con --files confronta i due percorsi anche su file audio reali
+
+Uso:
+    python benchmarks/bench_key_detection.py
+    python benchmarks/bench_key_detection.py --seconds 30 --files brano1.wav brano2.mp3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# La root del progetto va nel path per importare i moduli del backend
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from ai_analyzer_backend import DEFAULT_FRAME_LENGTH, DEFAULT_HOP_LENGTH, DEFAULT_SR  # noqa: E402
+import key_detection  # noqa: E402
+from synthetic_signals import key_progression  # noqa: E402
+
+def synth_cadence(root, mode, sr, seconds, seed=0):
+    """Una cadenza (synthetic_signals.key_progression) lunga `seconds` + un po' di rumore."""
+    rng = np.random.default_rng(seed)
+    y = key_progression(root, mode, sr, seconds, chord_sec=seconds / 4)
+    return y + (0.003 * rng.standard_normal(len(y))).astype(np.float32)
+
+
+def key_cqt(y, sr):
+    """Percorso precedente: chroma_cqt + argmax della media."""
+    import librosa
+
+    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+    return key_detection.NOTE_NAMES[int(np.argmax(chroma.mean(axis=1)))]
+
+
+def key_stft(spectrogram, sr):
+    """Percorso nuovo: chroma dalla magnitudo STFT già disponibile + profili."""
+    return key_detection.key_from_power(spectrogram**2, sr, DEFAULT_FRAME_LENGTH)
+
+
+def stft_magnitude(y):
+    import librosa
+
+    return np.abs(librosa.stft(y, n_fft=DEFAULT_FRAME_LENGTH, hop_length=DEFAULT_HOP_LENGTH))
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def run_synthetic(sr, seconds):
+    cqt_times, stft_times = [], []
+    cqt_root_ok = stft_root_ok = stft_mode_ok = 0
+    cases = [(root, mode) for mode in key_detection.KEY_MODES for root in range(12)]
+
+    # Un giro a vuoto per escludere import e cache dei filtri dai tempi
+    y = synth_cadence(0, "major", sr, seconds)
+    key_cqt(y, sr)
+    key_stft(stft_magnitude(y), sr)
+
+    for i, (root, mode) in enumerate(cases):
+        y = synth_cadence(root, mode, sr, seconds, seed=i)
+        spectrogram = stft_magnitude(y)
+
+        root_cqt, t_cqt = timed(key_cqt, y, sr)
+        key, t_stft = timed(key_stft, spectrogram, sr)
+        cqt_times.append(t_cqt)
+        stft_times.append(t_stft)
+
+        expected = key_detection.NOTE_NAMES[root]
+        cqt_root_ok += root_cqt == expected
+        stft_root_ok += key["key_root"] == expected
+        stft_mode_ok += key["key_root"] == expected and key["key_mode"] == mode
+
+    n = len(cases)
+    t_cqt = np.mean(cqt_times) * 1000
+    t_stft = np.mean(stft_times) * 1000
+    print(f"🎼 Segnali sintetici: {n} tonalità da {seconds:.0f} s a {sr} Hz")
+    print(f"   chroma_cqt + argmax : {t_cqt:8.1f} ms/traccia | nota corretta {cqt_root_ok}/{n}")
+    print(f"   STFT + profili      : {t_stft:8.1f} ms/traccia | nota corretta {stft_root_ok}/{n} "
+          f"| nota+modo corretti {stft_mode_ok}/{n}")
+    print(f"   costo relativo      : {t_stft / t_cqt * 100:.1f}% del percorso CQT")
+
+
+def run_files(paths, sr):
+    import librosa
+
+    print("\n🎧 File reali (CQT: solo nota | STFT: nota, modo, confidenza)")
+    for path in paths:
+        y, _ = librosa.load(path, sr=sr, mono=True)
+        root_cqt, t_cqt = timed(key_cqt, y, sr)
+        key, t_stft = timed(key_stft, stft_magnitude(y), sr)
+        print(f"   {os.path.basename(path)}: CQT {root_cqt} ({t_cqt * 1000:.0f} ms) | "
+              f"STFT {key['key_root']} {key['key_mode']} conf {key['key_confidence']:.2f} "
+              f"({t_stft * 1000:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stima tonalità STFT vs CQT")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Durata dei segnali sintetici")
+    parser.add_argument("--sr", type=int, default=DEFAULT_SR)
+    parser.add_argument("--files", nargs="*", default=[], help="File audio reali da confrontare")
+    args = parser.parse_args()
+
+    run_synthetic(args.sr, args.seconds)
+    if args.files:
+        run_files(args.files, args.sr)
+
+
+if __name__ == "__main__":
+    main()
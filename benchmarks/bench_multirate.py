@@ -0,0 +1,127 @@
+"""
+bench_multirate.py - CPU risparmiata dall'analisi multi-rate per traccia
+-----------------------------------------------------------------------
+Confronta due modalità della stessa pipeline (load_audio + compute_features
++ compute_advanced_analysis):
+    * piena banda: tutto ricampionato a 44.1 kHz, ritmo e tonalità a piena banda
+      (load_audio con native_rates=() e low_rate = segnale originale)
+    * multi-rate: sample rate nativo (44.1 / 48 kHz) e copia decimata
+      (rhythm_signal) per BPM, tonalità e transienti
+Misura il tempo CPU (time.process_time) e controlla che BPM e tonalità coincidano.
+
+Senza argomenti usa tracce sintetiche (batteria + accordi) a 44.1 e 48 kHz.
+
+Uso:
+    python benchmarks/bench_multirate.py
+    python benchmarks/bench_multirate.py --seconds 240 --files brano1.wav brano2.flac
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# La root del progetto va nel path per importare i moduli del backend
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import ai_analyzer_backend as backend  # noqa: E402
+
+
+def synth_track(sr, seconds, bpm=124.0, seed=0):
+    """Cassa in quarti, hi-hat in ottavi e accordi di A minore / F / C / G."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    y = np.zeros(n)
+
+    beat = 60.0 / bpm
+    kick_t = np.arange(int(0.25 * sr)) / sr
+    kick = np.sin(2 * np.pi * (50 + 80 * np.exp(-kick_t * 30)) * kick_t) * np.exp(-kick_t * 12)
+    hat = rng.standard_normal(int(0.05 * sr)) * np.exp(-np.arange(int(0.05 * sr)) / (0.01 * sr))
+    for k in range(int(seconds / beat * 2)):
+        start = int(k * beat / 2 * sr)
+        if k % 2 == 0:
+            seg = kick[:n - start]
+            y[start:start + len(seg)] += seg
+        seg = hat[:n - start] * 0.2
+        y[start:start + len(seg)] += seg
+
+    chords = [(57, 60, 64), (53, 57, 60), (48, 52, 55), (55, 59, 62)]
+    bar = 4 * beat
+    for i, chord in enumerate(chords * int(seconds / bar / len(chords) + 1)):
+        s0, s1 = int(i * bar * sr), min(n, int((i + 1) * bar * sr))
+        if s0 >= n:
+            break
+        for midi in chord:
+            f0 = 440.0 * 2 ** ((midi - 69) / 12)
+            y[s0:s1] += 0.15 * np.sin(2 * np.pi * f0 * t[s0:s1])
+
+    return (0.5 * y / np.max(np.abs(y))).astype(np.float32)
+
+
+def run_pipeline(path, multirate):
+    """Esegue la pipeline DSP di una traccia e ritorna (secondi CPU, bpm, tonalità)."""
+    t0 = time.process_time()
+    if multirate:
+        y, sr = backend.load_audio(path)
+        low_rate = backend.rhythm_signal(y, sr)
+    else:
+        y, sr = backend.load_audio(path, native_rates=())
+        low_rate = (y, sr)
+    feats = backend.compute_features(y, sr, low_rate=low_rate)
+    backend.compute_advanced_analysis(y, sr, low_rate=low_rate)
+    cpu = time.process_time() - t0
+    return cpu, feats["bpm"], f"{feats['key_root']} {feats['key_mode']}"
+
+
+def bench_file(path, repeats):
+    results = {}
+    for mode in (False, True):
+        runs = [run_pipeline(path, mode) for _ in range(repeats)]
+        results[mode] = (min(r[0] for r in runs), runs[0][1], runs[0][2])
+
+    (cpu_full, bpm_full, key_full), (cpu_mr, bpm_mr, key_mr) = results[False], results[True]
+    saved = (1 - cpu_mr / cpu_full) * 100
+    print(f"   {os.path.basename(path):<24} piena banda {cpu_full:6.2f} s | multi-rate {cpu_mr:6.2f} s "
+          f"| risparmio {saved:5.1f}% | BPM {bpm_full:.1f} → {bpm_mr:.1f} | key {key_full} → {key_mr}")
+    return cpu_full, cpu_mr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analisi multi-rate")
+    parser.add_argument("--seconds", type=float, default=180.0, help="Durata delle tracce sintetiche")
+    parser.add_argument("--repeats", type=int, default=2, help="Ripetizioni (si tiene la migliore)")
+    parser.add_argument("--files", nargs="*", default=[], help="File audio reali")
+    args = parser.parse_args()
+
+    import soundfile as sf
+
+    # Giro a vuoto: import e cache dei filtri fuori dalle misure
+    backend.compute_features(synth_track(backend.DEFAULT_SR, 3.0), backend.DEFAULT_SR)
+
+    totals = [0.0, 0.0]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = list(args.files)
+        if not paths:
+            for sr in (44100, 48000):
+                path = os.path.join(tmpdir, f"sintetica_{sr // 1000}k.wav")
+                sf.write(path, synth_track(sr, args.seconds), sr)
+                paths.append(path)
+
+        print(f"⏱  CPU per traccia (migliore di {args.repeats}):")
+        for path in paths:
+            cpu_full, cpu_mr = bench_file(path, args.repeats)
+            totals[0] += cpu_full
+            totals[1] += cpu_mr
+
+    print(f"\n✅ CPU risparmiata: {totals[0] - totals[1]:.2f} s su {totals[0]:.2f} s "
+          f"({(1 - totals[1] / totals[0]) * 100:.1f}%), "
+          f"{(totals[0] - totals[1]) / len(paths):.2f} s per traccia")
+
+
+if __name__ == "__main__":
+    main()
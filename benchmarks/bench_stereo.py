@@ -0,0 +1,99 @@
+"""
+bench_stereo.py - costo dell'analisi stereo rispetto a un passaggio mono
+------------------------------------------------------------------------
+Confronta, sullo stesso segnale stereo sintetico (batteria + accordi con
+side decorrelato sopra 300 Hz):
+    * passaggio mono: compute_features + compute_advanced_analysis sul mix mono
+      (quello che costerebbe analizzare un canale in più)
+    * stereo: compute_stereo_analysis (una STFT a batch di Mid e Side)
+    * decodifica: load_audio (mono) vs load_audio_channels (canali + mix mono)
+Tempo CPU (time.process_time), migliore di --repeats. Exit code 1 se l'analisi
+stereo costa più di un passaggio mono.
+
+Uso:
+    python benchmarks/bench_stereo.py
+    python benchmarks/bench_stereo.py --seconds 30 300
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+# La root del progetto va nel path per importare i moduli del backend
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import ai_analyzer_backend as backend  # noqa: E402
+from synthetic_signals import click_track, key_progression  # noqa: E402
+
+SR = 44100
+
+
+def stereo_signal(seconds, sr=SR, seed=0):
+    """Batteria e accordi al centro + rumore decorrelato (solo alte) ai lati."""
+    from scipy.signal import butter, sosfilt
+
+    center = click_track(124.0, sr, seconds) + key_progression(9, "minor", sr, seconds)
+    rng = np.random.default_rng(seed)
+    hp = butter(4, 300, "hp", fs=sr, output="sos")
+    sides = sosfilt(hp, rng.standard_normal((2, len(center))) * 0.05, axis=-1)
+    y = (center + sides).astype(np.float32)
+    return y / np.max(np.abs(y)) * 0.8
+
+
+def cpu_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        c0 = time.process_time()
+        fn()
+        elapsed = time.process_time() - c0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costo dell'analisi stereo")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 300])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore")
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for seconds in args.seconds:
+            y_channels = stereo_signal(seconds)
+            path = os.path.join(tmpdir, f"stereo_{int(seconds)}.wav")
+            sf.write(path, y_channels.T, SR)
+            y_mono = y_channels.mean(axis=0)
+
+            def mono_pass():
+                low_rate = backend.rhythm_signal(y_mono, SR)
+                backend.compute_features(y_mono, SR, low_rate=low_rate)
+                backend.compute_advanced_analysis(y_mono, SR, low_rate=low_rate)
+
+            mono_sec = cpu_time(mono_pass, args.repeats)
+            stereo_sec = cpu_time(lambda: backend.compute_stereo_analysis(y_channels, SR), args.repeats)
+            load_mono = cpu_time(lambda: backend.load_audio(path), args.repeats)
+            load_multi = cpu_time(lambda: backend.load_audio_channels(path), args.repeats)
+
+            ok = stereo_sec < mono_sec
+            failed |= not ok
+            print(f"{'✅' if ok else '❌'} {seconds:5.0f} s | passaggio mono {mono_sec:6.2f} s | "
+                  f"stereo {stereo_sec:6.2f} s ({stereo_sec / mono_sec * 100:4.0f}%) | "
+                  f"decodifica mono {load_mono:5.2f} s, canali {load_multi:5.2f} s")
+
+            stereo = backend.compute_stereo_analysis(y_channels, SR)
+            print(f"      correlazione {stereo['correlation']:+.2f}, side/mid {stereo['side_to_mid_db']:.1f} dB, "
+                  f"bassi {stereo['low_end']['mono_ratio'] * 100:.0f}% mono")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+check_import_time.py - budget sul tempo di import dei moduli principali
+-----------------------------------------------------------------------
+- Lancia un interprete pulito con `python -X importtime -c "import <modulo>"`
+- Legge l'output di importtime (stderr) e ricava il tempo cumulativo del modulo
+- Fallisce (exit code 1) se:
+    * il tempo supera il budget in millisecondi
+    * vengono importati moduli vietati (es. chromadb/ollama in un worker DSP)
+
+Uso:
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --module ai_analyzer_backend --budget-ms 400
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Cartella root del progetto (dove stanno i moduli da importare)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget di default per modulo (millisecondi, tempo cumulativo di import)
+# e moduli che NON devono essere importati come effetto collaterale
+DEFAULT_CHECKS = {
+    "ai_analyzer_backend": {
+        "budget_ms": 250.0,
+        "forbidden": ["librosa", "pyloudnorm", "chromadb", "ollama"],
+    },
+}
+
+
+def parse_importtime(stderr_text):
+    """
+    Converte l'output di `-X importtime` in un dizionario
+    modulo -> (self_us, cumulative_us).
+    Formato delle righe: "import time:   self [us] |  cumulative | imported package"
+    """
+    timings = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            # riga di intestazione ("self [us] | cumulative | ...")
+            continue
+        name = parts[2].strip()
+        timings[name] = (self_us, cumulative_us)
+    return timings
+
+
+def measure_import(module_name):
+    """Importa il modulo in un processo nuovo e ritorna i tempi di import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import di {module_name} fallito:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def check_module(module_name, budget_ms, forbidden):
+    """Verifica budget e moduli vietati. Ritorna la lista dei problemi trovati."""
+    timings = measure_import(module_name)
+    problems = []
+
+    cumulative_ms = timings.get(module_name, (0, 0))[1] / 1000.0
+    print(f"⏱  import {module_name}: {cumulative_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    if cumulative_ms > budget_ms:
+        problems.append(f"{module_name}: {cumulative_ms:.1f} ms > budget {budget_ms:.0f} ms")
+
+    # I nomi in importtime sono quelli completi (es. "chromadb.api"): basta il prefisso
+    for name in forbidden:
+        loaded = [m for m in timings if m == name or m.startswith(name + ".")]
+        if loaded:
+            problems.append(f"{module_name}: importa '{name}' all'avvio")
+
+    # I 5 import più lenti aiutano a capire dove intervenire
+    slowest = sorted(timings.items(), key=lambda kv: kv[1][0], reverse=True)[:5]
+    for name, (self_us, _) in slowest:
+        print(f"   {self_us / 1000.0:7.1f} ms  {name}")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Budget sul tempo di import")
+    parser.add_argument("--module", help="Controlla solo questo modulo")
+    parser.add_argument("--budget-ms", type=float, help="Sovrascrive il budget")
+    args = parser.parse_args()
+
+    checks = DEFAULT_CHECKS
+    if args.module:
+        checks = {args.module: DEFAULT_CHECKS.get(args.module, {"budget_ms": 250.0, "forbidden": []})}
+
+    problems = []
+    for module_name, cfg in checks.items():
+        budget = args.budget_ms if args.budget_ms is not None else cfg["budget_ms"]
+        problems += check_module(module_name, budget, cfg["forbidden"])
+
+    if problems:
+        print("\n❌ Budget di import non rispettato:")
+        for p in problems:
+            print("  -", p)
+        sys.exit(1)
+
+    print("\n✅ Budget di import rispettato.")
+
+
+if __name__ == "__main__":
+    main()
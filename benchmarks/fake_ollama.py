@@ -0,0 +1,394 @@
+"""
+fake_ollama.py - server Ollama finto per test di carico senza GPU
+-----------------------------------------------------------------
+Implementa le API usate dal backend (client `ollama` Python):
+    POST /api/chat          risposta sintetica con token e durate realistiche
+    POST /api/generate      (warm-up: caricamento modello)
+    POST /api/embeddings    vettore deterministico (hash del prompt)
+    POST /api/embed
+    GET  /api/tags, /api/version
+
+Modello dei tempi (tutto scalabile con --time-scale, 0 = nessuna attesa):
+    - prefill: token del prompt (~4 caratteri/token) / --prefill-tps
+    - decode: token generati (lognormale attorno a --output-tokens, al massimo
+      num_predict) / --decode-tps
+    - overhead per richiesta: --base-latency-ms con distribuzione --latency-dist
+    - primo uso di ogni modello: --load-sec di caricamento
+    - al massimo --parallel generazioni contemporanee (come OLLAMA_NUM_PARALLEL):
+      le altre aspettano in coda
+Iniezione di guasti: --error-rate (HTTP 500), --hang-rate (risposta dopo --hang-sec).
+
+Registrazione / replay di risposte reali:
+    --record-to risposte.jsonl --upstream http://localhost:11434
+        inoltra al vero Ollama e salva richiesta, risposta e durata
+    --replay risposte.jsonl
+        risponde con le risposte registrate (stessa attesa, scalata);
+        richieste mai viste → risposta sintetica (o 404 con --strict-replay)
+
+Uso:
+    python benchmarks/fake_ollama.py --port 11500 --decode-tps 30
+    OLLAMA_HOST=http://127.0.0.1:11500 uvicorn backend_server:app --port 8000
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+DEFAULT_PORT = 11500
+
+# Caratteri medi per token (stima del numero di token del prompt)
+CHARS_PER_TOKEN = 4.0
+
+# Parole usate per comporre le risposte sintetiche
+FILLER_WORDS = ("mix", "kick", "bass", "sidechain", "EQ", "compressione", "drop", "groove",
+                "armonia", "accordi", "sintetizzatore", "riverbero", "automazione", "loudness")
+
+
+class FakeOllamaConfig:
+    """Parametri del server (vedi --help); i tempi sono in secondi salvo indicazione."""
+
+    def __init__(self, prefill_tps=500.0, decode_tps=25.0, output_tokens=300,
+                 base_latency_ms=20.0, latency_dist="lognormal", jitter=0.3,
+                 load_sec=3.0, parallel=1, error_rate=0.0, hang_rate=0.0, hang_sec=60.0,
+                 embedding_dim=768, time_scale=1.0, seed=0,
+                 upstream=None, record_to=None, replay=None, strict_replay=False):
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.output_tokens = output_tokens
+        self.base_latency_ms = base_latency_ms
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.load_sec = load_sec
+        self.parallel = parallel
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_sec = hang_sec
+        self.embedding_dim = embedding_dim
+        self.time_scale = time_scale
+        self.seed = seed
+        self.upstream = upstream
+        self.record_to = record_to
+        self.replay = replay
+        self.strict_replay = strict_replay
+
+
+def request_key(path, body):
+    """Chiave di registrazione: endpoint + modello + contenuto (messaggi o prompt)."""
+    content = {k: body.get(k) for k in ("model", "messages", "prompt", "input")}
+    content["path"] = path
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class FakeOllama:
+    """Stato condiviso del server: generatore casuale, modelli caricati, slot, registrazioni."""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(config.parallel)
+        self.loaded_models = set()
+        self.models_lock = threading.Lock()
+        self.record_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.replay_index = {}
+        self.stats = {"requests": 0, "errors_injected": 0, "hangs_injected": 0,
+                      "replayed": 0, "recorded": 0}
+        if config.replay:
+            with open(config.replay, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self.replay_index[record["key"]] = record
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    # --------------------------------------------------------
+    # Tempi e casualità
+    # --------------------------------------------------------
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def overhead_sec(self):
+        base = self.config.base_latency_ms / 1000.0
+        with self.rng_lock:
+            if self.config.latency_dist == "constant":
+                return base
+            if self.config.latency_dist == "uniform":
+                return base * self.rng.uniform(1 - self.config.jitter, 1 + self.config.jitter)
+            return base * self.rng.lognormvariate(0.0, self.config.jitter)
+
+    def sample_output_tokens(self, num_predict):
+        with self.rng_lock:
+            tokens = int(self.config.output_tokens * self.rng.lognormvariate(0.0, self.config.jitter))
+        if num_predict and num_predict > 0:
+            tokens = min(tokens, num_predict)
+        return max(1, tokens)
+
+    def sleep(self, seconds):
+        if seconds > 0 and self.config.time_scale > 0:
+            time.sleep(seconds * self.config.time_scale)
+
+    def load_model(self, model):
+        """Primo uso del modello: attesa di caricamento. Ritorna la durata simulata (s)."""
+        with self.models_lock:
+            cold = model not in self.loaded_models
+            self.loaded_models.add(model)
+        load = self.config.load_sec if cold else 0.002
+        self.sleep(load)
+        return load
+
+    # --------------------------------------------------------
+    # Risposte sintetiche
+    # --------------------------------------------------------
+
+    def chat(self, body, prompt_text):
+        options = body.get("options") or {}
+        prompt_tokens = max(1, int(len(prompt_text) / CHARS_PER_TOKEN))
+        output_tokens = self.sample_output_tokens(options.get("num_predict"))
+
+        with self.slots:
+            load = self.load_model(body.get("model", ""))
+            prefill = prompt_tokens / self.config.prefill_tps
+            decode = output_tokens / self.config.decode_tps
+            overhead = self.overhead_sec()
+            self.sleep(prefill + decode + overhead)
+
+        words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(max(1, int(output_tokens * 0.75)))]
+        truncated = bool(options.get("num_predict")) and output_tokens >= options["num_predict"]
+        return {
+            "model": body.get("model", ""),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "done": True,
+            "done_reason": "length" if truncated else "stop",
+            "total_duration": int((load + prefill + decode + overhead) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": output_tokens,
+            "eval_duration": int(decode * 1e9),
+        }, " ".join(words)
+
+    def embedding(self, text):
+        """Vettore unitario deterministico: stesso testo → stesso vettore."""
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.config.embedding_dim)
+        return (vec / np.linalg.norm(vec)).tolist()
+
+    # --------------------------------------------------------
+    # Registrazione / replay
+    # --------------------------------------------------------
+
+    def forward(self, path, body):
+        """Inoltra la richiesta al vero Ollama e registra risposta e durata."""
+        t0 = time.perf_counter()
+        upstream_body = dict(body, stream=False)
+        req = Request(self.config.upstream.rstrip("/") + path,
+                      data=json.dumps(upstream_body).encode(),
+                      headers={"Content-Type": "application/json"})
+        with urlopen(req) as resp:
+            response = json.loads(resp.read())
+        record = {"key": request_key(path, body), "path": path, "request": body,
+                  "response": response, "elapsed_sec": time.perf_counter() - t0}
+        with self.record_lock, open(self.config.record_to, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count("recorded")
+        return response
+
+    def replayed(self, path, body):
+        record = self.replay_index.get(request_key(path, body))
+        if record is None:
+            return None
+        self.sleep(record["elapsed_sec"])
+        self.count("replayed")
+        return record["response"]
+
+
+def make_handler(server_state):
+    """Classe handler HTTP legata allo stato del server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_ndjson(self, chunks):
+            data = b"".join(json.dumps(c).encode() + b"\n" for c in chunks)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                self.send_json(200, {"version": "0.0.0-fake"})
+            elif self.path == "/api/tags":
+                models = sorted(server_state.loaded_models)
+                self.send_json(200, {"models": [{"name": m, "model": m} for m in models]})
+            elif self.path == "/stats":
+                self.send_json(200, server_state.stats)
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path = self.path
+            state = server_state
+            state.count("requests")
+
+            if path not in ("/api/chat", "/api/generate", "/api/embeddings", "/api/embed"):
+                self.send_json(404, {"error": f"endpoint non simulato: {path}"})
+                return
+
+            # Guasti iniettati
+            if state.random() < state.config.error_rate:
+                state.count("errors_injected")
+                self.send_json(500, {"error": "errore iniettato da fake_ollama"})
+                return
+            if state.random() < state.config.hang_rate:
+                state.count("hangs_injected")
+                state.sleep(state.config.hang_sec)
+
+            # Replay / registrazione
+            if state.replay_index:
+                response = state.replayed(path, body)
+                if response is not None:
+                    self.respond(path, body, response)
+                    return
+                if state.config.strict_replay:
+                    self.send_json(404, {"error": "richiesta non presente nella registrazione"})
+                    return
+            if state.config.upstream and state.config.record_to:
+                self.respond(path, body, state.forward(path, body))
+                return
+
+            self.respond(path, body, self.synthetic(path, body))
+
+        def synthetic(self, path, body):
+            state = server_state
+            if path == "/api/embeddings":
+                state.sleep(state.overhead_sec())
+                return {"embedding": state.embedding(body.get("prompt", ""))}
+            if path == "/api/embed":
+                inputs = body.get("input", "")
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                state.sleep(state.overhead_sec())
+                return {"model": body.get("model", ""),
+                        "embeddings": [state.embedding(text) for text in inputs]}
+            if path == "/api/generate" and not body.get("prompt"):
+                # Prompt vuoto = solo caricamento del modello (warm-up)
+                load = state.load_model(body.get("model", ""))
+                return {"model": body.get("model", ""), "response": "", "done": True,
+                        "load_duration": int(load * 1e9)}
+
+            if path == "/api/chat":
+                prompt_text = "".join(m.get("content", "") for m in body.get("messages") or [])
+            else:
+                prompt_text = body.get("prompt", "")
+            stats, text = state.chat(body, prompt_text)
+            if path == "/api/chat":
+                return dict(stats, message={"role": "assistant", "content": text})
+            return dict(stats, response=text)
+
+        def respond(self, path, body, response):
+            if body.get("stream", True) and path in ("/api/chat", "/api/generate"):
+                # Streaming: un chunk con tutto il testo + chunk finale con le statistiche
+                final = dict(response)
+                if path == "/api/chat":
+                    message = final.pop("message", {"role": "assistant", "content": ""})
+                    first = {"model": final.get("model"), "message": message, "done": False}
+                    final["message"] = {"role": "assistant", "content": ""}
+                else:
+                    first = {"model": final.get("model"), "response": final.get("response", ""),
+                             "done": False}
+                    final["response"] = ""
+                self.send_ndjson([first, final])
+            else:
+                self.send_json(200, response)
+
+    return Handler
+
+
+def serve(config, host="127.0.0.1", port=DEFAULT_PORT):
+    """Avvia il server (bloccante)."""
+    state = FakeOllama(config)
+    httpd = ThreadingHTTPServer((host, port), make_handler(state))
+    httpd.daemon_threads = True
+    mode = "replay" if config.replay else "record" if config.record_to else "sintetico"
+    print(f"🤖 Fake Ollama su http://{host}:{port} (modalità {mode}, parallel={config.parallel}, "
+          f"decode {config.decode_tps:.0f} tok/s, time scale {config.time_scale})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def main(argv=None):
+    defaults = FakeOllamaConfig()
+    parser = argparse.ArgumentParser(description="Server Ollama finto per test di carico")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--prefill-tps", type=float, default=defaults.prefill_tps)
+    parser.add_argument("--decode-tps", type=float, default=defaults.decode_tps)
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens,
+                        help="Token generati in media (limitati da num_predict)")
+    parser.add_argument("--base-latency-ms", type=float, default=defaults.base_latency_ms)
+    parser.add_argument("--latency-dist", choices=["constant", "uniform", "lognormal"],
+                        default=defaults.latency_dist)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter,
+                        help="Dispersione di overhead e token generati")
+    parser.add_argument("--load-sec", type=float, default=defaults.load_sec,
+                        help="Caricamento al primo uso di ogni modello")
+    parser.add_argument("--parallel", type=int, default=defaults.parallel,
+                        help="Generazioni contemporanee (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--hang-rate", type=float, default=defaults.hang_rate)
+    parser.add_argument("--hang-sec", type=float, default=defaults.hang_sec)
+    parser.add_argument("--embedding-dim", type=int, default=defaults.embedding_dim)
+    parser.add_argument("--time-scale", type=float, default=defaults.time_scale,
+                        help="Moltiplica tutte le attese (0 = risposte immediate)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--upstream", help="Ollama reale per la registrazione")
+    parser.add_argument("--record-to", help="JSONL dove registrare le risposte di --upstream")
+    parser.add_argument("--replay", help="JSONL registrato da servire")
+    parser.add_argument("--strict-replay", action="store_true")
+    args = parser.parse_args(argv)
+
+    if bool(args.upstream) != bool(args.record_to):
+        parser.error("--upstream e --record-to vanno usati insieme")
+
+    config = FakeOllamaConfig(
+        prefill_tps=args.prefill_tps, decode_tps=args.decode_tps, output_tokens=args.output_tokens,
+        base_latency_ms=args.base_latency_ms, latency_dist=args.latency_dist, jitter=args.jitter,
+        load_sec=args.load_sec, parallel=args.parallel, error_rate=args.error_rate,
+        hang_rate=args.hang_rate, hang_sec=args.hang_sec, embedding_dim=args.embedding_dim,
+        time_scale=args.time_scale, seed=args.seed, upstream=args.upstream,
+        record_to=args.record_to, replay=args.replay, strict_replay=args.strict_replay)
+    serve(config, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
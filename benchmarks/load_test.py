@@ -0,0 +1,296 @@
+"""
+load_test.py - test di carico end-to-end di POST /analyze
+---------------------------------------------------------
+Invia upload a /analyze con `--concurrency` richieste contemporanee e riporta
+throughput (richieste/s), latenze p50/p95/p99 ed errori per codice HTTP.
+
+Con --spawn avvia da solo l'ambiente completo, senza GPU:
+    * benchmarks/fake_ollama.py (Ollama finto, parametri con --ollama-args)
+    * uvicorn backend_server:app con OLLAMA_HOST puntato al server finto
+e attende /ready prima di iniziare.
+
+Senza --files ogni richiesta carica una traccia sintetica diversa (click track +
+accordi + rumore, --seconds): tonalità, modo e BPM cambiano da una richiesta
+all'altra, così né il coalescing delle richieste identiche né la cache delle
+risposte degli agenti saltano lavoro e il test misura davvero la concorrenza.
+Con --same-upload tutte le richieste caricano lo stesso file (per misurare
+proprio coalescing e cache). Il riepilogo riporta le risposte "coalesced" e
+quelle con almeno un agente servito dalla cache.
+
+Uso:
+    python benchmarks/load_test.py --spawn --concurrency 4 --requests 20
+    python benchmarks/load_test.py --spawn --ollama-args "--decode-tps 60 --error-rate 0.05"
+    python benchmarks/load_test.py --url http://localhost:8000 --duration 120 --files brano.mp3
+    python benchmarks/load_test.py --spawn --output risultati.json
+    python benchmarks/load_test.py --spawn --wait-for health     # senza knowledge base
+    python benchmarks/load_test.py --spawn --same-upload --concurrency 4
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_signals import click_track, key_progression, pink_noise  # noqa: E402
+
+# Attesa massima del warm-up del backend avviato con --spawn (secondi)
+READY_TIMEOUT_SEC = 180
+
+
+def synthetic_upload(index, seconds, sr=44100):
+    """
+    Upload sintetico (nome, byte WAV) diverso per ogni indice: tonalità, modo e
+    BPM (fasce da 4, come la cache degli agenti) cambiano con l'indice, il rumore
+    rosa con seed = indice rende unico il contenuto (niente coalescing).
+    """
+    root, mode = index % 12, ("minor", "major")[index // 12 % 2]
+    bpm = 96.0 + 4.0 * (index // 24 % 12)
+    y = (click_track(bpm, sr, seconds) + key_progression(root, mode, sr, seconds)
+         + pink_noise(sr, seconds, seed=index, level=0.01))
+    buf = io.BytesIO()
+    sf.write(buf, 0.8 * y / np.max(np.abs(y)), sr, format="WAV")
+    return f"synthetic_{index}.wav", buf.getvalue()
+
+
+def file_uploads(paths):
+    """Upload dai file indicati, a rotazione."""
+    def upload(index):
+        path = paths[index % len(paths)]
+        with open(path, "rb") as f:
+            return os.path.basename(path), f.read()
+    return upload
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+# ============================================================
+# 1. AMBIENTE (--spawn)
+# ============================================================
+
+def spawn_environment(backend_port, ollama_port, ollama_args):
+    """Avvia fake Ollama e backend; ritorna la lista dei processi (da terminare alla fine)."""
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_ollama.py"), "--port", str(ollama_port)]
+        + shlex.split(ollama_args),
+    )
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{ollama_port}")
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend_server:app", "--port", str(backend_port),
+         "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env,
+    )
+    return [backend, fake]
+
+
+def wait_until_ready(url, processes, endpoint="ready", timeout=READY_TIMEOUT_SEC):
+    """
+    Attende 200 da /ready (warm-up concluso) o da /health (processo avviato:
+    utile senza knowledge base, quando /ready resta 503). Se /ready non esiste basta /health.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(p.poll() is not None for p in processes):
+            raise RuntimeError("un processo avviato con --spawn è terminato")
+        try:
+            resp = httpx.get(f"{url}/{endpoint}", timeout=5)
+            if resp.status_code == 404:
+                resp = httpx.get(f"{url}/health", timeout=5)
+            if resp.status_code == 200:
+                return time.monotonic() - (deadline - timeout)
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"backend non pronto dopo {timeout} s")
+
+
+def stop_environment(processes):
+    for proc in processes:
+        proc.terminate()
+    for proc in processes:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ============================================================
+# 2. GENERATORE DI CARICO
+# ============================================================
+
+def run_load(url, make_upload, concurrency, total_requests=None, duration=None, timeout=600.0, form=None):
+    """
+    Esegue le richieste (numero fisso o per `duration` secondi) con `concurrency` worker.
+    make_upload(indice) ritorna (nome, byte) del file da caricare.
+    Ritorna la lista dei risultati: {"status", "latency_sec", "error", "coalesced", "agent_cache_hit"}.
+    """
+    results = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+
+    def next_index():
+        # Fine del test: numero di richieste raggiunto o tempo scaduto
+        with lock:
+            index = next(counter)
+            if total_requests is not None and index >= total_requests:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            return index
+
+    def worker():
+        with httpx.Client(timeout=timeout) as client:
+            while True:
+                index = next_index()
+                if index is None:
+                    return
+                name, data = make_upload(index)
+                t0 = time.perf_counter()
+                body = {}
+                try:
+                    resp = client.post(f"{url}/analyze", data=form or {}, files={"file": (name, data)})
+                    status, error = resp.status_code, None if resp.status_code == 200 else resp.text[:200]
+                    if status == 200:
+                        body = resp.json()
+                except httpx.HTTPError as e:
+                    status, error = "transport", f"{type(e).__name__}: {e}"
+                latency = time.perf_counter() - t0
+                cache = body.get("agent_cache") or {}
+                result = {"status": status, "latency_sec": latency, "error": error,
+                          "coalesced": bool(body.get("coalesced")),
+                          "agent_cache_hit": any(v == "hit" for v in cache.values())}
+                with lock:
+                    results.append(result)
+                mark = "✅" if status == 200 else "❌"
+                extra = " (coalesced)" if result["coalesced"] else ""
+                print(f"   {mark} {name}: {status} in {latency:.2f} s{extra}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return results
+
+
+def summarize(results, wall_sec, concurrency):
+    """Throughput, percentili di latenza (solo risposte 200) ed errori per codice."""
+    ok = [r["latency_sec"] for r in results if r["status"] == 200]
+    errors = {}
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "coalesced": sum(r["coalesced"] for r in results),
+        "agent_cache_hits": sum(r["agent_cache_hit"] for r in results),
+        "errors": errors,
+        "wall_sec": wall_sec,
+        "throughput_rps": len(ok) / wall_sec if wall_sec > 0 else 0.0,
+        "latency_sec": {
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "max": max(ok) if ok else None,
+            "mean": float(np.mean(ok)) if ok else None,
+        },
+        "sample_errors": [r["error"] for r in results if r["error"]][:5],
+    }
+
+
+def print_summary(summary):
+    lat = summary["latency_sec"]
+    print(f"\n📈 {summary['requests']} richieste, concorrenza {summary['concurrency']}, "
+          f"{summary['wall_sec']:.1f} s")
+    print(f"   throughput: {summary['throughput_rps']:.3f} req/s ({summary['succeeded']} riuscite)")
+    print(f"   coalesced: {summary['coalesced']} | con agenti dalla cache: {summary['agent_cache_hits']}")
+    if lat["p50"] is not None:
+        print(f"   latenza: p50 {lat['p50']:.2f} s | p95 {lat['p95']:.2f} s | "
+              f"p99 {lat['p99']:.2f} s | max {lat['max']:.2f} s")
+    if summary["errors"]:
+        print(f"   ❌ errori: {summary['errors']}")
+        for err in summary["sample_errors"]:
+            print(f"      {err}")
+
+
+# ============================================================
+# 3. ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test di carico di POST /analyze")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=None, help="Numero di richieste (default 10)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="In alternativa a --requests: durata del test in secondi")
+    parser.add_argument("--files", nargs="*", default=None, help="Tracce da caricare (default: sintetica)")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Durata della traccia sintetica")
+    parser.add_argument("--same-upload", action="store_true",
+                        help="Stessa traccia sintetica per tutte le richieste (misura coalescing e cache)")
+    parser.add_argument("--auto-window", action="store_true", help="Invia auto_window=true")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout per richiesta (s)")
+    parser.add_argument("--spawn", action="store_true", help="Avvia fake Ollama e backend")
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--ollama-args", default="", help="Argomenti extra per fake_ollama.py")
+    parser.add_argument("--wait-for", choices=["ready", "health"], default="ready",
+                        help="Endpoint da attendere con --spawn (health se manca la knowledge base)")
+    parser.add_argument("--output", help="Scrive il riepilogo JSON in questo file")
+    args = parser.parse_args(argv)
+
+    if args.requests is None and args.duration is None:
+        args.requests = 10
+
+    if args.files:
+        make_upload = file_uploads(args.files)
+    elif args.same_upload:
+        same = synthetic_upload(0, args.seconds)
+        make_upload = lambda index: same  # noqa: E731
+    else:
+        make_upload = lambda index: synthetic_upload(index, args.seconds)  # noqa: E731
+    form = {"auto_window": "true"} if args.auto_window else {}
+
+    processes = []
+    try:
+        if args.spawn:
+            port = httpx.URL(args.url).port or 8000
+            processes = spawn_environment(port, args.ollama_port, args.ollama_args)
+            print(f"⏳ Attendo il warm-up del backend su {args.url} ...")
+            print(f"✅ Backend pronto in {wait_until_ready(args.url, processes, args.wait_for):.1f} s")
+
+        target = f"{args.requests} richieste" if args.duration is None else f"{args.duration:.0f} s"
+        print(f"🚀 Carico su {args.url}/analyze: {target}, concorrenza {args.concurrency}")
+        t0 = time.perf_counter()
+        results = run_load(args.url, make_upload, args.concurrency, args.requests, args.duration,
+                           args.timeout, form)
+        summary = summarize(results, time.perf_counter() - t0, args.concurrency)
+    finally:
+        stop_environment(processes)
+
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Riepilogo salvato in {args.output}")
+    return 0 if summary["succeeded"] == summary["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
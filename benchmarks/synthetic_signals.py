@@ -0,0 +1,84 @@
+"""
+synthetic_signals.py - segnali sintetici con proprietà note per benchmark e verifiche
+------------------------------------------------------------------------------------
+- click_track: click + colpo basso su ogni battito, BPM esatto
+- key_progression: cadenza I-IV-V-I (maggiore) o i-iv-v-i (minore) in una tonalità nota
+- pink_noise: rumore rosa (1/f), nessun BPM né tonalità: verifica di robustezza
+
+Tutti i generatori lavorano a blocchi ripetuti, quindi anche 60 minuti
+a 44.1 kHz si generano in pochi secondi e in float32.
+"""
+
+import numpy as np
+
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+# Gradi (semitoni dalla tonica) e intervalli degli accordi della cadenza
+CADENCE = {
+    "major": [(0, (0, 4, 7)), (5, (0, 4, 7)), (7, (0, 4, 7)), (0, (0, 4, 7))],
+    "minor": [(0, (0, 3, 7)), (5, (0, 3, 7)), (7, (0, 3, 7)), (0, (0, 3, 7))],
+}
+
+# Coefficienti del filtro di Paul Kellet (rumore bianco → rosa, errore < 0.05 dB)
+PINK_B = [0.049922035, -0.095993537, 0.050612699, -0.004408786]
+PINK_A = [1.0, -2.494956002, 2.017265875, -0.522189400]
+
+
+def _tile(block, n):
+    """Ripete block fino a n campioni."""
+    reps = int(np.ceil(n / len(block)))
+    return np.tile(block, reps)[:n]
+
+
+def click_track(bpm, sr, seconds, accent_every=4):
+    """Click (2 kHz, 10 ms) + colpo basso (60 Hz, 80 ms) su ogni battito, accento sul primo della battuta."""
+    beat = 60.0 / bpm
+    bar_len = int(round(accent_every * beat * sr))
+    bar = np.zeros(bar_len, dtype=np.float32)
+
+    t_click = np.arange(int(0.01 * sr)) / sr
+    click = np.sin(2 * np.pi * 2000 * t_click) * np.exp(-t_click * 400)
+    t_kick = np.arange(int(0.08 * sr)) / sr
+    kick = np.sin(2 * np.pi * 60 * t_kick) * np.exp(-t_kick * 40)
+
+    for k in range(accent_every):
+        start = int(round(k * beat * sr))
+        gain = 1.0 if k == 0 else 0.6
+        bar[start:start + len(click)] += gain * 0.5 * click[:bar_len - start]
+        bar[start:start + len(kick)] += gain * 0.8 * kick[:bar_len - start]
+
+    # Il blocco è una battuta intera: ripetendolo il BPM resta esatto
+    # (a meno dell'arrotondamento di bar_len, < 1 campione per battuta)
+    return _tile(bar, int(seconds * sr)).astype(np.float32)
+
+
+def key_progression(root, mode, sr, seconds, chord_sec=2.0):
+    """Cadenza di 4 accordi (3 note con 4 armoniche + basso) ripetuta per `seconds`."""
+    chord_len = int(chord_sec * sr)
+    t = np.arange(chord_len) / sr
+    env = np.minimum(1.0, t / 0.02) * np.exp(-t / chord_sec)
+
+    blocks = []
+    for degree, intervals in CADENCE[mode]:
+        chord = np.zeros(chord_len)
+        base_midi = 60 + root + degree
+        for midi in [base_midi + i for i in intervals] + [base_midi - 24]:
+            f0 = 440.0 * 2 ** ((midi - 69) / 12)
+            for h in range(1, 5):
+                if f0 * h < sr / 2:
+                    chord += np.sin(2 * np.pi * f0 * h * t) / h
+        blocks.append(chord * env)
+
+    cycle = np.concatenate(blocks)
+    cycle = 0.3 * cycle / np.max(np.abs(cycle))
+    return _tile(cycle.astype(np.float32), int(seconds * sr))
+
+
+def pink_noise(sr, seconds, seed=0, level=0.1):
+    """Rumore rosa (filtro di Kellet su rumore bianco), valore RMS circa `level`."""
+    from scipy.signal import lfilter
+
+    rng = np.random.default_rng(seed)
+    white = rng.standard_normal(int(seconds * sr)).astype(np.float32)
+    pink = lfilter(PINK_B, PINK_A, white).astype(np.float32)
+    return pink * (level / (np.sqrt(np.mean(pink ** 2)) + 1e-12))
@@ -0,0 +1,156 @@
+# ============================================================
+# AI MUSIC ANALYZER - ARCHIVIO PERSISTENTE DELLE FEATURE PER FRAME
+# ============================================================
+# Per ogni traccia caricata salva UNA volta su disco le grandezze
+# frame-level calcolate da compute_frame_features (RMS, bande per frame,
+# onset envelope, chroma, energie K-pesate per la loudness...).
+#
+# Gli array sono file .npy riaperti in memory-map: qualsiasi finestra
+# (es. un nuovo intervallo dello slider della GUI) si calcola affettando
+# e riducendo questi array, in millisecondi, senza rifare la DSP.
+#
+# Struttura su disco:
+#   frame_store/<chiave>/meta.json
+#   frame_store/<chiave>/<nome_array>.npy
+# ============================================================
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Cartella dove vengono salvate le feature (creata al primo salvataggio)
+FRAME_STORE_DIR = "frame_store"
+
+# Numero massimo di tracce tenute in archivio (le meno usate vengono eliminate)
+FRAME_STORE_MAX_TRACKS = 200
+
+# Spazio massimo su disco di una cartella dell'archivio (byte)
+FRAME_STORE_MAX_BYTES = 2 * 1024 ** 3
+
+# Versione del formato: cambiarla invalida le tracce salvate in precedenza
+FRAME_STORE_VERSION = 4
+
+
+def track_key(audio_bytes, sr):
+    """
+    Chiave della traccia: hash del contenuto del file + sample rate di analisi
+    + versione del formato. Stesso file → stessa chiave, anche con nomi diversi.
+    """
+    h = hashlib.sha256(audio_bytes)
+    h.update(f"|sr={sr}|v={FRAME_STORE_VERSION}".encode())
+    return h.hexdigest()[:32]
+
+
+def _track_dir(key, store_dir):
+    return os.path.join(store_dir, key)
+
+
+def load_track_frames(key, store_dir=FRAME_STORE_DIR):
+    """
+    Riapre le feature salvate per questa chiave (array in memory-map, sola lettura).
+    Ritorna None se la traccia non è in archivio.
+    """
+    track_dir = _track_dir(key, store_dir)
+    meta_path = os.path.join(track_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    frames = dict(meta["params"])
+    for name in meta["arrays"]:
+        frames[name] = np.load(os.path.join(track_dir, name + ".npy"), mmap_mode="r")
+
+    # Aggiorna la data di modifica: serve per eliminare le tracce meno usate
+    os.utime(meta_path)
+    return frames
+
+
+def save_track_frames(key, frames, store_dir=FRAME_STORE_DIR):
+    """
+    Salva le feature di una traccia. La scrittura avviene in una cartella
+    temporanea poi rinominata, così un lettore non vede mai file a metà.
+    Gli array numpy diventano file .npy, gli altri valori (sr, hop, ...)
+    finiscono in meta.json.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    track_dir = _track_dir(key, store_dir)
+    if os.path.exists(track_dir):
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=store_dir)
+    arrays = [k for k, v in frames.items() if isinstance(v, np.ndarray)]
+    for name in arrays:
+        np.save(os.path.join(tmp_dir, name + ".npy"), frames[name])
+
+    meta = {
+        "params": {k: v for k, v in frames.items() if k not in arrays},
+        "arrays": arrays,
+        "version": FRAME_STORE_VERSION,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    try:
+        os.rename(tmp_dir, track_dir)
+    except OSError:
+        # Un altro processo ha salvato la stessa traccia nel frattempo
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    prune_frame_store(store_dir)
+
+
+def _dir_size(path):
+    """Dimensione su disco dei file contenuti direttamente in una cartella."""
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            total += entry.stat().st_size
+    return total
+
+
+def prune_frame_store(store_dir=FRAME_STORE_DIR,
+                      max_tracks=FRAME_STORE_MAX_TRACKS,
+                      max_bytes=FRAME_STORE_MAX_BYTES):
+    """
+    Elimina le tracce usate meno di recente oltre i limiti:
+    al massimo max_tracks tracce e max_bytes byte complessivi.
+    La traccia più recente viene sempre tenuta.
+    """
+    entries = []
+    for name in os.listdir(store_dir):
+        meta_path = os.path.join(store_dir, name, "meta.json")
+        if os.path.exists(meta_path):
+            entries.append((os.path.getmtime(meta_path), name))
+
+    entries.sort(reverse=True)
+    used_bytes = 0
+    for i, (_, name) in enumerate(entries):
+        track_dir = os.path.join(store_dir, name)
+        used_bytes += _dir_size(track_dir)
+        if i > 0 and (i >= max_tracks or used_bytes > max_bytes):
+            shutil.rmtree(track_dir, ignore_errors=True)
+
+
+def get_or_build_track_frames(key, load_signal, store_dir=FRAME_STORE_DIR):
+    """
+    Ritorna le feature frame-level della traccia, calcolandole solo se mancano.
+    Parametri:
+        key: chiave della traccia (vedi track_key)
+        load_signal: funzione senza argomenti che ritorna (y, sr);
+                     viene chiamata solo se la traccia non è in archivio
+    """
+    frames = load_track_frames(key, store_dir)
+    if frames is not None:
+        return frames
+
+    from ai_analyzer_backend import compute_frame_features
+
+    y, sr = load_signal()
+    save_track_frames(key, compute_frame_features(y, sr), store_dir)
+    return load_track_frames(key, store_dir)
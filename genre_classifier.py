@@ -0,0 +1,171 @@
+# ============================================================
+# AI MUSIC ANALYZER - CLASSIFICATORE DI GENERE (CPU, COMPATTO)
+# ============================================================
+# Modello lineare (regressione logistica multinomiale) sulle feature
+# che la pipeline calcola già:
+#   - percentuali di energia per banda (5 larghe + 7 fini)
+#   - BPM (anche come "bump" gaussiani attorno a BPM tipici: il genere
+#     dipende da fasce di BPM, non da una retta)
+#   - LUFS integrato, LRA, crest factor, densità dei transienti
+#
+# L'addestramento (train_genre_model.py) usa scikit-learn; il modello
+# salvato contiene SOLO array numpy (media/scala, pesi, classi):
+#   - joblib.load(..., mmap_mode="r") lo apre in memory-map
+#   - la predizione è un prodotto matrice + argmax (pochi microsecondi),
+#     vettoriale su più tracce insieme
+# ============================================================
+
+import os
+
+import numpy as np
+
+# Dove viene salvato / cercato il modello addestrato
+GENRE_MODEL_PATH = os.path.join("models", "genre_model.joblib")
+
+# Sotto questa probabilità la pipeline preferisce l'euristica sui BPM
+GENRE_MIN_PROBABILITY = 0.5
+
+# Centri e larghezza (BPM) dei "bump" gaussiani per la codifica del tempo
+BPM_CENTERS = np.arange(60.0, 185.0, 5.0)
+BPM_WIDTH = 4.0
+
+# Feature numeriche: (nome, sezione, chiave[, sottochiave]) nel summary / analisi avanzata
+NUMERIC_FEATURES = [
+    ("energy_sub", "summary", "energy_percent", "sub"),
+    ("energy_bass", "summary", "energy_percent", "bass"),
+    ("energy_lowmid", "summary", "energy_percent", "lowmid"),
+    ("energy_highmid", "summary", "energy_percent", "highmid"),
+    ("energy_high", "summary", "energy_percent", "high"),
+    ("fine_sub_20_40", "advanced", "bands_energy_percent", "sub_20_40"),
+    ("fine_bass_40_80", "advanced", "bands_energy_percent", "bass_40_80"),
+    ("fine_bass_80_150", "advanced", "bands_energy_percent", "bass_80_150"),
+    ("fine_lowmid_150_500", "advanced", "bands_energy_percent", "lowmid_150_500"),
+    ("fine_mid_500_2000", "advanced", "bands_energy_percent", "mid_500_2000"),
+    ("fine_highmid_2k_6k", "advanced", "bands_energy_percent", "highmid_2k_6k"),
+    ("fine_air_6k_20k", "advanced", "bands_energy_percent", "air_6k_20k"),
+    ("bpm", "summary", "bpm", None),
+    ("integrated_lufs", "advanced", "loudness", "integrated_lufs"),
+    ("loudness_range", "advanced", "loudness", "loudness_range"),
+    ("crest_factor_db", "advanced", "loudness", "crest_factor_db"),
+    ("transient_density", "advanced", "transients", "density_per_sec"),
+]
+
+FEATURE_NAMES = ([name for name, *_ in NUMERIC_FEATURES]
+                 + [f"bpm_bump_{int(c)}" for c in BPM_CENTERS])
+
+
+# ============================================================
+# 1. VETTORE DI FEATURE
+# ============================================================
+
+def feature_vector(summary, advanced):
+    """
+    Vettore di feature (float32, ordine di FEATURE_NAMES) per una traccia.
+    Parametri:
+        summary: dizionario di summarize_track_features / summarize_window
+        advanced: dizionario di compute_advanced_analysis / summarize_window
+    """
+    sections = {"summary": summary, "advanced": advanced}
+    values = []
+    for _, section, key, subkey in NUMERIC_FEATURES:
+        value = sections[section].get(key)
+        if subkey is not None:
+            value = (value or {}).get(subkey)
+        values.append(float(value or 0.0))
+
+    bpm = values[FEATURE_NAMES.index("bpm")]
+    bumps = np.exp(-0.5 * ((bpm - BPM_CENTERS) / BPM_WIDTH) ** 2)
+    return np.concatenate([np.asarray(values, dtype=np.float32), bumps.astype(np.float32)])
+
+
+def feature_matrix(pairs):
+    """Matrice (n_tracce x n_feature) da una lista di coppie (summary, advanced)."""
+    if not pairs:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+    return np.stack([feature_vector(summary, advanced) for summary, advanced in pairs])
+
+
+# ============================================================
+# 2. MODELLO
+# ============================================================
+
+class GenreModel:
+    """
+    Classificatore lineare già addestrato, fatto solo di array numpy:
+        mean, scale: standardizzazione delle feature
+        coef, intercept: pesi della regressione logistica (classi x feature)
+        classes: nomi dei generi
+    """
+
+    def __init__(self, mean, scale, coef, intercept, classes, metadata=None):
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+        self.metadata = metadata or {}
+
+    def predict_proba(self, X):
+        """Probabilità per classe: X è (n_feature) oppure (n_tracce x n_feature)."""
+        logits = ((np.asarray(X, dtype=np.float32) - self.mean) / self.scale) @ self.coef.T
+        logits += self.intercept
+        logits -= logits.max(axis=-1, keepdims=True)
+        proba = np.exp(logits)
+        return proba / proba.sum(axis=-1, keepdims=True)
+
+    def predict(self, X):
+        """Generi più probabili (vettoriale) e relative probabilità."""
+        proba = self.predict_proba(X)
+        best = proba.argmax(axis=-1)
+        return self.classes[best], np.take_along_axis(
+            proba, np.expand_dims(best, -1), axis=-1).squeeze(-1)
+
+    def save(self, path=GENRE_MODEL_PATH):
+        """Salva gli array senza compressione (necessario per il memory-map)."""
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({
+            "feature_names": np.asarray(FEATURE_NAMES),
+            "mean": self.mean,
+            "scale": self.scale,
+            "coef": self.coef,
+            "intercept": self.intercept,
+            "classes": self.classes,
+            "metadata": self.metadata,
+        }, path, compress=0)
+
+    @classmethod
+    def load(cls, path=GENRE_MODEL_PATH):
+        """Apre il modello in memory-map. Errore se le feature non coincidono."""
+        import joblib
+
+        data = joblib.load(path, mmap_mode="r")
+        if list(data["feature_names"]) != FEATURE_NAMES:
+            raise ValueError(f"{path}: feature diverse da quelle attuali, riaddestrare il modello")
+        return cls(data["mean"], data["scale"], data["coef"], data["intercept"],
+                   data["classes"], data["metadata"])
+
+
+# Modello condiviso dal processo (caricato alla prima richiesta o nel warm-up)
+_genre_model = None
+_genre_model_path = None
+
+
+def get_genre_model(path=GENRE_MODEL_PATH):
+    """
+    Ritorna il modello (caricato una sola volta per processo) oppure None
+    se non è stato ancora addestrato o non è leggibile (es. feature cambiate):
+    in quel caso il genere viene stimato con l'euristica.
+    """
+    global _genre_model, _genre_model_path
+    if _genre_model_path != path:
+        _genre_model = None
+        if os.path.exists(path):
+            try:
+                _genre_model = GenreModel.load(path)
+            except (ValueError, OSError, KeyError) as e:
+                # Segnalato una volta: il None resta in cache per questo percorso
+                print(f"⚠️ Modello di genere non utilizzabile, uso l'euristica: {e}")
+        _genre_model_path = path
+    return _genre_model
@@ -0,0 +1,91 @@
+# ============================================================
+# AI MUSIC ANALYZER - STIMA DI TONALITÀ E MODO
+# ============================================================
+# La tonalità viene stimata dallo STESSO spettrogramma STFT usato per
+# le altre feature (niente chroma_cqt, che era la parte più costosa
+# della DSP):
+#   1) chroma = filterbank cromatico (12 x bin FFT, in cache per sr/n_fft)
+#      applicato allo spettro di potenza
+#   2) il chroma medio viene correlato in un colpo solo (prodotto matrice
+#      24 x 12) con i profili di Krumhansl-Kessler delle 12 tonalità
+#      maggiori e delle 12 minori
+#   3) vince la correlazione più alta; la correlazione stessa è la confidenza
+# ============================================================
+
+from functools import lru_cache
+
+import numpy as np
+
+# Nomi delle note (indice 0 = C)
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F',
+              'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Profili tonali di Krumhansl-Kessler (tonica in posizione 0)
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09,
+                          2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53,
+                          2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Modi nell'ordine delle righe della matrice dei profili
+KEY_MODES = ("major", "minor")
+
+
+def _zscore(x, axis=-1):
+    x = x - x.mean(axis=axis, keepdims=True)
+    return x / (np.linalg.norm(x, axis=axis, keepdims=True) + 1e-12)
+
+
+@lru_cache(maxsize=1)
+def key_profiles():
+    """
+    Matrice 24 x 12 dei profili normalizzati (media 0, norma 1):
+    righe 0-11 = C major ... B major, righe 12-23 = C minor ... B minor.
+    Il prodotto con un chroma normalizzato dà direttamente le 24 correlazioni.
+    """
+    rows = [np.roll(profile, root) for profile in (MAJOR_PROFILE, MINOR_PROFILE)
+            for root in range(12)]
+    return _zscore(np.stack(rows))
+
+
+@lru_cache(maxsize=None)
+def chroma_filterbank(sr, n_fft):
+    """Filterbank cromatico (12 x (1 + n_fft // 2)) per questo sample rate e n_fft."""
+    import librosa
+
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft).astype(np.float32)
+
+
+def chroma_from_power(power, sr, n_fft):
+    """
+    Chroma (12 x frame) da uno spettrogramma di potenza già calcolato.
+    Ogni frame è normalizzato al suo massimo, come in librosa.feature.chroma_stft,
+    ma senza la stima dell'accordatura (piptrack) che costa quanto la STFT.
+    """
+    chroma = chroma_filterbank(sr, n_fft) @ power
+    return chroma / (chroma.max(axis=0, keepdims=True) + 1e-12)
+
+
+def estimate_key(chroma_mean):
+    """
+    Tonalità dal chroma medio (12 valori).
+    Ritorna:
+        {"key_root": "A", "key_mode": "minor", "key_confidence": 0..1}
+    La confidenza è la correlazione con il profilo vincente (0 se negativa):
+    valori bassi indicano materiale atonale o ambiguo.
+    """
+    chroma_mean = np.asarray(chroma_mean, dtype=np.float64)
+    if not np.any(chroma_mean > 0):
+        return {"key_root": NOTE_NAMES[0], "key_mode": KEY_MODES[0], "key_confidence": 0.0}
+
+    scores = key_profiles() @ _zscore(chroma_mean)
+    best = int(np.argmax(scores))
+    return {
+        "key_root": NOTE_NAMES[best % 12],
+        "key_mode": KEY_MODES[best // 12],
+        "key_confidence": float(max(scores[best], 0.0)),
+    }
+
+
+def key_from_power(power, sr, n_fft):
+    """Scorciatoia: chroma dallo spettro di potenza + estimate_key sul chroma medio."""
+    return estimate_key(chroma_from_power(power, sr, n_fft).mean(axis=1))
@@ -0,0 +1,157 @@
+# ============================================================
+# AI MUSIC ANALYZER - TELEMETRIA DELLE CHIAMATE LLM (OLLAMA)
+# ============================================================
+# Ogni risposta di ollama.chat riporta già quanto è costata:
+#   prompt_eval_count / prompt_eval_duration  → prefill (token del prompt)
+#   eval_count / eval_duration                → decode (token generati)
+#   load_duration                             → caricamento del modello
+# (durate in nanosecondi). Qui diventano:
+#   - una riga di log per chiamata
+#   - metriche per agente e modello (registro di tracing → /metrics)
+#   - la lista delle chiamate dell'analisi corrente (collect_llm_calls),
+#     restituita nel risultato come "llm_stats"
+# Servono a scegliere MAX_LLM_TOKENS, dimensione dei prompt e hardware
+# partendo dai dati reali.
+# ============================================================
+
+import contextvars
+from contextlib import contextmanager
+
+import tracing
+
+# Un load_duration oltre questa soglia (secondi) conta come caricamento del modello
+# (con il modello già in memoria Ollama riporta pochi millisecondi)
+MODEL_LOAD_THRESHOLD_SEC = 0.5
+
+# Bucket degli istogrammi: token del prompt e token/s
+PROMPT_TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+TOKENS_PER_SEC_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+LLM_CALLS = f"{tracing.METRICS_PREFIX}_llm_calls_total"
+LLM_PROMPT_TOKENS = f"{tracing.METRICS_PREFIX}_llm_prompt_tokens_total"
+LLM_OUTPUT_TOKENS = f"{tracing.METRICS_PREFIX}_llm_output_tokens_total"
+LLM_PREFILL_SECONDS = f"{tracing.METRICS_PREFIX}_llm_prefill_seconds_total"
+LLM_DECODE_SECONDS = f"{tracing.METRICS_PREFIX}_llm_decode_seconds_total"
+LLM_MODEL_LOADS = f"{tracing.METRICS_PREFIX}_llm_model_loads_total"
+LLM_TRUNCATED = f"{tracing.METRICS_PREFIX}_llm_truncated_total"
+LLM_PROMPT_SIZE = f"{tracing.METRICS_PREFIX}_llm_prompt_tokens"
+LLM_PREFILL_RATE = f"{tracing.METRICS_PREFIX}_llm_prefill_tokens_per_second"
+LLM_DECODE_RATE = f"{tracing.METRICS_PREFIX}_llm_decode_tokens_per_second"
+
+tracing.registry.describe(LLM_CALLS, "Chiamate LLM per agente e modello")
+tracing.registry.describe(LLM_PROMPT_TOKENS, "Token di prompt elaborati (prefill)")
+tracing.registry.describe(LLM_OUTPUT_TOKENS, "Token generati (decode)")
+tracing.registry.describe(LLM_PREFILL_SECONDS, "Secondi spesi nel prefill")
+tracing.registry.describe(LLM_DECODE_SECONDS, "Secondi spesi nel decode")
+tracing.registry.describe(LLM_MODEL_LOADS, "Chiamate che hanno dovuto caricare il modello")
+tracing.registry.describe(LLM_TRUNCATED, "Risposte interrotte dal limite di token (MAX_LLM_TOKENS)")
+tracing.registry.describe(LLM_PROMPT_SIZE, "Dimensione dei prompt in token", PROMPT_TOKEN_BUCKETS)
+tracing.registry.describe(LLM_PREFILL_RATE, "Velocità di prefill per chiamata", TOKENS_PER_SEC_BUCKETS)
+tracing.registry.describe(LLM_DECODE_RATE, "Velocità di decode per chiamata", TOKENS_PER_SEC_BUCKETS)
+
+# Chiamate LLM dell'analisi corrente (lista di dizionari) oppure None
+_llm_calls = contextvars.ContextVar("llm_calls", default=None)
+
+
+def _ns_to_sec(value):
+    return (value or 0) / 1e9
+
+
+def _rate(tokens, seconds):
+    return tokens / seconds if seconds > 0 else None
+
+
+def llm_call_stats(response, agent, model):
+    """
+    Statistiche di una risposta di ollama.chat (oggetto ChatResponse o dizionario).
+    Ritorna:
+        {"agent", "model", "prompt_tokens", "prefill_sec", "prefill_tokens_per_sec",
+         "output_tokens", "decode_sec", "decode_tokens_per_sec",
+         "load_sec", "model_loaded", "truncated", "total_sec"}
+    """
+    prompt_tokens = int(response.get("prompt_eval_count") or 0)
+    output_tokens = int(response.get("eval_count") or 0)
+    prefill_sec = _ns_to_sec(response.get("prompt_eval_duration"))
+    decode_sec = _ns_to_sec(response.get("eval_duration"))
+    load_sec = _ns_to_sec(response.get("load_duration"))
+    return {
+        "agent": agent,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "prefill_sec": prefill_sec,
+        "prefill_tokens_per_sec": _rate(prompt_tokens, prefill_sec),
+        "output_tokens": output_tokens,
+        "decode_sec": decode_sec,
+        "decode_tokens_per_sec": _rate(output_tokens, decode_sec),
+        "load_sec": load_sec,
+        "model_loaded": load_sec > MODEL_LOAD_THRESHOLD_SEC,
+        "truncated": response.get("done_reason") == "length",
+        "total_sec": _ns_to_sec(response.get("total_duration")),
+    }
+
+
+def record_llm_call(stats):
+    """Aggiorna metriche e analisi corrente con le statistiche di una chiamata e le stampa."""
+    labels = {"agent": stats["agent"], "model": stats["model"]}
+    registry = tracing.registry
+    registry.increment(LLM_CALLS, **labels)
+    registry.increment(LLM_PROMPT_TOKENS, stats["prompt_tokens"], **labels)
+    registry.increment(LLM_OUTPUT_TOKENS, stats["output_tokens"], **labels)
+    registry.increment(LLM_PREFILL_SECONDS, stats["prefill_sec"], **labels)
+    registry.increment(LLM_DECODE_SECONDS, stats["decode_sec"], **labels)
+    registry.observe(LLM_PROMPT_SIZE, stats["prompt_tokens"], **labels)
+    if stats["model_loaded"]:
+        registry.increment(LLM_MODEL_LOADS, **labels)
+    if stats["truncated"]:
+        registry.increment(LLM_TRUNCATED, **labels)
+    if stats["prefill_tokens_per_sec"] is not None:
+        registry.observe(LLM_PREFILL_RATE, stats["prefill_tokens_per_sec"], **labels)
+    if stats["decode_tokens_per_sec"] is not None:
+        registry.observe(LLM_DECODE_RATE, stats["decode_tokens_per_sec"], **labels)
+
+    calls = _llm_calls.get()
+    if calls is not None:
+        calls.append(stats)
+
+    print(f"📊 LLM {stats['agent']} ({stats['model']}): "
+          f"prompt {stats['prompt_tokens']} tok {_format_rate(stats['prefill_tokens_per_sec'])}, "
+          f"output {stats['output_tokens']} tok {_format_rate(stats['decode_tokens_per_sec'])}"
+          + (f", caricamento modello {stats['load_sec']:.1f} s" if stats["model_loaded"] else "")
+          + (" (troncata da MAX_LLM_TOKENS)" if stats["truncated"] else ""))
+
+
+def _format_rate(rate):
+    return "(n/d)" if rate is None else f"@ {rate:.1f} tok/s"
+
+
+@contextmanager
+def collect_llm_calls():
+    """
+    Raccoglie le statistiche delle chiamate LLM eseguite nel blocco:
+        with collect_llm_calls() as calls:
+            run_mix_agent(...)
+    """
+    calls = []
+    token = _llm_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _llm_calls.reset(token)
+
+
+def summarize_llm_calls(calls):
+    """Totali di un'analisi: token, tempi, velocità medie (pesate sui token) e caricamenti."""
+    prompt_tokens = sum(c["prompt_tokens"] for c in calls)
+    output_tokens = sum(c["output_tokens"] for c in calls)
+    prefill_sec = sum(c["prefill_sec"] for c in calls)
+    decode_sec = sum(c["decode_sec"] for c in calls)
+    return {
+        "calls": len(calls),
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "prefill_tokens_per_sec": _rate(prompt_tokens, prefill_sec),
+        "decode_tokens_per_sec": _rate(output_tokens, decode_sec),
+        "model_loads": sum(1 for c in calls if c["model_loaded"]),
+        "truncated": sum(1 for c in calls if c["truncated"]),
+        "total_sec": sum(c["total_sec"] for c in calls),
+    }
@@ -0,0 +1,357 @@
+# ============================================================
+# AI MUSIC ANALYZER - LOUDNESS EBU R128 / ITU-R BS.1770
+# ============================================================
+# Funzioni vettoriali per la loudness:
+# - filtro K-weighting (coefficienti calcolati una volta per sample rate)
+# - energia K-pesata per blocchi di campioni ("hop")
+# - LUFS integrato con gating (assoluto -70 LUFS, relativo -10 LU)
+# - Loudness Range (LRA) EBU Tech 3342 sui blocchi short-term da 3 s
+# - loudness momentary (400 ms) e short-term (3 s) massime
+# - true peak (dBTP) con sovracampionamento polifase BS.1770-4
+# - LoudnessMeter: misuratore a blocchi che accetta il segnale a pezzi
+#   (streaming) e calcola tutto in un solo passaggio
+#
+# Lavorare su energie per hop permette di calcolare la loudness
+# di QUALSIASI finestra della traccia con semplici somme cumulative,
+# senza rifiltrare il segnale.
+# ============================================================
+
+from functools import lru_cache
+
+import numpy as np
+
+# Costanti BS.1770 / EBU R128
+ABSOLUTE_GATE_LUFS = -70.0     # soglia assoluta di gating
+RELATIVE_GATE_LU = -10.0       # soglia relativa per il LUFS integrato
+LRA_RELATIVE_GATE_LU = -20.0   # soglia relativa per l'LRA
+MOMENTARY_SEC = 0.4            # blocco "momentary" (e gating del LUFS integrato)
+SHORT_TERM_SEC = 3.0           # blocco "short-term" (usato per l'LRA)
+BLOCK_STEP_SEC = 0.1           # passo tra blocchi consecutivi (75% di overlap sui 400 ms)
+
+# Valore restituito quando non c'è segnale sopra le soglie
+SILENCE_LUFS = -70.0
+
+# Hop del LoudnessMeter: 10 ms (blocchi da 400 ms / 3 s e passo da 100 ms esatti a 44.1/48 kHz)
+METER_HOP_SEC = 0.01
+
+# Coefficienti per fase del filtro di sovracampionamento del true peak
+TRUE_PEAK_TAPS_PER_PHASE = 12
+
+# Campioni elaborati per volta da measure_loudness (limita la memoria temporanea)
+METER_CHUNK_SAMPLES = 1 << 18
+
+
+# ============================================================
+# 1. K-WEIGHTING
+# ============================================================
+
+@lru_cache(maxsize=None)
+def kweighting_coefficients(sr):
+    """
+    Coefficienti (b, a) dei due biquad del filtro K-weighting per un sample rate:
+        1) high-shelf +4 dB a ~1.5 kHz (effetto della testa)
+        2) high-pass a ~38 Hz (curva RLB)
+    Calcolati con le formule del "cookbook" (stesse di pyloudnorm) e messi in cache.
+    """
+    def biquad_high_shelf(gain_db, q, fc):
+        A = 10 ** (gain_db / 40.0)
+        w0 = 2.0 * np.pi * fc / sr
+        alpha = np.sin(w0) / (2.0 * q)
+        cos_w0 = np.cos(w0)
+        b = [A * ((A + 1) + (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha),
+             -2 * A * ((A - 1) + (A + 1) * cos_w0),
+             A * ((A + 1) + (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha)]
+        a = [(A + 1) - (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha,
+             2 * ((A - 1) - (A + 1) * cos_w0),
+             (A + 1) - (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha]
+        return np.array(b) / a[0], np.array(a) / a[0]
+
+    def biquad_high_pass(q, fc):
+        w0 = 2.0 * np.pi * fc / sr
+        alpha = np.sin(w0) / (2.0 * q)
+        cos_w0 = np.cos(w0)
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+        return np.array(b) / a[0], np.array(a) / a[0]
+
+    return (biquad_high_shelf(4.0, 1 / np.sqrt(2), 1500.0),
+            biquad_high_pass(0.5, 38.0))
+
+
+def kweight(y, sr):
+    """Applica il filtro K-weighting a un segnale mono (ritorna un nuovo array)."""
+    from scipy.signal import lfilter
+
+    (b1, a1), (b2, a2) = kweighting_coefficients(sr)
+    return lfilter(b2, a2, lfilter(b1, a1, y))
+
+
+def hop_energy(x, hop_length):
+    """
+    Somma dei quadrati di x su blocchi consecutivi di hop_length campioni.
+    L'ultimo blocco (incompleto) viene completato con zeri.
+    """
+    n_hops = int(np.ceil(len(x) / hop_length))
+    padded = np.zeros(n_hops * hop_length, dtype=np.float64)
+    padded[:len(x)] = x
+    return np.sum(padded.reshape(n_hops, hop_length) ** 2, axis=1)
+
+
+def hop_peak(x, hop_length):
+    """Picco assoluto di x su blocchi consecutivi di hop_length campioni."""
+    n_hops = int(np.ceil(len(x) / hop_length))
+    padded = np.zeros(n_hops * hop_length, dtype=np.float32)
+    padded[:len(x)] = np.abs(x)
+    return np.max(padded.reshape(n_hops, hop_length), axis=1)
+
+
+# ============================================================
+# 2. LOUDNESS DA ENERGIE PER HOP
+# ============================================================
+
+def block_mean_squares(kw_hop_energy, sr, hop_length, block_sec, step_sec=BLOCK_STEP_SEC):
+    """
+    Media quadratica K-pesata di blocchi lunghi block_sec, uno ogni step_sec,
+    ottenuta con somme cumulative sulle energie per hop (O(numero di hop)).
+    Block e step sono arrotondati a un numero intero di hop.
+    """
+    block_hops = max(1, int(round(block_sec * sr / hop_length)))
+    step_hops = max(1, int(round(step_sec * sr / hop_length)))
+    if len(kw_hop_energy) < block_hops:
+        return np.zeros(0)
+
+    csum = np.concatenate([[0.0], np.cumsum(kw_hop_energy)])
+    starts = np.arange(0, len(kw_hop_energy) - block_hops + 1, step_hops)
+    return (csum[starts + block_hops] - csum[starts]) / (block_hops * hop_length)
+
+
+def mean_square_to_lufs(z):
+    """Loudness (LUFS) di una media quadratica K-pesata (mono, guadagno canale 1)."""
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10.0 * np.log10(z)
+
+
+def gated_integrated_loudness(block_z):
+    """LUFS integrato BS.1770: gating assoluto -70 LUFS poi relativo -10 LU."""
+    if len(block_z) == 0:
+        return SILENCE_LUFS
+    block_l = mean_square_to_lufs(block_z)
+
+    above_abs = block_l >= ABSOLUTE_GATE_LUFS
+    if not np.any(above_abs):
+        return SILENCE_LUFS
+    relative_gate = mean_square_to_lufs(np.mean(block_z[above_abs])) + RELATIVE_GATE_LU
+
+    gated = above_abs & (block_l > relative_gate)
+    return float(mean_square_to_lufs(np.mean(block_z[gated])))
+
+
+def loudness_range(short_term_z):
+    """
+    Loudness Range EBU Tech 3342: differenza tra 95° e 10° percentile
+    della loudness short-term, dopo gating assoluto e relativo (-20 LU).
+    """
+    if len(short_term_z) == 0:
+        return 0.0
+    st_l = mean_square_to_lufs(short_term_z)
+    st_l = st_l[st_l >= ABSOLUTE_GATE_LUFS]
+    if len(st_l) == 0:
+        return 0.0
+
+    relative_gate = mean_square_to_lufs(np.mean(10 ** ((st_l + 0.691) / 10.0))) + LRA_RELATIVE_GATE_LU
+    st_l = st_l[st_l >= relative_gate]
+    if len(st_l) == 0:
+        return 0.0
+    p10, p95 = np.percentile(st_l, [10, 95])
+    return float(p95 - p10)
+
+
+def max_loudness(block_z):
+    """Loudness massima (LUFS) di una serie di blocchi, SILENCE_LUFS se non ce ne sono."""
+    if len(block_z) == 0:
+        return SILENCE_LUFS
+    return float(max(mean_square_to_lufs(np.max(block_z)), SILENCE_LUFS))
+
+
+def loudness_from_hop_energy(kw_hop_energy, sr, hop_length):
+    """
+    LUFS integrato, LRA e loudness momentary / short-term massime
+    a partire dalle energie K-pesate per hop (vedi hop_energy(kweight(y, sr), hop_length)).
+    """
+    momentary_z = block_mean_squares(kw_hop_energy, sr, hop_length, MOMENTARY_SEC)
+    short_term_z = block_mean_squares(kw_hop_energy, sr, hop_length, SHORT_TERM_SEC)
+    return {
+        "integrated_lufs": gated_integrated_loudness(momentary_z),
+        "loudness_range": loudness_range(short_term_z),
+        "max_momentary_lufs": max_loudness(momentary_z),
+        "max_short_term_lufs": max_loudness(short_term_z),
+    }
+
+
+def amplitude_to_db(x):
+    """Ampiezza lineare → dB (dBFS / dBTP), SILENCE_LUFS per il silenzio digitale."""
+    with np.errstate(divide="ignore"):
+        return float(max(20.0 * np.log10(x), SILENCE_LUFS))
+
+
+# ============================================================
+# 3. TRUE PEAK (BS.1770-4, ALLEGATO 2)
+# ============================================================
+
+def true_peak_oversampling(sr):
+    """Fattore di sovracampionamento: 4x sotto i 96 kHz, 2x sotto i 192 kHz, altrimenti 1x."""
+    if sr < 96000:
+        return 4
+    if sr < 192000:
+        return 2
+    return 1
+
+
+@lru_cache(maxsize=None)
+def true_peak_filter(sr):
+    """
+    Filtro interpolatore polifase per il true peak, messo in cache per sample rate.
+    Ritorna una matrice (fattore, TRUE_PEAK_TAPS_PER_PHASE): una riga per fase,
+    ciascuna produce uno dei campioni intermedi tra due campioni originali.
+    """
+    from scipy.signal import firwin
+
+    factor = true_peak_oversampling(sr)
+    if factor == 1:
+        return np.ones((1, 1), dtype=np.float32)
+    h = firwin(factor * TRUE_PEAK_TAPS_PER_PHASE, 1.0 / factor) * factor
+    return np.stack([h[p::factor] for p in range(factor)]).astype(np.float32)
+
+
+def true_peak_envelope(x, sr, history=None):
+    """
+    Valore assoluto massimo del segnale sovracampionato per ogni campione di x.
+    history: ultimi TRUE_PEAK_TAPS_PER_PHASE - 1 campioni del blocco precedente
+             (None = inizio del segnale). Ritorna (inviluppo, nuova history).
+    """
+    phases = true_peak_filter(sr)
+    n_hist = phases.shape[1] - 1
+    if history is None:
+        history = np.zeros(n_hist, dtype=np.float32)
+
+    ext = np.concatenate([history, np.asarray(x, dtype=np.float32)])
+    n = len(ext) - n_hist
+
+    # Tutte le fasi insieme: un "shift and add" per coefficiente
+    # (più veloce di una convoluzione per fase con filtri così corti)
+    interp = np.zeros((phases.shape[0], n), dtype=np.float32)
+    for k, coeffs in enumerate(phases[:, ::-1].T):
+        interp += coeffs[:, None] * ext[k:k + n]
+
+    envelope = np.maximum(np.abs(ext[n_hist:]), np.abs(interp).max(axis=0))
+    return envelope, ext[n:]
+
+
+def hop_true_peak(x, sr, hop_length):
+    """True peak (lineare) su blocchi consecutivi di hop_length campioni."""
+    envelope = np.empty(len(x), dtype=np.float32)
+    history = None
+    for start in range(0, len(x), METER_CHUNK_SAMPLES):
+        stop = start + METER_CHUNK_SAMPLES
+        envelope[start:stop], history = true_peak_envelope(x[start:stop], sr, history)
+    return hop_peak(envelope, hop_length)
+
+
+# ============================================================
+# 4. MISURATORE A BLOCCHI (STREAMING)
+# ============================================================
+
+class LoudnessMeter:
+    """
+    Misuratore EBU R128 per un segnale mono che può arrivare a pezzi:
+
+        meter = LoudnessMeter(sr)
+        for chunk in blocchi_audio:
+            meter.process(chunk)
+        risultati = meter.result()
+
+    Ogni campione viene filtrato (K-weighting e interpolatore del true peak,
+    con lo stato dei filtri conservato tra un pezzo e l'altro) e ridotto
+    subito a energia per hop: in memoria restano solo ~100 valori al secondo.
+    """
+
+    def __init__(self, sr, hop_length=None):
+        self.sr = sr
+        self.hop_length = hop_length or max(1, int(round(sr * METER_HOP_SEC)))
+        self.n_samples = 0
+        self._kw_state = [np.zeros(2), np.zeros(2)]
+        self._tp_history = None
+        self._hop_kw = []
+        self._tail = np.zeros(0)
+        self._sample_peak = 0.0
+        self._true_peak = 0.0
+
+    def process(self, chunk):
+        """Aggiunge un pezzo di segnale (array 1D). Ritorna il misuratore stesso."""
+        from scipy.signal import lfilter
+
+        x = np.asarray(chunk, dtype=np.float64)
+        if len(x) == 0:
+            return self
+        self.n_samples += len(x)
+
+        # K-weighting con stato: il risultato non dipende da come è spezzato il segnale
+        (b1, a1), (b2, a2) = kweighting_coefficients(self.sr)
+        kw, self._kw_state[0] = lfilter(b1, a1, x, zi=self._kw_state[0])
+        kw, self._kw_state[1] = lfilter(b2, a2, kw, zi=self._kw_state[1])
+
+        # Energia per hop completi; il resto aspetta il pezzo successivo
+        kw = np.concatenate([self._tail, kw])
+        n_full = len(kw) // self.hop_length * self.hop_length
+        if n_full:
+            self._hop_kw.append(hop_energy(kw[:n_full], self.hop_length))
+        self._tail = kw[n_full:]
+
+        # Picchi
+        envelope, self._tp_history = true_peak_envelope(x, self.sr, self._tp_history)
+        self._sample_peak = max(self._sample_peak, float(np.max(np.abs(x))))
+        self._true_peak = max(self._true_peak, float(np.max(envelope)))
+        return self
+
+    def hop_energies(self):
+        """Energie K-pesate per hop finora (l'ultimo hop incompleto è completato con zeri)."""
+        parts = list(self._hop_kw)
+        if len(self._tail):
+            parts.append(hop_energy(self._tail, self.hop_length))
+        return np.concatenate(parts) if parts else np.zeros(0)
+
+    def momentary(self):
+        """Loudness momentary (LUFS) ogni BLOCK_STEP_SEC."""
+        return mean_square_to_lufs(block_mean_squares(
+            self.hop_energies(), self.sr, self.hop_length, MOMENTARY_SEC))
+
+    def short_term(self):
+        """Loudness short-term (LUFS) ogni BLOCK_STEP_SEC."""
+        return mean_square_to_lufs(block_mean_squares(
+            self.hop_energies(), self.sr, self.hop_length, SHORT_TERM_SEC))
+
+    def result(self):
+        """
+        Ritorna:
+            {"integrated_lufs", "loudness_range", "max_momentary_lufs",
+             "max_short_term_lufs", "true_peak_dbtp", "sample_peak_dbfs"}
+        """
+        stats = loudness_from_hop_energy(self.hop_energies(), self.sr, self.hop_length)
+
+        # Coda dell'interpolatore: campioni intermedi dopo l'ultimo campione
+        true_peak = self._true_peak
+        if self._tp_history is not None:
+            flush, _ = true_peak_envelope(np.zeros(len(self._tp_history)), self.sr, self._tp_history)
+            true_peak = max(true_peak, float(np.max(flush)))
+
+        stats["true_peak_dbtp"] = amplitude_to_db(true_peak)
+        stats["sample_peak_dbfs"] = amplitude_to_db(self._sample_peak)
+        return stats
+
+
+def measure_loudness(y, sr):
+    """Misura completa (vedi LoudnessMeter.result) di un segnale mono già in memoria."""
+    meter = LoudnessMeter(sr)
+    for start in range(0, len(y), METER_CHUNK_SAMPLES):
+        meter.process(y[start:start + METER_CHUNK_SAMPLES])
+    return meter.result()
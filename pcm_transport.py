@@ -0,0 +1,127 @@
+# ============================================================
+# AI MUSIC ANALYZER - PCM CONDIVISO TRA PROCESSI (ZERO-COPY)
+# ============================================================
+# Passare un array float32 di centinaia di MB a un processo worker
+# (ProcessPoolExecutor, multiprocessing) significa pickle → pipe → unpickle:
+# due copie e secondi di CPU solo per il trasporto.
+#
+# Qui il segnale decodificato viene scritto UNA volta in un file .npy su
+# memoria condivisa (/dev/shm se esiste, altrimenti la cartella temporanea)
+# e al worker arriva solo un handle: {"path", "shape", "dtype", "sr"}.
+# Il worker riapre il file in memory-map (come frame_store): le pagine sono
+# quelle del proprietario, nessuna copia.
+#
+#   with share_pcm(*load_audio(path)) as handle:      # processo proprietario
+#       pool.submit(analyze_shared, handle)
+#
+#   def analyze_shared(handle):                        # processo worker
+#       with attach_pcm(handle) as (y, sr):
+#           ...                                        # y è una vista in sola lettura
+#
+# Ciclo di vita: il file appartiene a chi chiama share_pcm e viene
+# eliminato all'uscita dal with (anche con eccezioni). Un worker che crasha
+# perde solo la sua mappatura. Se crasha il proprietario, il nome del file
+# contiene il suo pid: cleanup_stale_pcm() elimina i file di processi morti
+# (chiamata a ogni share_pcm).
+#
+# NB: niente multiprocessing.shared_memory: fino a Python 3.12 il resource
+# tracker registra anche i processi che si agganciano e può eliminare il
+# segmento quando un worker termina.
+# ============================================================
+
+import os
+import secrets
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+# Cartella dei segmenti: tmpfs (RAM) su Linux, altrimenti la cartella temporanea
+PCM_SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# Nome dei file: <prefisso><pid del proprietario>_<token casuale>.npy
+PCM_FILE_PREFIX = "ai_analyzer_pcm_"
+
+
+def _segment_path(shared_dir):
+    name = f"{PCM_FILE_PREFIX}{os.getpid()}_{secrets.token_hex(8)}.npy"
+    return os.path.join(shared_dir, name)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Il processo esiste ma appartiene a un altro utente
+        return True
+    except OSError:
+        # Su Windows os.kill(pid, 0) non è un controllo di esistenza: nel dubbio è vivo
+        return True
+    return True
+
+
+@contextmanager
+def share_pcm(y, sr, shared_dir=None):
+    """
+    Copia il segnale (output di load_audio) in un segmento condiviso e
+    restituisce l'handle da passare ai worker. Il segmento viene eliminato
+    all'uscita dal blocco with.
+    """
+    shared_dir = shared_dir or PCM_SHARED_DIR
+    cleanup_stale_pcm(shared_dir)
+
+    y = np.asarray(y)
+    path = _segment_path(shared_dir)
+    try:
+        segment = np.lib.format.open_memmap(path, mode="w+", dtype=y.dtype, shape=y.shape)
+        segment[...] = y
+        segment.flush()
+        del segment
+        yield {"path": path, "shape": tuple(y.shape), "dtype": y.dtype.str, "sr": sr}
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            # Già rimosso, oppure (Windows) ancora mappato da un worker:
+            # ci penserà cleanup_stale_pcm quando il proprietario sarà terminato
+            pass
+
+
+@contextmanager
+def attach_pcm(handle):
+    """
+    Apre il segmento di un handle in memory-map, in sola lettura: (y, sr).
+    La mappatura si chiude quando non esistono più viste su y.
+    """
+    y = np.load(handle["path"], mmap_mode="r")
+    if y.shape != tuple(handle["shape"]) or y.dtype.str != handle["dtype"]:
+        raise ValueError(f"Segmento PCM non coerente con l'handle: {y.shape} {y.dtype.str}")
+    yield y, handle["sr"]
+
+
+def cleanup_stale_pcm(shared_dir=None):
+    """Elimina i segmenti lasciati da processi proprietari terminati senza pulire. Ritorna quanti."""
+    shared_dir = shared_dir or PCM_SHARED_DIR
+    removed = 0
+    try:
+        entries = list(os.scandir(shared_dir))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.name.startswith(PCM_FILE_PREFIX):
+            continue
+        try:
+            pid = int(entry.name[len(PCM_FILE_PREFIX):].split("_", 1)[0])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    if removed:
+        print(f"🧹 Eliminati {removed} segmenti PCM orfani in {shared_dir}")
+    return removed
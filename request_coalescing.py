@@ -0,0 +1,196 @@
+# ============================================================
+# AI MUSIC ANALYZER - COALESCING DELLE ANALISI IDENTICHE
+# ============================================================
+# Un doppio click su "Analizza" o lo stesso bounce caricato da più tab
+# lanciano la stessa pipeline più volte in parallelo: stesso lavoro DSP
+# e, soprattutto, chiamate Ollama che si contendono la GPU.
+#
+# single_flight(chiave, calcolo) esegue il calcolo UNA volta per chiave:
+#   - nello stesso processo: le richieste identiche arrivate mentre
+#     l'analisi è in corso aspettano e ricevono lo stesso risultato
+#   - tra processi (più worker uvicorn sulla stessa macchina): un file di
+#     lock per chiave in COALESCE_DIR (flock). Chi trova il lock occupato
+#     aspetta, poi legge il risultato che il leader ha lasciato su disco
+#     (valido COALESCE_RESULT_TTL_SEC). Se il leader muore il sistema
+#     operativo rilascia il lock e chi aspettava calcola da sé.
+#
+# La chiave (coalesce_key) è l'hash del contenuto audio + i parametri che
+# cambiano il risultato (taglio, finestra automatica...), non il nome del file.
+# Senza fcntl (Windows) resta solo il coalescing nello stesso processo.
+# ============================================================
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import tracing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Attiva / disattiva il coalescing (False = ogni richiesta calcola da sé)
+COALESCE_ENABLED = True
+
+# Cartella condivisa dai processi della macchina: lock e risultati
+COALESCE_DIR = os.path.join(tempfile.gettempdir(), "ai_analyzer_inflight")
+
+# Per quanto un risultato su disco è valido per chi stava aspettando (secondi)
+COALESCE_RESULT_TTL_SEC = 30
+
+# File di lock non usati da più di così vengono eliminati (secondi)
+COALESCE_LOCK_MAX_AGE_SEC = 24 * 3600
+
+COALESCED_REQUESTS = f"{tracing.METRICS_PREFIX}_coalesced_requests_total"
+tracing.registry.describe(COALESCED_REQUESTS,
+                          "Richieste servite dal risultato di un'analisi identica già in corso")
+
+
+def coalesce_key(content_hash, **params):
+    """Chiave di coalescing: hash del contenuto + parametri (ordinati) dell'analisi."""
+    h = hashlib.sha256(content_hash.encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()[:32]
+
+
+# ============================================================
+# 1. STESSO PROCESSO
+# ============================================================
+
+class _Flight:
+    """Calcolo in corso per una chiave: chi arriva dopo aspetta `done`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.coalesced = False
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(key, compute):
+    """
+    Esegue compute() una sola volta per chiave tra le richieste contemporanee.
+    Ritorna (risultato, coalesced): coalesced=True se il risultato viene dal
+    calcolo di un'altra richiesta. Un errore del calcolo arriva a tutte le
+    richieste agganciate.
+    """
+    if not COALESCE_ENABLED:
+        return compute(), False
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        tracing.registry.increment(COALESCED_REQUESTS, scope="process")
+        print(f"🔗 Richiesta identica a un'analisi in corso: risultato condiviso ({key[:8]})")
+        return flight.result, True
+
+    try:
+        flight.result, flight.coalesced = _cross_process_flight(key, compute)
+        return flight.result, flight.coalesced
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+# ============================================================
+# 2. TRA PROCESSI (LOCK FILE + RISULTATO SU DISCO)
+# ============================================================
+
+def _cross_process_flight(key, compute, coalesce_dir=None):
+    if fcntl is None:
+        return compute(), False
+
+    coalesce_dir = coalesce_dir or COALESCE_DIR
+    os.makedirs(coalesce_dir, exist_ok=True)
+    lock_path = os.path.join(coalesce_dir, key + ".lock")
+    result_path = os.path.join(coalesce_dir, key + ".json")
+
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+        except BlockingIOError:
+            # Un altro processo sta analizzando lo stesso audio: aspettiamo che finisca
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            waited = True
+
+        try:
+            if waited:
+                result = _read_result(result_path)
+                if result is not None:
+                    tracing.registry.increment(COALESCED_REQUESTS, scope="cross_process")
+                    print(f"🔗 Analisi identica completata da un altro worker: risultato condiviso ({key[:8]})")
+                    return result, True
+
+            result = compute()
+            _write_result(result_path, result)
+            os.utime(lock_path)
+            return result, False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _json_default(value):
+    # Scalari / array numpy nei risultati dell'analisi
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} non serializzabile")
+
+
+def _read_result(result_path):
+    """Risultato lasciato dal leader, se ancora valido (None altrimenti)."""
+    try:
+        if time.time() - os.path.getmtime(result_path) > COALESCE_RESULT_TTL_SEC:
+            return None
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_result(result_path, result):
+    """Scrittura atomica (file temporaneo + rename), poi pulizia dei file scaduti."""
+    try:
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, default=_json_default)
+        os.replace(tmp_path, result_path)
+    except (OSError, TypeError, ValueError) as e:
+        # Senza risultato su disco gli altri worker ricalcolano: nessun errore per il client
+        print(f"⚠️ Risultato non condivisibile tra worker: {e}")
+    prune_coalesce_dir(os.path.dirname(result_path))
+
+
+def prune_coalesce_dir(coalesce_dir=None):
+    """Elimina risultati più vecchi di COALESCE_RESULT_TTL_SEC e lock inutilizzati da tempo."""
+    coalesce_dir = coalesce_dir or COALESCE_DIR
+    now = time.time()
+    for entry in os.scandir(coalesce_dir):
+        try:
+            age = now - entry.stat().st_mtime
+            if entry.name.endswith(".json") and age > COALESCE_RESULT_TTL_SEC:
+                os.remove(entry.path)
+            elif entry.name.endswith(".lock") and age > COALESCE_LOCK_MAX_AGE_SEC:
+                os.remove(entry.path)
+        except OSError:
+            # File già rimosso da un altro processo
+            pass
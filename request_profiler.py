@@ -0,0 +1,288 @@
+# ============================================================
+# AI MUSIC ANALYZER - PROFILING SU RICHIESTA
+# ============================================================
+# Quando un upload è lento in produzione serve vedere DOVE va il tempo
+# per quella richiesta, senza rallentare tutte le altre.
+#
+# Un profilo (opt-in: header, flag o campionamento casuale) contiene:
+#   - profilo CPU statistico: un thread campiona ogni PROFILE_INTERVAL_SEC
+#     lo stack del thread che esegue la richiesta (sys._current_frames),
+#     niente hook su ogni chiamata come cProfile
+#   - picco di memoria Python e righe che allocano di più (tracemalloc)
+#
+# Ogni profilo è un file JSON in PROFILE_DIR (cartella limitata per numero
+# di file e byte). Il nome del file torna nella risposta; poi:
+#   python request_profiler.py show profiles/<nome>.json
+#   python request_profiler.py folded profiles/<nome>.json > stack.folded
+# (formato "folded" leggibile da flamegraph.pl / speedscope).
+#
+# Senza profilo richiesto il chiamante usa un contesto vuoto: costo zero.
+# ============================================================
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# Cartella dei profili (creata al primo profilo)
+PROFILE_DIR = "profiles"
+
+# Limiti della cartella: i profili più vecchi vengono eliminati
+PROFILE_MAX_FILES = 50
+PROFILE_MAX_BYTES = 200 * 1024 ** 2
+
+# Intervallo di campionamento dello stack (secondi)
+PROFILE_INTERVAL_SEC = 0.005
+
+# Frazione di richieste profilate anche senza richiesta esplicita (0 = mai)
+PROFILE_SAMPLE_RATE = 0.0
+
+# Frame salvati da tracemalloc per ogni allocazione e righe riportate nel profilo
+TRACEMALLOC_FRAMES = 1
+TOP_ALLOCATIONS = 20
+
+# Un solo profilo alla volta: tracemalloc è globale al processo e due
+# profili contemporanei si confonderebbero a vicenda
+_profile_lock = threading.Lock()
+
+
+def should_profile(requested=False, sample_rate=None):
+    """True se la richiesta va profilata: richiesta esplicita o estratta dal campionamento."""
+    if requested:
+        return True
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    return rate > 0 and random.random() < rate
+
+
+# ============================================================
+# 1. CAMPIONATORE DELLO STACK
+# ============================================================
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread che ogni `interval` secondi legge lo stack del thread `target_id`
+    e conta quante volte compare ciascuno stack (dalla radice alla foglia).
+    """
+
+    def __init__(self, target_id, interval=PROFILE_INTERVAL_SEC):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.target_id = target_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def top_functions(stacks, limit=30):
+    """
+    Funzioni ordinate per campioni: "self" (in cima allo stack) e "total"
+    (presenti in qualsiasi punto dello stack, contate una volta per campione).
+    """
+    self_counts, total_counts = {}, {}
+    for stack, count in stacks.items():
+        self_counts[stack[-1]] = self_counts.get(stack[-1], 0) + count
+        for label in set(stack):
+            total_counts[label] = total_counts.get(label, 0) + count
+    ranked = sorted(total_counts, key=lambda label: (self_counts.get(label, 0), total_counts[label]),
+                    reverse=True)
+    return [{"function": label, "self": self_counts.get(label, 0), "total": total_counts[label]}
+            for label in ranked[:limit]]
+
+
+# ============================================================
+# 2. PROFILO DI UNA RICHIESTA
+# ============================================================
+
+class RequestProfile:
+    """
+    Context manager che profila il blocco with (thread corrente):
+        with RequestProfile("analyze t.wav") as prof:
+            ...
+        prof.artifact   # nome del file JSON scritto in PROFILE_DIR (o None)
+    Se un altro profilo è già in corso il blocco gira senza profilo
+    (prof.artifact resta None e prof.skipped_reason spiega perché).
+    """
+
+    def __init__(self, label, profile_dir=PROFILE_DIR, interval=PROFILE_INTERVAL_SEC):
+        self.label = label
+        self.profile_dir = profile_dir
+        self.interval = interval
+        self.artifact = None
+        self.skipped_reason = None
+        self._sampler = None
+        self._owns_tracemalloc = False
+
+    def __enter__(self):
+        if not _profile_lock.acquire(blocking=False):
+            self.skipped_reason = "un altro profilo è già in corso"
+            return self
+
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self._mem_start = tracemalloc.get_traced_memory()[0]
+
+        self._sampler = StackSampler(threading.get_ident(), self.interval)
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._sampler is None:
+            return False
+        try:
+            wall = time.perf_counter() - self._t0
+            cpu = time.process_time() - self._cpu0
+            self._sampler.stop()
+
+            _, peak = tracemalloc.get_traced_memory()
+            top_alloc = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+            report = {
+                "label": self.label,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "error": None if exc_type is None else f"{exc_type.__name__}: {exc}",
+                "wall_sec": wall,
+                "process_cpu_sec": cpu,
+                "sample_interval_sec": self.interval,
+                "samples": self._sampler.samples,
+                "top_functions": top_functions(self._sampler.stacks),
+                "folded_stacks": {";".join(stack): count
+                                  for stack, count in self._sampler.stacks.items()},
+                "memory": {
+                    "peak_bytes": peak - self._mem_start,
+                    "top_allocations": [
+                        {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                         "bytes": stat.size, "blocks": stat.count}
+                        for stat in top_alloc
+                    ],
+                },
+            }
+            self.artifact = write_profile(report, self.profile_dir)
+            print(f"🔬 Profilo salvato: {self.artifact} ({wall:.2f} s, "
+                  f"{self._sampler.samples} campioni, picco memoria "
+                  f"{report['memory']['peak_bytes'] / 1024 ** 2:.1f} MB)")
+        finally:
+            _profile_lock.release()
+        return False
+
+
+def maybe_profile(label, requested=False, sample_rate=None):
+    """RequestProfile se la richiesta va profilata, altrimenti un contesto vuoto (costo zero)."""
+    if should_profile(requested, sample_rate):
+        return RequestProfile(label)
+    return nullcontext()
+
+
+# ============================================================
+# 3. CARTELLA DEI PROFILI
+# ============================================================
+
+def write_profile(report, profile_dir=PROFILE_DIR):
+    """Scrive il profilo in un nuovo file JSON, poi applica i limiti della cartella. Ritorna il nome."""
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{random.randrange(16 ** 6):06x}.json"
+    tmp_path = os.path.join(profile_dir, name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.replace(tmp_path, os.path.join(profile_dir, name))
+    prune_profiles(profile_dir)
+    return name
+
+
+def prune_profiles(profile_dir=PROFILE_DIR, max_files=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_BYTES):
+    """Elimina i profili più vecchi oltre max_files file o max_bytes byte (il più recente resta)."""
+    entries = []
+    for entry in os.scandir(profile_dir):
+        if entry.is_file() and entry.name.endswith(".json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    entries.sort(reverse=True)
+    used_bytes = 0
+    for i, (_, size, path) in enumerate(entries):
+        used_bytes += size
+        if i > 0 and (i >= max_files or used_bytes > max_bytes):
+            os.remove(path)
+
+
+def profile_path(name, profile_dir=PROFILE_DIR):
+    """Percorso di un profilo dato il nome restituito dall'API (None se non valido o assente)."""
+    if os.path.basename(name) != name or not name.endswith(".json"):
+        return None
+    path = os.path.join(profile_dir, name)
+    return path if os.path.exists(path) else None
+
+
+# ============================================================
+# 4. ENTRY POINT
+# ============================================================
+
+def print_profile(report, limit=25):
+    interval = report["sample_interval_sec"]
+    print(f"🔬 {report['label']} ({report['created_at']})")
+    print(f"   wall {report['wall_sec']:.2f} s | CPU processo {report['process_cpu_sec']:.2f} s "
+          f"| {report['samples']} campioni ogni {interval * 1000:.1f} ms")
+    if report["error"]:
+        print(f"   ❌ {report['error']}")
+
+    print("\nFunzioni (self = in cima allo stack, total = ovunque nello stack):")
+    for fn in report["top_functions"][:limit]:
+        print(f"   self {fn['self'] * interval:7.2f} s | total {fn['total'] * interval:7.2f} s | {fn['function']}")
+
+    memory = report["memory"]
+    print(f"\nPicco memoria Python: {memory['peak_bytes'] / 1024 ** 2:.1f} MB")
+    for alloc in memory["top_allocations"][:10]:
+        print(f"   {alloc['bytes'] / 1024 ** 2:8.2f} MB | {alloc['where']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lettura dei profili delle richieste")
+    parser.add_argument("command", choices=["show", "folded"])
+    parser.add_argument("profile", help="File JSON del profilo")
+    args = parser.parse_args(argv)
+
+    with open(args.profile, "r", encoding="utf-8") as f:
+        report = json.load(f)
+
+    if args.command == "show":
+        print_profile(report)
+    else:
+        for stack, count in report["folded_stacks"].items():
+            print(f"{stack} {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,614 @@
+# ============================================================
+# AI MUSIC ANALYZER - INDICE DI SIMILARITÀ DELLA LIBRERIA
+# ============================================================
+# Ogni traccia analizzata lascia su disco un vettore compatto
+# (profilo per bande, BPM, loudness): data una traccia nuova, le
+# reference più vicine arrivano in pochi millisecondi e alimentano
+# il confronto del contesto comune anche senza reference caricata.
+#
+# Struttura su disco (solo append, niente riscritture):
+#   similarity_index/meta.json      versione e nomi delle feature
+#   similarity_index/vectors.f32    vettori float32 (n_tracce x n_feature)
+#   similarity_index/entries.jsonl  una riga per traccia (id, hash del file, nome, summary)
+#   similarity_index/ivf.npz        indice approssimato (ricostruibile)
+#   similarity_index/index.lock     lock (flock) delle aggiunte tra processi
+#
+# Più processi (worker uvicorn, batch) possono aggiungere tracce insieme:
+# le aggiunte avvengono sotto lock e ogni ricerca rilegge le righe
+# accodate dagli altri processi se i file sono cresciuti.
+#
+# Ricerca:
+#   - esatta: distanze di tutto il catalogo con un prodotto matrice-vettore
+#   - approssimata (IVF, cataloghi grandi): k-means sui vettori, si
+#     confrontano solo i cluster più vicini alla query
+#
+# Esempi:
+#   python similarity_index.py build risultati.jsonl   # da batch_analyze
+#   python similarity_index.py query brano.wav -k 5
+#   python similarity_index.py stats
+# ============================================================
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Cartella dell'indice (creata alla prima aggiunta)
+SIMILARITY_INDEX_DIR = "similarity_index"
+
+# Versione del formato: cambiarla (o cambiare le feature) richiede un nuovo indice
+SIMILARITY_INDEX_VERSION = 1
+
+# Quante reference simili restituire di default
+SIMILARITY_TOP_K = 3
+
+# Da quante tracce in su la ricerca usa l'indice approssimato
+APPROX_MIN_ENTRIES = 50000
+
+# Cluster confrontati per ogni query approssimata
+APPROX_NPROBE = 8
+
+# Tracce aggiunte dopo l'ultimo k-means (cercate in modo esatto) oltre
+# questa quota dell'indice → il k-means viene rifatto
+APPROX_REBUILD_RATIO = 0.1
+
+# Campione massimo e iterazioni del k-means
+APPROX_TRAIN_SAMPLE = 50000
+APPROX_KMEANS_ITERATIONS = 10
+
+# Feature del vettore: (nome, sezione, chiave, sottochiave, scala).
+# Ogni valore viene diviso per la sua scala, così una unità di distanza vale
+# circa "una differenza che si sente": 10 punti % di energia in banda,
+# 8 BPM, 2 LU di loudness, 3 dB di crest factor.
+SIMILARITY_FEATURES = [
+    ("energy_sub", "summary", "energy_percent", "sub", 10.0),
+    ("energy_bass", "summary", "energy_percent", "bass", 10.0),
+    ("energy_lowmid", "summary", "energy_percent", "lowmid", 10.0),
+    ("energy_highmid", "summary", "energy_percent", "highmid", 10.0),
+    ("energy_high", "summary", "energy_percent", "high", 10.0),
+    ("fine_sub_20_40", "advanced", "bands_energy_percent", "sub_20_40", 10.0),
+    ("fine_bass_40_80", "advanced", "bands_energy_percent", "bass_40_80", 10.0),
+    ("fine_bass_80_150", "advanced", "bands_energy_percent", "bass_80_150", 10.0),
+    ("fine_lowmid_150_500", "advanced", "bands_energy_percent", "lowmid_150_500", 10.0),
+    ("fine_mid_500_2000", "advanced", "bands_energy_percent", "mid_500_2000", 10.0),
+    ("fine_highmid_2k_6k", "advanced", "bands_energy_percent", "highmid_2k_6k", 10.0),
+    ("fine_air_6k_20k", "advanced", "bands_energy_percent", "air_6k_20k", 10.0),
+    ("bpm", "summary", "bpm", None, 8.0),
+    ("integrated_lufs", "advanced", "loudness", "integrated_lufs", 2.0),
+    ("loudness_range", "advanced", "loudness", "loudness_range", 2.0),
+    ("crest_factor_db", "advanced", "loudness", "crest_factor_db", 3.0),
+]
+
+FEATURE_NAMES = [name for name, *_ in SIMILARITY_FEATURES]
+
+# Campi del summary salvati con ogni traccia (servono a compare_summaries)
+ENTRY_SUMMARY_KEYS = ("duration_sec", "rms_mean", "rms_max", "bpm",
+                      "key_root", "key_mode", "energy_percent")
+
+
+# ============================================================
+# 1. VETTORE COMPATTO E IDENTIFICATIVO
+# ============================================================
+
+def compact_vector(summary, advanced=None):
+    """
+    Vettore float32 (ordine di FEATURE_NAMES) già scalato per la distanza euclidea.
+    Le feature avanzate mancanti valgono 0 (es. traccia senza analisi avanzata).
+    """
+    sections = {"summary": summary, "advanced": advanced or {}}
+    values = []
+    for _, section, key, subkey, scale in SIMILARITY_FEATURES:
+        value = sections[section].get(key)
+        if subkey is not None:
+            value = (value or {}).get(subkey)
+        values.append(float(value or 0.0) / scale)
+    return np.asarray(values, dtype=np.float32)
+
+
+def file_track_id(source):
+    """
+    Identificativo di una traccia: hash del contenuto del file (stesso file con
+    nomi diversi → stesso id). source: percorso, bytes oppure file aperto
+    e seekable (letto dall'inizio, la posizione viene ripristinata).
+    """
+    h = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    elif hasattr(source, "read"):
+        pos = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(1 << 20), b""):
+            h.update(block)
+        source.seek(pos)
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:32]
+
+
+def entry_track_hash(entry):
+    """
+    Hash del file di una riga dell'indice (comune alla traccia intera e a tutte
+    le sue finestre "<hash>@<inizio>-<fine>"). Le righe salvate prima del campo
+    "track_hash" lo ricavano dall'id.
+    """
+    return entry.get("track_hash") or entry["id"].split("@", 1)[0]
+
+
+def make_entry(track_id, name, summary, advanced=None, genre=None, track_hash=None):
+    """
+    Riga dell'indice: quanto basta per confronto e contesto, niente array.
+    track_hash: hash del file (default: la parte dell'id prima di "@").
+    """
+    entry = {
+        "id": track_id,
+        "track_hash": track_hash or track_id.split("@", 1)[0],
+        "name": name,
+        "added_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "summary": {k: summary[k] for k in ENTRY_SUMMARY_KEYS if k in summary},
+    }
+    loudness = (advanced or {}).get("loudness")
+    if loudness:
+        entry["integrated_lufs"] = loudness.get("integrated_lufs")
+    if genre is not None:
+        entry["genre"] = genre
+    return entry
+
+
+# ============================================================
+# 2. INDICE APPROSSIMATO (IVF)
+# ============================================================
+
+class IVFIndex:
+    """
+    Inverted file: i vettori sono divisi in n_lists cluster (k-means);
+    una query calcola le distanze solo per i cluster più vicini.
+        centroids: n_lists x n_feature
+        order: indici delle righe ordinati per cluster
+        offsets: order[offsets[c]:offsets[c + 1]] sono le righe del cluster c
+        n_indexed: righe coperte (quelle successive vengono cercate in modo esatto)
+    """
+
+    def __init__(self, centroids, order, offsets, n_indexed):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.n_indexed = int(n_indexed)
+
+    @classmethod
+    def build(cls, vectors, seed=0, iterations=APPROX_KMEANS_ITERATIONS):
+        """k-means (Lloyd, numpy) su un campione, poi assegnazione di tutte le righe."""
+        n, dim = vectors.shape
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if n > APPROX_TRAIN_SAMPLE:
+            sample = vectors[rng.choice(n, APPROX_TRAIN_SAMPLE, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = nearest_rows(centroids, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros((n_lists, dim), dtype=np.float64)
+            np.add.at(sums, labels, sample)
+            # I cluster rimasti vuoti tengono il centroide precedente
+            filled = counts > 0
+            centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+
+        labels = nearest_rows(centroids, vectors)
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(labels[order], np.arange(n_lists + 1)).astype(np.int64)
+        return cls(centroids, order, offsets, n)
+
+    def candidates(self, query, nprobe=APPROX_NPROBE):
+        """Righe dei nprobe cluster più vicini alla query."""
+        dist = np.sum((self.centroids - query) ** 2, axis=1)
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(dist, nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, order=self.order,
+                 offsets=self.offsets, n_indexed=self.n_indexed)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["centroids"], data["order"], data["offsets"], data["n_indexed"])
+
+
+def nearest_rows(centroids, vectors, chunk=65536):
+    """Indice del centroide più vicino per ogni riga (a blocchi, memoria limitata)."""
+    c_norm = np.sum(centroids ** 2, axis=1)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        labels[start:start + chunk] = np.argmin(c_norm - 2.0 * block @ centroids.T, axis=1)
+    return labels
+
+
+# ============================================================
+# 3. INDICE SU DISCO
+# ============================================================
+
+def _read_tail(path, offset):
+    """Byte del file da offset in poi (b"" se il file non esiste)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+class SimilarityIndex:
+    """
+    Indice delle tracce analizzate. I vettori stanno in memoria in un buffer
+    che raddoppia quando serve (aggiunte in O(1) ammortizzato) e vengono
+    accodati su disco a ogni aggiunta (sotto lock tra processi).
+    """
+
+    def __init__(self, index_dir=SIMILARITY_INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._size = 0
+        self.entries = []
+        self._row_of_id = {}
+        self._rows_of_hash = {}
+        self._ivf = None
+        # Byte di vectors.f32 / entries.jsonl già in memoria (prefisso coerente dei file)
+        self._loaded_bytes = (0, 0)
+        self._load()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        return self._vectors[:self._size]
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    # --------------------------------------------------------
+    # Caricamento / salvataggio
+    # --------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Lock esclusivo tra processi (flock su index.lock): le aggiunte e le
+        riletture dei file avvengono una alla volta tra worker e batch.
+        Senza fcntl (Windows) o senza permessi di scrittura si procede senza lock.
+        """
+        try:
+            lock_file = open(self._path("index.lock"), "a") if fcntl is not None else None
+        except OSError:
+            lock_file = None
+        if lock_file is None:
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _disk_sizes(self):
+        sizes = []
+        for name in ("vectors.f32", "entries.jsonl"):
+            try:
+                sizes.append(os.path.getsize(self._path(name)))
+            except OSError:
+                sizes.append(0)
+        return tuple(sizes)
+
+    def _load(self):
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SIMILARITY_INDEX_VERSION or meta.get("feature_names") != FEATURE_NAMES:
+            raise ValueError(f"{self.index_dir}: indice con feature diverse da quelle attuali, "
+                             f"ricostruirlo con 'python similarity_index.py build'")
+
+        with self._file_lock():
+            self._read_new_rows()
+
+        ivf_path = self._path("ivf.npz")
+        if os.path.exists(ivf_path):
+            ivf = IVFIndex.load(ivf_path)
+            if ivf.n_indexed <= self._size:
+                self._ivf = ivf
+
+    def _read_new_rows(self):
+        """
+        Legge le righe accodate su disco dopo quelle già in memoria (anche da
+        altri processi). Da chiamare con il lock dei file.
+        Una scrittura interrotta può lasciare un vettore senza riga (o viceversa):
+        i file vengono riportati alla lunghezza coerente, altrimenti le aggiunte
+        successive accoppierebbero ogni vettore con la riga sbagliata.
+        """
+        vectors_bytes, entries_bytes = self._loaded_bytes
+        if self._disk_sizes() == self._loaded_bytes:
+            return
+
+        row_bytes = 4 * len(FEATURE_NAMES)
+        vectors_path, entries_path = self._path("vectors.f32"), self._path("entries.jsonl")
+        raw = _read_tail(vectors_path, vectors_bytes)
+        vectors = np.frombuffer(raw[:len(raw) - len(raw) % row_bytes], dtype=np.float32)
+        vectors = vectors.reshape(-1, len(FEATURE_NAMES))
+
+        entries, line_ends = [], []
+        end = entries_bytes
+        # Solo righe complete: l'ultima senza "\n" è una scrittura interrotta
+        for line in _read_tail(entries_path, entries_bytes).split(b"\n")[:-1]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            end += len(line) + 1
+            line_ends.append(end)
+
+        n = min(len(vectors), len(entries))
+        consistent = (vectors_bytes + n * row_bytes, line_ends[n - 1] if n else entries_bytes)
+        if consistent != self._disk_sizes():
+            print(f"⚠️ {self.index_dir}: scrittura interrotta, file riportati a {self._size + n} tracce")
+            for path, size in zip((vectors_path, entries_path), consistent):
+                if os.path.exists(path):
+                    os.truncate(path, size)
+
+        self._append_memory(vectors[:n], entries[:n])
+        self._loaded_bytes = consistent
+
+    def refresh(self):
+        """Carica le tracce aggiunte nel frattempo da altri processi (se i file sono cambiati)."""
+        if self._disk_sizes() == self._loaded_bytes:
+            return
+        with self._lock, self._file_lock():
+            self._read_new_rows()
+
+    def _append_memory(self, vectors, entries):
+        needed = self._size + len(vectors)
+        if needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors), 1024)
+            grown = np.zeros((capacity, len(FEATURE_NAMES)), dtype=np.float32)
+            grown[:self._size] = self.vectors
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[:self._size] = self._sq_norms[:self._size]
+            self._vectors, self._sq_norms = grown, norms
+
+        self._vectors[self._size:needed] = vectors
+        self._sq_norms[self._size:needed] = np.sum(np.asarray(vectors) ** 2, axis=1)
+        for i, entry in enumerate(entries):
+            self._row_of_id[entry["id"]] = self._size + i
+            self._rows_of_hash.setdefault(entry_track_hash(entry), []).append(self._size + i)
+        self.entries.extend(entries)
+        self._size = needed
+
+    def add_many(self, items):
+        """
+        Aggiunge più tracce [(vettore, entry), ...] con una sola scrittura.
+        Gli id già presenti vengono saltati. Ritorna il numero di tracce aggiunte.
+        """
+        with self._lock:
+            fresh, seen = [], set()
+            for vector, entry in items:
+                if entry["id"] in self._row_of_id or entry["id"] in seen:
+                    continue
+                seen.add(entry["id"])
+                fresh.append((vector, entry))
+            if not fresh:
+                return 0
+
+            os.makedirs(self.index_dir, exist_ok=True)
+            with self._file_lock():
+                # Prima le righe aggiunte da altri processi: gli id già presenti si saltano
+                self._read_new_rows()
+                fresh = [(v, e) for v, e in fresh if e["id"] not in self._row_of_id]
+                if not fresh:
+                    return 0
+                vectors = np.stack([v for v, _ in fresh]).astype(np.float32)
+                lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for _, e in fresh).encode("utf-8")
+
+                meta_path = self._path("meta.json")
+                if not os.path.exists(meta_path):
+                    with open(meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"version": SIMILARITY_INDEX_VERSION,
+                                   "feature_names": FEATURE_NAMES}, f)
+                with open(self._path("vectors.f32"), "ab") as f:
+                    f.write(vectors.tobytes())
+                with open(self._path("entries.jsonl"), "ab") as f:
+                    f.write(lines)
+
+                self._append_memory(vectors, [e for _, e in fresh])
+                self._loaded_bytes = (self._loaded_bytes[0] + vectors.nbytes,
+                                      self._loaded_bytes[1] + len(lines))
+            return len(fresh)
+
+    def add(self, vector, entry):
+        """Aggiunge una traccia (se il suo id non è già presente). Ritorna True se aggiunta."""
+        return self.add_many([(vector, entry)]) == 1
+
+    def __contains__(self, track_id):
+        return track_id in self._row_of_id
+
+    # --------------------------------------------------------
+    # Ricerca
+    # --------------------------------------------------------
+
+    def approximate_index(self):
+        """IVF aggiornato (ricostruito se troppe tracce sono state aggiunte dopo il k-means)."""
+        with self._lock:
+            ivf = self._ivf
+            stale = ivf is None or (self._size - ivf.n_indexed) > APPROX_REBUILD_RATIO * ivf.n_indexed
+            if stale:
+                ivf = IVFIndex.build(self.vectors)
+                os.makedirs(self.index_dir, exist_ok=True)
+                ivf.save(self._path("ivf.npz"))
+                self._ivf = ivf
+            return ivf
+
+    def search(self, vector, k=SIMILARITY_TOP_K, exclude_id=None, exclude_hash=None, approximate=None):
+        """
+        Le k tracce più vicine al vettore (compact_vector).
+        Parametri:
+            exclude_id: id da escludere (es. la traccia stessa, se già in indice)
+            exclude_hash: hash del file da escludere: traccia intera e tutte le sue finestre
+            approximate: True / False per forzare IVF o ricerca esatta;
+                         None → approssimata da APPROX_MIN_ENTRIES tracce in su
+        Ritorna:
+            lista di {"distance": float, "entry": dict}, dalla più vicina
+        """
+        self.refresh()
+        if self._size == 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if approximate is None:
+            approximate = self._size >= APPROX_MIN_ENTRIES
+
+        size = self._size
+        if approximate:
+            ivf = self.approximate_index()
+            rows = np.concatenate([ivf.candidates(query),
+                                   np.arange(ivf.n_indexed, size, dtype=np.int64)])
+        else:
+            rows = None
+
+        vectors = self._vectors[:size] if rows is None else self._vectors[rows]
+        norms = self._sq_norms[:size] if rows is None else self._sq_norms[rows]
+        dist = norms - 2.0 * (vectors @ query) + float(query @ query)
+
+        excluded = list(self._rows_of_hash.get(exclude_hash, ()))
+        if exclude_id in self._row_of_id:
+            excluded.append(self._row_of_id[exclude_id])
+        if excluded:
+            if rows is None:
+                dist[excluded] = np.inf
+            else:
+                dist[np.isin(rows, excluded)] = np.inf
+
+        k = min(k, len(dist))
+        best = np.argpartition(dist, k - 1)[:k]
+        best = best[np.argsort(dist[best])]
+        results = []
+        for i in best:
+            if not np.isfinite(dist[i]):
+                continue
+            row = int(i if rows is None else rows[i])
+            results.append({"distance": float(np.sqrt(max(dist[i], 0.0))),
+                            "entry": self.entries[row]})
+        return results
+
+
+# Indice condiviso dal processo (caricato alla prima richiesta)
+_similarity_index = None
+_similarity_index_dir = None
+
+
+def get_similarity_index(index_dir=SIMILARITY_INDEX_DIR):
+    """Ritorna l'indice della libreria (caricato una sola volta per processo)."""
+    global _similarity_index, _similarity_index_dir
+    if _similarity_index_dir != index_dir:
+        _similarity_index = SimilarityIndex(index_dir)
+        _similarity_index_dir = index_dir
+    return _similarity_index
+
+
+# ============================================================
+# 4. ENTRY POINT
+# ============================================================
+
+def build_from_batch(batch_paths, index_dir=SIMILARITY_INDEX_DIR):
+    """Aggiunge all'indice le tracce riuscite di uno o più JSONL di batch_analyze."""
+    index = get_similarity_index(index_dir)
+    items = []
+    for batch_path in batch_paths:
+        with open(batch_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not record.get("ok"):
+                    continue
+                track_id = record.get("track_id") or file_track_id(record["path"])
+                items.append((
+                    compact_vector(record["summary"], record.get("advanced")),
+                    make_entry(track_id, os.path.basename(record["path"]),
+                               record["summary"], record.get("advanced"), record.get("genre")),
+                ))
+    added = index.add_many(items)
+    print(f"✅ Tracce aggiunte: {added} (già presenti: {len(items) - added}) "
+          f"| totale indice: {len(index)}")
+    return added
+
+
+def query_file(path, k=SIMILARITY_TOP_K, index_dir=SIMILARITY_INDEX_DIR):
+    """Analizza un file (solo DSP) e stampa le reference più vicine della libreria."""
+    import ai_analyzer_backend as backend
+
+    y, sr = backend.load_audio(path)
+    low_rate = backend.rhythm_signal(y, sr)
+    summary = backend.summarize_track_features(backend.compute_features(y, sr, low_rate=low_rate))
+    adv = backend.compute_advanced_analysis(y, sr, low_rate=low_rate)
+
+    index = get_similarity_index(index_dir)
+    t0 = time.perf_counter()
+    matches = index.search(compact_vector(summary, adv), k=k, exclude_hash=file_track_id(path))
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"🔎 Reference più vicine a {os.path.basename(path)} "
+          f"({len(index)} tracce, {elapsed_ms:.2f} ms):")
+    for match in matches:
+        entry = match["entry"]
+        print(f"- {entry['name']:<40} distanza {match['distance']:.2f} "
+              f"| BPM {entry['summary'].get('bpm', 0) or 0:.1f} | {entry.get('genre', '')}")
+    return matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indice di similarità della libreria")
+    parser.add_argument("--index-dir", default=SIMILARITY_INDEX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Aggiunge all'indice i risultati di batch_analyze (JSONL)")
+    build.add_argument("batch_files", nargs="+")
+
+    query = sub.add_parser("query", help="Reference più vicine a un file audio")
+    query.add_argument("audio_file")
+    query.add_argument("-k", type=int, default=SIMILARITY_TOP_K)
+
+    sub.add_parser("stats", help="Numero di tracce e stato dell'indice approssimato")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_from_batch(args.batch_files, args.index_dir)
+    elif args.command == "query":
+        query_file(args.audio_file, args.k, args.index_dir)
+    else:
+        index = get_similarity_index(args.index_dir)
+        ivf = index._ivf
+        print(f"📚 Tracce in indice: {len(index)}")
+        print(f"   IVF: {'assente' if ivf is None else f'{len(ivf.centroids)} cluster su {ivf.n_indexed} tracce'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
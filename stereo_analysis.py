@@ -0,0 +1,177 @@
+# ============================================================
+# AI MUSIC ANALYZER - IMMAGINE STEREO (MID / SIDE)
+# ============================================================
+# L'analisi principale lavora sul segnale mono: qui si guarda invece
+# come il mix è distribuito tra i canali, il problema più frequente
+# nei mix degli utenti (bassi larghi, fasi invertite, mix "stretti").
+#
+# Una sola STFT a batch sui due segnali Mid = (L+R)/2 e Side = (L-R)/2:
+# le finestre di entrambi passano in un'unica rfft (scipy.fft, float32),
+# a blocchi di frame per non tenere in memoria tutto lo spettrogramma.
+# Da |M|², |S|² e Re(M·S*) si ricavano per banda, senza altre STFT:
+#   - rapporto side/mid (dB)
+#   - correlazione L/R:   (|M|² - |S|²) / sqrt((|M|² + |S|²)² - 4·Re(M·S*)²)
+#     (+1 = mono, 0 = canali indipendenti, < 0 = fasi opposte)
+#   - bilanciamento L/R:  |L|² = |M|² + |S|² + 2·Re(M·S*), |R|² = ... - 2·Re(M·S*)
+# e, sommando i bin per frame, la correlazione nel tempo (finestre di
+# STEREO_CORRELATION_WINDOW_SEC) e la "mono-compatibilità" dei bassi
+# sotto STEREO_LOW_END_CROSSOVER_HZ.
+# ============================================================
+
+import numpy as np
+
+# STFT della stereo: risoluzione temporale più grossa dell'analisi principale
+# (le grandezze stereo sono medie su secondi), quindi molti meno frame
+STEREO_N_FFT = 4096
+STEREO_HOP = 2048
+
+# Frame elaborati per ogni rfft a batch (limita la memoria sulle tracce lunghe)
+STEREO_CHUNK_FRAMES = 256
+
+# Sotto questa frequenza i bassi dovrebbero essere (quasi) mono
+STEREO_LOW_END_CROSSOVER_HZ = 120.0
+
+# Finestre per la correlazione nel tempo (secondi)
+STEREO_CORRELATION_WINDOW_SEC = 0.5
+
+# Finestre più deboli di così (dB sotto la più forte) non entrano nelle statistiche nel tempo
+STEREO_SILENCE_DB = 60.0
+
+# I rapporti in dB sono limitati a ±STEREO_DB_LIMIT (es. side nullo di un mono perfetto)
+STEREO_DB_LIMIT = 60.0
+
+_EPS = 1e-12
+
+
+def _ratio_db(num, den):
+    db = 10.0 * np.log10((num + _EPS) / (den + _EPS))
+    return float(np.clip(db, -STEREO_DB_LIMIT, STEREO_DB_LIMIT))
+
+
+def _correlation(pm, ps, x):
+    """
+    Correlazione L/R da potenza mid, potenza side e parte reale del prodotto incrociato.
+    Denominatore nullo: silenzio o mono perfetto → +1, un solo canale con segnale → 0.
+    """
+    pm, ps, x = np.asarray(pm), np.asarray(ps), np.asarray(x)
+    den = np.sqrt(np.maximum((pm + ps) ** 2 - 4.0 * x ** 2, 0.0))
+    defined = den > 1e-6 * (pm + ps) + _EPS
+    fallback = np.where(ps <= 1e-6 * pm, 1.0, 0.0)
+    return np.where(defined, (pm - ps) / np.where(defined, den, 1.0), fallback)
+
+
+def _ms_stats(pm, ps, x):
+    return {
+        "side_to_mid_db": _ratio_db(ps, pm),
+        "correlation": float(_correlation(pm, ps, x)),
+        "balance_db": _ratio_db(pm + ps + 2 * x, pm + ps - 2 * x),
+    }
+
+
+def mid_side_spectra(y_channels, sr, n_fft=STEREO_N_FFT, hop=STEREO_HOP, chunk_frames=STEREO_CHUNK_FRAMES):
+    """
+    STFT a batch di Mid e Side. Ritorna:
+        bins_pm, bins_ps, bins_x: somme nel tempo di |M|², |S|², Re(M·S*) per bin
+        frame_pm, frame_ps, frame_x: somme sui bin per ogni frame
+    """
+    from scipy import fft as sp_fft
+
+    left = np.asarray(y_channels[0], dtype=np.float32)
+    right = np.asarray(y_channels[1], dtype=np.float32)
+    ms = np.stack([(left + right) * 0.5, (left - right) * 0.5])
+    if ms.shape[1] < n_fft:
+        ms = np.pad(ms, ((0, 0), (0, n_fft - ms.shape[1])))
+
+    # Vista (2, frame, n_fft) senza copie; la finestra si applica blocco per blocco
+    frames = np.lib.stride_tricks.sliding_window_view(ms, n_fft, axis=1)[:, ::hop]
+    window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+    n_frames = frames.shape[1]
+    n_bins = n_fft // 2 + 1
+
+    bins_pm = np.zeros(n_bins)
+    bins_ps = np.zeros(n_bins)
+    bins_x = np.zeros(n_bins)
+    frame_pm = np.empty(n_frames)
+    frame_ps = np.empty(n_frames)
+    frame_x = np.empty(n_frames)
+
+    for f0 in range(0, n_frames, chunk_frames):
+        block = frames[:, f0:f0 + chunk_frames] * window
+        spec = sp_fft.rfft(block, axis=-1)          # (2, frame, bin): una sola FFT per M e S
+        mid, side = spec[0], spec[1]
+        pm = mid.real ** 2 + mid.imag ** 2
+        ps = side.real ** 2 + side.imag ** 2
+        x = mid.real * side.real + mid.imag * side.imag
+
+        bins_pm += pm.sum(axis=0)
+        bins_ps += ps.sum(axis=0)
+        bins_x += x.sum(axis=0)
+        frame_pm[f0:f0 + chunk_frames] = pm.sum(axis=1)
+        frame_ps[f0:f0 + chunk_frames] = ps.sum(axis=1)
+        frame_x[f0:f0 + chunk_frames] = x.sum(axis=1)
+
+    return bins_pm, bins_ps, bins_x, frame_pm, frame_ps, frame_x
+
+
+def correlation_over_time(frame_pm, frame_ps, frame_x, sr, hop=STEREO_HOP,
+                          window_sec=STEREO_CORRELATION_WINDOW_SEC):
+    """Statistiche della correlazione L/R su finestre di window_sec (finestre silenziose escluse)."""
+    per_window = max(1, int(round(window_sec * sr / hop)))
+    n = len(frame_pm) // per_window * per_window
+    if n == 0:
+        per_window, n = len(frame_pm), len(frame_pm)
+
+    pm = frame_pm[:n].reshape(-1, per_window).sum(axis=1)
+    ps = frame_ps[:n].reshape(-1, per_window).sum(axis=1)
+    x = frame_x[:n].reshape(-1, per_window).sum(axis=1)
+
+    energy = pm + ps
+    loud = energy > energy.max() * 10 ** (-STEREO_SILENCE_DB / 10) if energy.max() > 0 else energy > 0
+    if not np.any(loud):
+        return None
+    corr = _correlation(pm[loud], ps[loud], x[loud])
+    return {
+        "window_sec": per_window * hop / sr,
+        "mean": float(np.mean(corr)),
+        "min": float(np.min(corr)),
+        "p5": float(np.percentile(corr, 5)),
+        "negative_fraction": float(np.mean(corr < 0)),
+    }
+
+
+def compute_stereo_analysis(y_channels, sr, band_set, n_fft=STEREO_N_FFT, hop=STEREO_HOP,
+                            crossover_hz=STEREO_LOW_END_CROSSOVER_HZ):
+    """
+    Immagine stereo di un segnale (canali, campioni).
+    Ritorna None se il segnale non ha almeno due canali, altrimenti:
+        {"side_to_mid_db", "correlation", "balance_db",       (traccia intera)
+         "bands": {banda: {"side_to_mid_db", "correlation", "balance_db"}},
+         "low_end": {"crossover_hz", "side_to_mid_db", "correlation", "mono_ratio"},
+         "correlation_over_time": {"window_sec", "mean", "min", "p5", "negative_fraction"}}
+    Con più di due canali si usano i primi due (L, R).
+    """
+    y_channels = np.asarray(y_channels)
+    if y_channels.ndim != 2 or y_channels.shape[0] < 2:
+        return None
+
+    bins_pm, bins_ps, bins_x, frame_pm, frame_ps, frame_x = mid_side_spectra(y_channels, sr, n_fft, hop)
+
+    # Somme per banda con la matrice bin → banda (tre vettori in un solo prodotto)
+    band_sums = np.asarray(band_set.weights(sr, n_fft) @ np.stack([bins_pm, bins_ps, bins_x], axis=1))
+    bands = {name: _ms_stats(*band_sums[i]) for i, name in enumerate(band_set.names)}
+
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    low = freqs < crossover_hz
+    low_pm, low_ps, low_x = bins_pm[low].sum(), bins_ps[low].sum(), bins_x[low].sum()
+    low_end = dict(_ms_stats(low_pm, low_ps, low_x),
+                   crossover_hz=float(crossover_hz),
+                   mono_ratio=float(low_pm / (low_pm + low_ps)) if low_pm + low_ps > 0 else 1.0)
+    low_end.pop("balance_db")
+
+    result = _ms_stats(bins_pm.sum(), bins_ps.sum(), bins_x.sum())
+    result.update({
+        "bands": bands,
+        "low_end": low_end,
+        "correlation_over_time": correlation_over_time(frame_pm, frame_ps, frame_x, sr, hop),
+    })
+    return result
@@ -0,0 +1,232 @@
+# ============================================================
+# AI MUSIC ANALYZER - TRACING DEGLI STADI E METRICHE
+# ============================================================
+# Span leggeri attorno agli stadi della pipeline (decodifica, feature,
+# analisi avanzata, Chroma, embedding, singoli agenti...):
+#
+#     with tracing.span("compute_features"):
+#         ...
+#
+#     @tracing.traced("rag_retrieve")
+#     def rag_retrieve_context(...): ...
+#
+# Ogni span finisce in:
+#   - un istogramma di latenza per stadio (esposto a /metrics in formato
+#     Prometheus testuale, senza dipendenze esterne)
+#   - la lista dei tempi della richiesta corrente, se il chiamante l'ha
+#     aperta con request_timings() (tempi per stadio nella risposta)
+#
+# Con il tracing disattivato span() ritorna un contesto vuoto condiviso
+# e traced() chiama direttamente la funzione: nessuna misura, nessun lock.
+# ============================================================
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Tracing attivo (AI_ANALYZER_TRACING=0 lo disattiva senza toccare il codice)
+TRACING_ENABLED = os.environ.get("AI_ANALYZER_TRACING", "1") != "0"
+
+# Prefisso dei nomi delle metriche
+METRICS_PREFIX = "analyzer"
+
+# Estremi superiori (secondi) dei bucket degli istogrammi di latenza:
+# da pochi ms (stadi DSP su finestre) a minuti (agenti LLM su CPU)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NULL_SPAN = nullcontext()
+
+
+def set_tracing_enabled(enabled):
+    """Attiva / disattiva il tracing a runtime (es. dai test o da un flag di avvio)."""
+    global TRACING_ENABLED
+    TRACING_ENABLED = bool(enabled)
+
+
+# ============================================================
+# 1. REGISTRO DELLE METRICHE
+# ============================================================
+
+class Histogram:
+    """Istogramma cumulativo alla Prometheus: conteggi per bucket, somma e numero."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Istogrammi e contatori indicizzati per (nome metrica, etichette).
+    Le etichette sono tuple ordinate di coppie (chiave, valore).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._buckets = {}
+
+    def describe(self, name, help_text, buckets=None):
+        """Testo di aiuto della metrica e, per gli istogrammi, bucket diversi da LATENCY_BUCKETS."""
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = tuple(buckets)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            hist.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        """Copia di contatori e istogrammi (per test o per il report a terminale)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.total) for key, h in self._histograms.items()}
+        return counters, histograms
+
+    def render_prometheus(self):
+        """Testo in formato di esposizione Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (h.buckets, list(h.counts), h.total, h.count))
+                for key, h in self._histograms.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for upper, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(upper)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+# Registro condiviso dal processo
+registry = MetricsRegistry()
+
+STAGE_SECONDS = f"{METRICS_PREFIX}_stage_duration_seconds"
+STAGE_ERRORS = f"{METRICS_PREFIX}_stage_errors_total"
+registry.describe(STAGE_SECONDS, "Durata degli stadi della pipeline di analisi")
+registry.describe(STAGE_ERRORS, "Stadi terminati con un'eccezione")
+
+
+# ============================================================
+# 2. SPAN E TEMPI PER RICHIESTA
+# ============================================================
+
+# Tempi della richiesta corrente (lista di dizionari) oppure None
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# Profondità di annidamento dello span corrente (per leggere i tempi come albero)
+_span_depth = contextvars.ContextVar("span_depth", default=0)
+
+
+@contextmanager
+def _measure(stage):
+    depth = _span_depth.get()
+    token = _span_depth.set(depth + 1)
+    t0 = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        _span_depth.reset(token)
+        registry.observe(STAGE_SECONDS, elapsed, stage=stage)
+        if failed:
+            registry.increment(STAGE_ERRORS, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append({"stage": stage, "depth": depth,
+                            "ms": round(elapsed * 1000, 3), "error": failed})
+
+
+def span(stage):
+    """Misura il blocco with come stadio `stage` (contesto vuoto se il tracing è spento)."""
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    return _measure(stage)
+
+
+def traced(stage):
+    """Decoratore: ogni chiamata della funzione diventa uno span `stage`."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return fn(*args, **kwargs)
+            with _measure(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def request_timings():
+    """
+    Raccoglie gli span eseguiti dentro il blocco (stesso thread / task):
+        with tracing.request_timings() as timings:
+            analyze_track(...)
+        # timings = [{"stage": "load_audio", "depth": 1, "ms": 41.2, "error": False}, ...]
+    Gli span compaiono in ordine di chiusura (prima i figli, poi il padre).
+    """
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
@@ -0,0 +1,199 @@
+# ============================================================
+# AI MUSIC ANALYZER - ADDESTRAMENTO DEL CLASSIFICATORE DI GENERE
+# ============================================================
+# Questo script:
+# - Legge un dataset organizzato per cartelle: dataset/<genere>/<file audio>
+# - Calcola le feature con l'analisi batch (pool di processi, cache JSONL
+#   riutilizzabile: rilanciando, i file già analizzati vengono saltati)
+# - Addestra una regressione logistica (scikit-learn) su train/test stratificati
+# - Stampa accuratezza (totale e per genere) e latenza di predizione
+# - Salva il modello come array numpy (joblib, apribile in memory-map)
+#
+# Esempi:
+#   python train_genre_model.py dataset/
+#   python train_genre_model.py dataset/ --output models/genre_model.joblib --workers 8
+# ============================================================
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import batch_analyze
+import genre_classifier
+
+
+# ============================================================
+# CONFIGURAZIONE
+# ============================================================
+
+# Cache delle feature (JSONL di batch_analyze)
+DEFAULT_FEATURES_CACHE = "genre_features.jsonl"
+
+# Quota del dataset tenuta da parte per la valutazione
+DEFAULT_TEST_SIZE = 0.2
+
+# Ripetizioni per la misura di latenza
+LATENCY_REPEATS = 2000
+
+
+# ============================================================
+# 1. DATASET
+# ============================================================
+
+def label_from_path(path, dataset_dir):
+    """Genere = nome della prima cartella sotto la root del dataset."""
+    rel = os.path.relpath(path, os.path.abspath(dataset_dir))
+    parts = rel.split(os.sep)
+    return parts[0] if len(parts) > 1 else None
+
+
+def load_dataset(dataset_dir, features_cache, workers=None):
+    """
+    Analizza (o riprende dalla cache) tutti i file del dataset.
+    Ritorna:
+        X: matrice delle feature, y: array dei generi, paths: file usati
+    """
+    batch_analyze.run_batch([dataset_dir], features_cache, workers=workers)
+
+    pairs, labels, paths = [], [], []
+    wanted = set(batch_analyze.find_audio_files([dataset_dir]))
+    with open(features_cache, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            label = label_from_path(record["path"], dataset_dir)
+            if not record.get("ok") or record["path"] not in wanted or label is None:
+                continue
+            pairs.append((record["summary"], record["advanced"]))
+            labels.append(label)
+            paths.append(record["path"])
+
+    return genre_classifier.feature_matrix(pairs), np.asarray(labels), paths
+
+
+# ============================================================
+# 2. ADDESTRAMENTO E VALUTAZIONE
+# ============================================================
+
+def fit_model(X, y, metadata=None):
+    """Regressione logistica multinomiale → GenreModel (solo array numpy)."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X)
+    clf = LogisticRegression(max_iter=2000, C=1.0)
+    clf.fit(scaler.transform(X), y)
+
+    scale = np.where(scaler.scale_ > 0, scaler.scale_, 1.0)
+    return genre_classifier.GenreModel(
+        mean=scaler.mean_.astype(np.float32),
+        scale=scale.astype(np.float32),
+        coef=clf.coef_.astype(np.float32),
+        intercept=clf.intercept_.astype(np.float32),
+        classes=np.asarray(clf.classes_),
+        metadata=metadata,
+    )
+
+
+def measure_latency(model, X):
+    """Latenza media (µs) di una predizione singola e per riga in batch."""
+    x = X[0]
+    t0 = time.perf_counter()
+    for _ in range(LATENCY_REPEATS):
+        model.predict(x)
+    single_us = (time.perf_counter() - t0) / LATENCY_REPEATS * 1e6
+
+    t0 = time.perf_counter()
+    model.predict(X)
+    batch_us = (time.perf_counter() - t0) / len(X) * 1e6
+    return single_us, batch_us
+
+
+def train(X, y, test_size=DEFAULT_TEST_SIZE, seed=0):
+    """
+    Valuta su uno split stratificato, poi riaddestra su tutto il dataset.
+    Ritorna (modello finale, report).
+    """
+    from sklearn.model_selection import train_test_split
+
+    classes, counts = np.unique(y, return_counts=True)
+    if len(classes) < 2:
+        raise ValueError("Servono almeno 2 generi (cartelle) per addestrare il modello.")
+
+    stratify = y if counts.min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=seed, stratify=stratify)
+
+    eval_model = fit_model(X_train, y_train)
+    predicted, _ = eval_model.predict(X_test)
+    per_class = {
+        str(c): float(np.mean(predicted[y_test == c] == c)) if np.any(y_test == c) else None
+        for c in classes
+    }
+    report = {
+        "n_tracks": int(len(y)),
+        "n_train": int(len(y_train)),
+        "n_test": int(len(y_test)),
+        "accuracy": float(np.mean(predicted == y_test)),
+        "per_class_accuracy": per_class,
+        "class_counts": {str(c): int(n) for c, n in zip(classes, counts)},
+    }
+
+    final_model = fit_model(X, y, metadata={
+        "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "n_tracks": report["n_tracks"],
+        "test_accuracy": report["accuracy"],
+    })
+    report["latency_single_us"], report["latency_batch_us"] = measure_latency(final_model, X)
+    return final_model, report
+
+
+def print_report(report):
+    print("\n================ REPORT MODELLO GENERE =================\n")
+    print(f"Tracce: {report['n_tracks']} (train {report['n_train']} / test {report['n_test']})")
+    print(f"Accuratezza test: {report['accuracy'] * 100:.1f}%")
+    print("\nPer genere (tracce totali | accuratezza test):")
+    for genre, acc in report["per_class_accuracy"].items():
+        acc_text = "n/d" if acc is None else f"{acc * 100:.1f}%"
+        print(f"- {genre:<28} {report['class_counts'][genre]:5d} | {acc_text}")
+    print(f"\nLatenza: {report['latency_single_us']:.1f} µs/traccia (singola), "
+          f"{report['latency_batch_us']:.2f} µs/traccia (batch)")
+
+
+# ============================================================
+# 3. ENTRY POINT
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Addestra il classificatore di genere")
+    parser.add_argument("dataset", help="Cartella con una sottocartella per genere")
+    parser.add_argument("--output", "-o", default=genre_classifier.GENRE_MODEL_PATH,
+                        help="File del modello (.joblib)")
+    parser.add_argument("--features-cache", default=DEFAULT_FEATURES_CACHE,
+                        help="JSONL con le feature già calcolate (riutilizzato tra le run)")
+    parser.add_argument("--workers", "-j", type=int, default=None,
+                        help="Processi per l'analisi (default: numero di CPU)")
+    parser.add_argument("--test-size", type=float, default=DEFAULT_TEST_SIZE)
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_dataset(args.dataset, args.features_cache, workers=args.workers)
+    if len(y) == 0:
+        print("❌ Nessuna traccia analizzata trovata nel dataset.")
+        return 1
+
+    model, report = train(X, y, test_size=args.test_size)
+    print_report(report)
+
+    model.save(args.output)
+    print(f"\n✅ Modello salvato in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
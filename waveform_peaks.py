@@ -0,0 +1,155 @@
+# ============================================================
+# AI MUSIC ANALYZER - PIRAMIDE DI PICCHI PER LA WAVEFORM
+# ============================================================
+# Invece di disegnare la waveform prendendo un campione ogni N
+# (y[::step], che perde i transienti), si costruisce una volta per
+# traccia una piramide multi-risoluzione di min / max / energia:
+#   livello 0 → blocchi da PEAK_BASE_BLOCK campioni
+#   livello k → blocchi PEAK_LEVEL_FACTOR volte più grandi del livello k-1
+#
+# Una vista (start, end, width) sceglie il livello più grossolano che ha
+# ancora almeno un blocco per pixel e lo riduce a `width` punti:
+# il costo dipende dai punti sullo schermo, non dalla lunghezza della traccia.
+#
+# La piramide viene salvata con frame_store, accanto alle feature della traccia.
+# ============================================================
+
+import os
+
+import numpy as np
+
+from frame_store import FRAME_STORE_DIR, load_track_frames, save_track_frames
+
+# Campioni per blocco al livello più fine (~0.7 ms a 44.1 kHz)
+PEAK_BASE_BLOCK = 32
+
+# Fattore di riduzione tra un livello e il successivo
+PEAK_LEVEL_FACTOR = 4
+
+# Il livello più grossolano ha al massimo questo numero di blocchi
+PEAK_MIN_BLOCKS = 512
+
+# Cartella delle piramidi (dentro l'archivio delle feature)
+PEAKS_STORE_DIR = os.path.join(FRAME_STORE_DIR, "peaks")
+
+
+def _reduce_blocks(mins, maxs, sumsq, factor):
+    """Raggruppa i blocchi a gruppi di `factor` (l'ultimo gruppo può essere incompleto)."""
+    n_groups = int(np.ceil(len(mins) / factor))
+    pad = n_groups * factor - len(mins)
+    mins = np.concatenate([mins, np.full(pad, np.inf, dtype=mins.dtype)])
+    maxs = np.concatenate([maxs, np.full(pad, -np.inf, dtype=maxs.dtype)])
+    sumsq = np.concatenate([sumsq, np.zeros(pad, dtype=sumsq.dtype)])
+    return (mins.reshape(n_groups, factor).min(axis=1),
+            maxs.reshape(n_groups, factor).max(axis=1),
+            sumsq.reshape(n_groups, factor).sum(axis=1))
+
+
+def build_peak_pyramid(y, sr, base_block=PEAK_BASE_BLOCK, factor=PEAK_LEVEL_FACTOR):
+    """
+    Costruisce la piramide di picchi di un segnale mono.
+    Il livello 0 è l'unico passaggio sui campioni; i livelli successivi
+    riducono il livello precedente (ognuno è `factor` volte più piccolo).
+    Ritorna:
+        dizionario con parametri e array min_<k>, max_<k>, sumsq_<k> per ogni livello
+    """
+    y = np.asarray(y, dtype=np.float32)
+    n_blocks = max(1, int(np.ceil(len(y) / base_block)))
+    padded = np.zeros(n_blocks * base_block, dtype=np.float32)
+    padded[:len(y)] = y
+    blocks = padded.reshape(n_blocks, base_block)
+
+    mins = blocks.min(axis=1)
+    maxs = blocks.max(axis=1)
+    sumsq = np.einsum("ij,ij->i", blocks, blocks)
+
+    pyramid = {
+        "sr": sr,
+        "n_samples": len(y),
+        "base_block": base_block,
+        "factor": factor,
+    }
+    level = 0
+    while True:
+        pyramid[f"min_{level}"] = mins
+        pyramid[f"max_{level}"] = maxs
+        pyramid[f"sumsq_{level}"] = sumsq
+        if len(mins) <= PEAK_MIN_BLOCKS:
+            break
+        mins, maxs, sumsq = _reduce_blocks(mins, maxs, sumsq, factor)
+        level += 1
+
+    pyramid["n_levels"] = level + 1
+    return pyramid
+
+
+def peak_view(pyramid, start_sec, end_sec, width):
+    """
+    Vista della waveform tra start_sec e end_sec ridotta a `width` punti
+    (meno solo se l'intervallo ha meno blocchi del livello più fine).
+    end_sec <= 0 significa "fino alla fine della traccia".
+    Ritorna:
+        {"times": [...], "min": [...], "max": [...], "rms": [...],
+         "level": livello usato, "samples_per_point": campioni per punto (medi)}
+    """
+    sr = pyramid["sr"]
+    n_samples = pyramid["n_samples"]
+    width = max(1, int(width))
+
+    s0 = max(0, min(int(start_sec * sr), n_samples))
+    s1 = n_samples if end_sec <= 0 else max(0, min(int(end_sec * sr), n_samples))
+    if s1 <= s0:
+        raise ValueError(f"Intervallo non valido: start={start_sec:.3f}s, end={end_sec:.3f}s")
+
+    # Livello più grossolano con blocchi non più grandi dei campioni per pixel
+    samples_per_px = (s1 - s0) / width
+    level = 0
+    block = pyramid["base_block"]
+    while level + 1 < pyramid["n_levels"] and block * pyramid["factor"] <= samples_per_px:
+        level += 1
+        block *= pyramid["factor"]
+
+    b0 = s0 // block
+    b1 = max(b0 + 1, -(-s1 // block))
+    mins = np.asarray(pyramid[f"min_{level}"][b0:b1])
+    maxs = np.asarray(pyramid[f"max_{level}"][b0:b1])
+    sumsq = np.asarray(pyramid[f"sumsq_{level}"][b0:b1])
+
+    # Ogni punto unisce floor o ceil(blocchi / width) blocchi consecutivi: esattamente
+    # `width` punti (un gruppo intero per punto ne darebbe anche solo la metà)
+    n_points = min(len(mins), width)
+    edges = np.arange(n_points) * len(mins) // n_points
+    counts = np.diff(np.append(edges, len(mins)))
+    mins = np.minimum.reduceat(mins, edges)
+    maxs = np.maximum.reduceat(maxs, edges)
+    sumsq = np.add.reduceat(sumsq, edges)
+    times = (b0 + edges) * block / sr
+    rms = np.sqrt(sumsq / (block * counts))
+
+    return {
+        "times": times.tolist(),
+        "min": mins.tolist(),
+        "max": maxs.tolist(),
+        "rms": rms.tolist(),
+        "level": level,
+        "samples_per_point": int(round(block * np.mean(counts))),
+    }
+
+
+def load_peak_pyramid(key, store_dir=PEAKS_STORE_DIR):
+    """Riapre la piramide salvata (array in memory-map) o None se manca."""
+    return load_track_frames(key, store_dir)
+
+
+def get_or_build_peak_pyramid(key, load_signal, store_dir=PEAKS_STORE_DIR):
+    """
+    Ritorna la piramide della traccia, costruendola e salvandola solo se manca.
+    load_signal: funzione senza argomenti che ritorna (y, sr).
+    """
+    pyramid = load_peak_pyramid(key, store_dir)
+    if pyramid is not None:
+        return pyramid
+
+    y, sr = load_signal()
+    save_track_frames(key, build_peak_pyramid(y, sr), store_dir)
+    return load_peak_pyramid(key, store_dir)